@@ -0,0 +1,468 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Time the loading, layout and selection hot paths of pystamps
+
+Synthetic PDS3 products are written to a directory and every operation is
+timed on image sets of each size. Each size runs in its own process, then
+again in another one that traces the memory allocated by each operation with
+tracemalloc, which would slow down the timed run. The window is never
+shown, Qt uses the offscreen platform unless QT_QPA_PLATFORM says otherwise.
+
+Run the default sizes (10, 1000 and 10000 stamps) and save the results::
+
+    python benchmarks/benchmark.py --output before.json
+
+Compare the results of two versions::
+
+    python benchmarks/benchmark.py --compare before.json after.json
+
+Versions from before this benchmark are timed with ``--source`` pointing at
+their checkout. Their ImageSet ignores the options it does not take yet
+(``--backend``, ``--decimation`` and ``--workers``, which the results list),
+operations they do not have are left out and ``--atlas`` needs a version
+with thumbnail atlases.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import shutil
+import inspect
+import argparse
+import platform
+import tempfile
+import subprocess
+from timeit import default_timer
+
+import numpy
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+# Time the checkout this file belongs to, not an installed pystamps
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+SIZES = [10, 1000, 10000]
+
+# PDS3 sample types and the numpy dtypes of their pixels
+SAMPLE_TYPES = {
+    'MSB_INTEGER': '>i2',
+    'LSB_INTEGER': '<i2',
+    'MSB_UNSIGNED_INTEGER': '>u2',
+    'UNSIGNED_INTEGER': 'u1',
+    'IEEE_REAL': '>f4',
+    'PC_REAL': '<f4',
+}
+
+LABEL = (
+    'PDS_VERSION_ID = PDS3\r\n'
+    'RECORD_TYPE = FIXED_LENGTH\r\n'
+    'RECORD_BYTES = {record_bytes}\r\n'
+    'FILE_RECORDS = {file_records}\r\n'
+    '^IMAGE = {pointer}\r\n'
+    'OBJECT = IMAGE\r\n'
+    '  BANDS = {bands}\r\n'
+    '  BAND_STORAGE_TYPE = BAND_SEQUENTIAL\r\n'
+    '  LINES = {lines}\r\n'
+    '  LINE_SAMPLES = {samples}\r\n'
+    '  SAMPLE_BITS = {sample_bits}\r\n'
+    '  SAMPLE_TYPE = {sample_type}\r\n'
+    'END_OBJECT = IMAGE\r\n'
+    'END\r\n'
+)
+
+# Operations in the order they run, see run_size()
+OPERATIONS = [
+    'scan', 'image_set', 'main_window', 'render', 'scroll',
+    'set_images_positions', 'set_grid_layout', 'select_all', 'unselect_all',
+    'invert_selection',
+]
+#: Frames painted while scrolling from the top to the bottom of the grid
+SCROLL_FRAMES = 20
+
+
+def write_product(path, lines, samples, bands, sample_type, seed=0):
+    """Write a PDS3 image with an attached label and random pixels"""
+    dtype = numpy.dtype(SAMPLE_TYPES[sample_type])
+    record_bytes = samples * dtype.itemsize
+    label_records = 1
+    while True:
+        label = LABEL.format(
+            record_bytes=record_bytes,
+            file_records=label_records + bands * lines,
+            pointer=label_records + 1, bands=bands, lines=lines,
+            samples=samples, sample_bits=dtype.itemsize * 8,
+            sample_type=sample_type,
+        ).encode('ascii')
+        if len(label) <= label_records * record_bytes:
+            break
+        label_records += 1
+    random = numpy.random.RandomState(seed)
+    data = random.uniform(0, 250, (bands, lines, samples)).astype(dtype)
+    with open(path, 'wb') as stream:
+        stream.write(label.ljust(label_records * record_bytes, b' '))
+        stream.write(data.tobytes())
+
+
+def make_products(directory, count, lines=512, samples=512, bands=1,
+                  sample_type='MSB_INTEGER'):
+    """Write count products to directory, reusing the ones already there
+
+    Returns
+    -------
+    file_names : list
+        The paths of the products, sorted
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    file_names = []
+    for index in range(count):
+        path = os.path.join(directory, 'product%06d.img' % index)
+        if not os.path.exists(path):
+            write_product(path, lines, samples, bands, sample_type, index)
+        file_names.append(path)
+    return file_names
+
+
+def peak_rss():
+    """The most memory this process has used so far, in bytes
+
+    The peak only grows, so it is the peak of the whole run, not of the
+    last operation.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def measure(func, repeat=1, memory=False):
+    """Time func, best of repeat runs, or trace the memory it allocates
+
+    Parameters
+    ----------
+    memory : bool
+        Run func once with tracemalloc started instead of timing it
+
+    Returns
+    -------
+    result : dict
+        The ``seconds`` of each run and the ``best`` of them, or the
+        ``peak_memory`` of the run: the most bytes allocated by func that
+        were held at once. Python objects and NumPy arrays are counted, the
+        memory Qt allocates itself is not.
+    """
+    if memory:
+        # Forget the earlier allocations, the peak starts again from zero
+        tracemalloc.clear_traces()
+        func()
+        return {'peak_memory': tracemalloc.get_traced_memory()[1]}
+    seconds = []
+    for _ in range(repeat):
+        start = default_timer()
+        func()
+        seconds.append(default_timer() - start)
+    return {'seconds': seconds, 'best': min(seconds)}
+
+
+def accepted(func, **kwargs):
+    """The keyword arguments func takes, older versions take fewer"""
+    try:
+        names = inspect.signature(func).parameters
+    except AttributeError:  # Python 2
+        names = inspect.getargspec(func).args
+    return dict((name, value) for name, value in kwargs.items()
+                if name in names)
+
+
+def run_size(directory, size, backend, decimation, workers, repeat, render,
+             atlas=False, memory=False):
+    """Time every operation on a set of size stamps in this process
+
+    With memory, trace the memory each operation allocates instead, see
+    :func:`measure`.
+    """
+    from qtpy import QtGui, QtWidgets
+    from pystamps import pystamps
+    try:
+        from pystamps.core import scan as scan_files
+    except ImportError:  # Versions before the core module
+        def scan_files(directory):
+            return sorted(
+                os.path.join(directory, name)
+                for name in os.listdir(directory))
+
+    if atlas:
+        from pystamps.atlas import ThumbnailAtlas
+        pystamps.setup_gui()
+        pystamps.StampItem.atlas = ThumbnailAtlas(pystamps.PSIZE)
+    if memory:
+        tracemalloc.start()
+
+    options = {
+        'decimation': decimation, 'backend': backend, 'workers': workers}
+    image_set_options = accepted(pystamps.ImageSet.__init__, **options)
+    results = {'ignored': sorted(set(options) - set(image_set_options))}
+    state = {}
+
+    def scan():
+        state['files'] = scan_files(directory)[:size]
+
+    def image_set():
+        state['image_set'] = pystamps.ImageSet(
+            state['files'], **image_set_options)
+
+    def main_window():
+        state['window'] = pystamps.MainWindow(state['image_set'])
+
+    def render_stamps():
+        # Painting is deferred until shown, so paint offscreen explicitly
+        for image in state['image_set'].images[:render]:
+            if backend == 'item':
+                canvas = QtGui.QImage(
+                    image.button.boundingRect().size().toSize(),
+                    QtGui.QImage.Format_RGB32)
+                painter = QtGui.QPainter(canvas)
+                image.button.paint(
+                    painter, QtWidgets.QStyleOptionGraphicsItem())
+                painter.end()
+            else:
+                image.button.grab()
+
+    def scroll():
+        view = state['window'].set_view
+        bar = view.verticalScrollBar()
+        for value in numpy.linspace(0, bar.maximum(), SCROLL_FRAMES):
+            bar.setValue(int(value))
+            view.viewport().grab()
+
+    def set_images_positions():
+        image_set = state['image_set']
+        for columns in (7, 4):
+            image_set.columns = columns
+            image_set.set_images_positions()
+
+    if memory:
+        repeat = 1
+    results['scan'] = measure(scan, repeat, memory)
+    results['image_set'] = measure(image_set, 1, memory)
+    results['main_window'] = measure(main_window, 1, memory)
+    results['render'] = measure(render_stamps, 1, memory)
+    results['render']['stamps'] = min(render, len(state['files']))
+    results['scroll'] = measure(scroll, repeat, memory)
+    results['scroll']['frames'] = SCROLL_FRAMES
+    results['set_images_positions'] = measure(
+        set_images_positions, repeat, memory)
+    view = state['window'].set_view
+    results['set_grid_layout'] = measure(view.set_grid_layout, repeat, memory)
+    image_set = state['image_set']
+    # Older versions only select through the controller of the view
+    for operation in ['select_all', 'unselect_all', 'invert_selection']:
+        func = getattr(image_set, operation, None)
+        if func is None:
+            func = getattr(view.controller, operation, None)
+        if func is not None:
+            results[operation] = measure(func, repeat, memory)
+    if memory:
+        tracemalloc.stop()
+    else:
+        results['peak_rss'] = peak_rss()
+    return results
+
+
+def version(source=None):
+    """The pystamps version and the git commit it was run from"""
+    from pystamps import __version__
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=source or os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.STDOUT).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'version': __version__, 'commit': commit}
+
+
+def run(args):
+    """Generate the products and time each size in a child process"""
+    work = tempfile.mkdtemp(prefix='pystamps-bench-')
+    # Products of other shapes and types are kept apart so they are reused
+    directory = os.path.join(
+        args.data_dir or work, '%s_%dx%dx%d' % (
+            args.sample_type, args.bands, args.lines, args.samples))
+    output = os.path.join(work, 'results.json')
+    try:
+        make_products(
+            directory, max(args.sizes), args.lines, args.samples, args.bands,
+            args.sample_type)
+        results = {}
+        for size in args.sizes:
+            results[str(size)] = run_child(args, size, directory, output)
+            if args.memory and tracemalloc is not None:
+                traced = run_child(
+                    args, size, directory, output, ['--trace-memory'])
+                for operation in OPERATIONS:
+                    if operation in traced:
+                        results[str(size)][operation].update(
+                            traced[operation])
+            print_results(size, results[str(size)])
+    finally:
+        shutil.rmtree(work)
+    return {
+        'pystamps': version(args.source),
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'platform': platform.platform(),
+        'parameters': dict(
+            (name, getattr(args, name)) for name in [
+                'sizes', 'lines', 'samples', 'bands', 'sample_type',
+                'backend', 'decimation', 'workers', 'repeat', 'render',
+                'atlas', 'source']),
+        'results': results,
+    }
+
+
+def run_child(args, size, directory, output, extra=()):
+    """Run one size in a child process and read back its results"""
+    subprocess.check_call([
+        sys.executable, os.path.abspath(__file__), '--single', str(size),
+        '--data-dir', directory, '--output', output,
+        '--backend', args.backend, '--decimation', args.decimation,
+        '--workers', str(args.workers), '--repeat', str(args.repeat),
+        '--render', str(args.render),
+    ] + (['--atlas'] if args.atlas else []) + (
+        ['--source', args.source] if args.source else []) + list(extra))
+    with open(output) as stream:
+        return json.load(stream)
+
+
+def megabytes(nbytes):
+    return '' if nbytes is None else '%.1f MB' % (nbytes / 1024. ** 2)
+
+
+def print_results(size, results):
+    print('%d stamps, peak RSS %s' % (size, megabytes(results['peak_rss'])))
+    if results['ignored']:
+        print('  this version ignores --%s' % ', --'.join(
+            results['ignored']))
+    print('  %-22s %13s %12s' % ('operation', 'best', 'allocated'))
+    for operation in OPERATIONS:
+        result = results.get(operation)
+        if result is None:
+            continue
+        print('  %-22s %11.6f s %12s' % (
+            operation, result['best'],
+            megabytes(result.get('peak_memory'))))
+
+
+def compare(before, after):
+    """Print the ratio of the best times of two result files"""
+    print('%-8s %-22s %11s %11s %7s' % (
+        'stamps', 'operation', 'before', 'after', 'ratio'))
+    for size in sorted(after['results'], key=int):
+        if size not in before['results']:
+            continue
+        for operation in OPERATIONS:
+            old = before['results'][size].get(operation)
+            new = after['results'][size].get(operation)
+            if old is None or new is None:
+                continue
+            ratio = new['best'] / old['best'] if old['best'] else float('nan')
+            print('%-8s %-22s %10.6fs %10.6fs %6.2fx' % (
+                size, operation, old['best'], new['best'], ratio))
+
+
+def arguments(argv=None):
+    # Not imported from pystamps.thumbnail, which older versions do not have
+    decimation_methods = ['mean', 'stride']
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--sizes', type=int, nargs='+', default=SIZES,
+        help="Numbers of stamps to time (default: %(default)s)")
+    parser.add_argument(
+        '--lines', type=int, default=512, help="Lines of each product")
+    parser.add_argument(
+        '--samples', type=int, default=512, help="Samples of each product")
+    parser.add_argument(
+        '--bands', type=int, choices=[1, 3], default=1,
+        help="Bands of each product")
+    parser.add_argument(
+        '--sample-type', choices=sorted(SAMPLE_TYPES), default='MSB_INTEGER',
+        help="PDS3 sample type of the products")
+    parser.add_argument(
+        '--backend', choices=['matplotlib', 'qimage', 'item'],
+        default='matplotlib',
+        help="How stamps are drawn")
+    parser.add_argument(
+        '--decimation', choices=decimation_methods, default='mean',
+        help="How images are reduced to stamps")
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help="Number of processes decoding images")
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help="Runs of the quick operations, the best one is kept")
+    parser.add_argument(
+        '--render', type=int, default=100,
+        help="Number of stamps painted by the render operation")
+    parser.add_argument(
+        '--atlas', action='store_true',
+        help="Draw item stamps from atlas pages (with --backend item)")
+    parser.add_argument(
+        '--no-memory', dest='memory', action='store_false',
+        help="Do not run each size again to trace the memory of each "
+        "operation")
+    parser.add_argument(
+        '--source',
+        help="Checkout of the pystamps version to time (default: the one "
+        "this script belongs to)")
+    parser.add_argument(
+        '--data-dir',
+        help="Where the products are written and reused across runs "
+        "(default: a temporary directory removed afterwards)")
+    parser.add_argument(
+        '--output', help="Write the results to this JSON file")
+    parser.add_argument(
+        '--compare', nargs=2, metavar=('BEFORE', 'AFTER'),
+        help="Compare two JSON result files instead of running")
+    parser.add_argument('--single', type=int, help=argparse.SUPPRESS)
+    parser.add_argument(
+        '--trace-memory', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = arguments(argv)
+    if args.source:
+        sys.path.insert(0, os.path.abspath(args.source))
+    if args.compare:
+        with open(args.compare[0]) as before, open(args.compare[1]) as after:
+            compare(json.load(before), json.load(after))
+        return
+    if args.single is not None:
+        # Child process timing one size, the results go to the parent
+        results = run_size(
+            args.data_dir, args.single, args.backend, args.decimation,
+            args.workers, args.repeat, args.render, args.atlas,
+            args.trace_memory)
+        with open(args.output, 'w') as stream:
+            json.dump(results, stream)
+        return
+    report = run(args)
+    if args.output:
+        with open(args.output, 'w') as stream:
+            json.dump(report, stream, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Compare decoding a large tree in the given order and in disk order
+
+A tree of synthetic PDS3 products spread over many directories is written
+once and reused. The files are listed in a shuffled order, the way a long
+list of globs over many directories comes in, and decoded once in that
+order and once in the order of :func:`pystamps.loader.read_order`. The page
+cache is emptied of the products before every run, so on a hard disk or a
+network file system the difference is the cost of seeking.
+
+Run on the file system to measure, a few thousand products at least::
+
+    python benchmarks/locality.py --data-dir /mnt/nfs/pystamps-tree
+
+Emptying the page cache uses posix_fadvise, which only Linux and a few
+other platforms have. Elsewhere the runs read from memory and only the
+cost of working out the order is measured.
+"""
+
+from __future__ import print_function
+
+import os
+import sys
+import json
+import random
+import shutil
+import argparse
+import tempfile
+from timeit import default_timer
+
+from benchmark import SAMPLE_TYPES, write_product, version
+
+# Time the checkout this file belongs to, not an installed pystamps
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ORDERS = ['given', 'disk']
+
+
+def make_tree(directory, count, directories, lines, samples, sample_type):
+    """Write count products spread over directories, reusing existing ones
+
+    The products are written one directory after the other, so each
+    directory is laid out on disk in the order of its names.
+
+    Returns
+    -------
+    file_names : list
+        The paths of the products, directory by directory
+    """
+    file_names = []
+    for number in range(directories):
+        subdirectory = os.path.join(directory, 'dir%04d' % number)
+        if not os.path.isdir(subdirectory):
+            os.makedirs(subdirectory)
+        for index in range(number, count, directories):
+            path = os.path.join(subdirectory, 'product%06d.img' % index)
+            if not os.path.exists(path):
+                write_product(path, lines, samples, 1, sample_type, index)
+            file_names.append(path)
+    return file_names
+
+
+def evict(file_names):
+    """Drop the pages of the files from the page cache, where possible
+
+    Returns
+    -------
+    bool
+        False when the platform cannot drop them
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    # Only clean pages are dropped, write the products out first
+    if hasattr(os, 'sync'):
+        os.sync()
+    for file_name in file_names:
+        fd = os.open(file_name, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    return True
+
+
+def decode(file_names, size, decimation, workers, disk_order):
+    """Decode every file, the way a bulk load without a cache does"""
+    from pystamps.loader import prepare_stamps_data
+    for _ in prepare_stamps_data(
+            file_names, size, decimation, workers=workers,
+            disk_order=disk_order):
+        pass
+
+
+def run(args):
+    from pystamps.loader import read_order
+
+    work = None
+    directory = args.data_dir
+    if directory is None:
+        work = directory = tempfile.mkdtemp(prefix='pystamps-locality-')
+    try:
+        file_names = make_tree(
+            directory, args.count, args.directories, args.lines,
+            args.samples, args.sample_type)
+        random.Random(args.seed).shuffle(file_names)
+        nbytes = sum(os.path.getsize(name) for name in file_names)
+        evicted = evict(file_names)
+        if not evicted:
+            print("The page cache cannot be emptied here, the runs read "
+                  "from memory")
+        start = default_timer()
+        read_order(file_names)
+        order_seconds = default_timer() - start
+
+        seconds = dict((order, []) for order in ORDERS)
+        for _ in range(args.repeat):
+            # Alternate so both orders see the same state of the disk
+            for order in ORDERS:
+                evict(file_names)
+                start = default_timer()
+                decode(
+                    file_names, args.size, args.decimation, args.workers,
+                    order == 'disk')
+                seconds[order].append(default_timer() - start)
+    finally:
+        if work is not None:
+            shutil.rmtree(work)
+
+    results = {}
+    for order in ORDERS:
+        best = min(seconds[order])
+        results[order] = {
+            'seconds': seconds[order], 'best': best,
+            'files_per_second': len(file_names) / best,
+            'megabytes_per_second': nbytes / best / 2 ** 20,
+        }
+    return {
+        'pystamps': version(),
+        'parameters': dict(
+            (name, getattr(args, name)) for name in [
+                'count', 'directories', 'lines', 'samples', 'sample_type',
+                'size', 'decimation', 'workers', 'repeat', 'seed']),
+        'evicted': evicted,
+        'bytes': nbytes,
+        'read_order_seconds': order_seconds,
+        'results': results,
+    }
+
+
+def print_results(results):
+    print('%d files, %.1f MB, read_order() %.3f s' % (
+        results['parameters']['count'], results['bytes'] / 2. ** 20,
+        results['read_order_seconds']))
+    print('%-8s %11s %11s %11s' % ('order', 'best', 'files/s', 'MB/s'))
+    for order in ORDERS:
+        result = results['results'][order]
+        print('%-8s %10.3fs %11.1f %11.1f' % (
+            order, result['best'], result['files_per_second'],
+            result['megabytes_per_second']))
+    given = results['results']['given']['best']
+    disk = results['results']['disk']['best']
+    print('disk order is %.2fx the throughput of the given order' % (
+        given / disk if disk else float('nan')))
+
+
+def arguments(argv=None):
+    from pystamps.thumbnail import DECIMATION_METHODS, STRIDE
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument(
+        '--count', type=int, default=5000,
+        help="Number of products (default: %(default)s)")
+    parser.add_argument(
+        '--directories', type=int, default=50,
+        help="Directories the products are spread over "
+        "(default: %(default)s)")
+    parser.add_argument(
+        '--lines', type=int, default=256, help="Lines of each product")
+    parser.add_argument(
+        '--samples', type=int, default=256, help="Samples of each product")
+    parser.add_argument(
+        '--sample-type', choices=sorted(SAMPLE_TYPES), default='MSB_INTEGER',
+        help="PDS3 sample type of the products")
+    parser.add_argument(
+        '--size', type=int, default=186,
+        help="Largest thumbnail dimension (default: %(default)s)")
+    parser.add_argument(
+        '--decimation', choices=DECIMATION_METHODS, default=STRIDE,
+        help="How images are reduced to stamps (default: %(default)s, "
+        "which reads the least)")
+    parser.add_argument(
+        '--workers', type=int, default=1,
+        help="Number of processes decoding images")
+    parser.add_argument(
+        '--repeat', type=int, default=3,
+        help="Runs of each order, the best one is kept")
+    parser.add_argument(
+        '--seed', type=int, default=0,
+        help="Seed of the shuffled order the files are given in")
+    parser.add_argument(
+        '--data-dir',
+        help="Where the tree is written and reused across runs "
+        "(default: a temporary directory removed afterwards)")
+    parser.add_argument(
+        '--output', help="Write the results to this JSON file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = arguments(argv)
+    results = run(args)
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w') as stream:
+            json.dump(results, stream, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+"""Pack the thumbnails of many stamps into a few large page pixmaps"""
+
+import heapq
+
+from qtpy import QtCore, QtGui
+
+#: Width and height of a page in pixels, a size every GPU handles
+PAGE_SIZE = 2048
+
+
+class ThumbnailAtlas(object):
+    """Thumbnails packed into the cells of large page pixmaps
+
+    Every thumbnail fits in a square cell of the stamp size, so the pages are
+    a grid of cells. A thumbnail takes the lowest free cell, which keeps the
+    first pages full. A page is made when a thumbnail first needs one of its
+    cells and released as soon as its last thumbnail is removed.
+
+    Parameters
+    ----------
+    cell_size : float
+        The largest width and height of a thumbnail
+    page_size : int
+        Width and height of each page
+
+    Attributes
+    ----------
+    pages : list
+        The QPixmap of each page, None for a page that was released
+    """
+
+    def __init__(self, cell_size, page_size=PAGE_SIZE):
+        self.cell_size = int(cell_size)
+        self.page_size = max(int(page_size), self.cell_size)
+        self.per_row = self.page_size // self.cell_size
+        self.per_page = self.per_row ** 2
+        self.pages = []
+        self._used = []
+        self._free = []
+        self._cells = {}
+
+    def __contains__(self, key):
+        return key in self._cells
+
+    def __len__(self):
+        return len(self._cells)
+
+    def keys(self):
+        """The keys of the thumbnails in the atlas"""
+        return list(self._cells)
+
+    def add(self, key, image):
+        """Copy a thumbnail into a free cell, replacing the one of key
+
+        Parameters
+        ----------
+        key : object
+            What the thumbnail is looked up by, for example its StampItem
+        image : QtGui.QImage
+            The thumbnail, no larger than the cell size
+        """
+        self.discard(key)
+        cell = heapq.heappop(self._free) if self._free else self._new_page()
+        page = cell // self.per_page
+        if self.pages[page] is None:
+            self.pages[page] = QtGui.QPixmap(self.page_size, self.page_size)
+            self.pages[page].fill(QtCore.Qt.black)
+        self._used[page] += 1
+        width = min(image.width(), self.cell_size)
+        height = min(image.height(), self.cell_size)
+        x, y = self._origin(cell)
+        painter = QtGui.QPainter(self.pages[page])
+        painter.setCompositionMode(QtGui.QPainter.CompositionMode_Source)
+        painter.fillRect(
+            x, y, self.cell_size, self.cell_size, QtCore.Qt.black)
+        painter.drawImage(x, y, image, 0, 0, width, height)
+        painter.end()
+        self._cells[key] = (cell, width, height)
+
+    def discard(self, key):
+        """Free the cell of key, if it has one"""
+        if key not in self._cells:
+            return
+        cell, _, _ = self._cells.pop(key)
+        page = cell // self.per_page
+        self._used[page] -= 1
+        heapq.heappush(self._free, cell)
+        if not self._used[page]:
+            self.pages[page] = None
+
+    def clear(self):
+        """Remove every thumbnail and release all the pages"""
+        self.pages = []
+        self._used = []
+        self._free = []
+        self._cells = {}
+
+    def size(self, key):
+        """The (width, height) of the thumbnail of key"""
+        _, width, height = self._cells[key]
+        return width, height
+
+    def draw(self, painter, x, y, key):
+        """Paint the thumbnail of key with its top left corner at x, y"""
+        cell, width, height = self._cells[key]
+        source_x, source_y = self._origin(cell)
+        painter.drawPixmap(
+            QtCore.QRectF(x, y, width, height),
+            self.pages[cell // self.per_page],
+            QtCore.QRectF(source_x, source_y, width, height))
+
+    def _new_page(self):
+        """Add a page with every cell free and return its first cell"""
+        first = len(self.pages) * self.per_page
+        self.pages.append(None)
+        self._used.append(0)
+        for cell in range(first + 1, first + self.per_page):
+            heapq.heappush(self._free, cell)
+        return first
+
+    def _origin(self, cell):
+        row, column = divmod(cell % self.per_page, self.per_row)
+        return column * self.cell_size, row * self.cell_size
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""Persistent on-disk cache of stamp thumbnails"""
+
+import os
+import hashlib
+import tempfile
+
+import numpy
+
+from .loader import StampData, NOT_COMPATIBLE
+
+#: Bump when the stored format or thumbnail algorithm changes
+CACHE_VERSION = 1
+DEFAULT_MAX_SIZE = 512 * 1024 * 1024
+ENTRY_SUFFIX = '.npz'
+# Python 2 has no os.replace, its os.rename also replaces except on Windows
+_replace = getattr(os, 'replace', os.rename)
+
+
+def default_directory():
+    """The pystamps directory in the user's cache directory"""
+    cache_home = os.environ.get(
+        'XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(cache_home, 'pystamps')
+
+
+class ThumbnailCache(object):
+    """Thumbnails and label facts stored between runs
+
+    Entries are keyed by the absolute path of the file, its size and
+    modification time, and the parameters the thumbnail was made with, so
+    a file that changes on disk is simply a cache miss. The least recently
+    used entries are removed when the cache grows past ``max_size``.
+
+    Parameters
+    ----------
+    directory : string
+        Where entries are stored, :func:`default_directory` by default
+    max_size : int
+        Maximum total size of the entries in bytes
+    refresh : bool
+        Ignore existing entries and store new ones over them
+
+    Attributes
+    ----------
+    directory : string
+        Where entries are stored
+    max_size : int
+        Maximum total size of the entries in bytes
+    refresh : bool
+        Whether existing entries are ignored
+    size : int
+        Current total size of the entries in bytes
+    """
+
+    def __init__(self, directory=None, max_size=DEFAULT_MAX_SIZE,
+                 refresh=False):
+        self.directory = directory or default_directory()
+        self.max_size = max_size
+        self.refresh = refresh
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        self.size = sum(
+            os.path.getsize(path) for path in self._entry_paths())
+
+    def _entry_paths(self):
+        for name in os.listdir(self.directory):
+            if name.endswith(ENTRY_SUFFIX):
+                yield os.path.join(self.directory, name)
+
+    def key(self, abspath, params=()):
+        """Key of a file's entry, None if the file cannot be accessed
+
+        Parameters
+        ----------
+        abspath : string
+            Absolute path of the file
+        params : tuple
+            The parameters the thumbnail is made with
+        """
+        try:
+            stat = os.stat(abspath)
+        except OSError:
+            return None
+        material = [CACHE_VERSION, abspath, stat.st_size, stat.st_mtime]
+        material.extend(params)
+        return hashlib.sha1(
+            '\0'.join(repr(item) for item in material).encode('utf-8')
+        ).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    def get(self, abspath, params=()):
+        """Get the entry for a file
+
+        Returns
+        -------
+        entry : StampData
+            The stored data or None when there is no up to date entry
+        """
+        key = self.key(abspath, params)
+        if key is None or self.refresh:
+            return None
+        path = self._path(key)
+        try:
+            with numpy.load(path) as stored:
+                compatible = bool(stored['compatible'])
+                if compatible:
+                    entry = StampData(
+                        True, tuple(int(n) for n in stored['shape']),
+                        stored['thumbnail'])
+                else:
+                    entry = NOT_COMPATIBLE
+            # Mark the entry as recently used for eviction
+            os.utime(path, None)
+        except Exception:
+            return None
+        return entry
+
+    def put(self, abspath, entry, params=()):
+        """Store the entry for a file, evicting old entries if needed
+
+        Failing to write the entry is not an error, the file is simply
+        processed again next time.
+        """
+        key = self.key(abspath, params)
+        if key is None:
+            return
+        path = self._path(key)
+        if entry.compatible:
+            arrays = {
+                'compatible': True,
+                'shape': numpy.array(entry.shape),
+                'thumbnail': entry.thumbnail,
+            }
+        else:
+            arrays = {'compatible': False}
+        try:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            fd, temp_path = tempfile.mkstemp(
+                suffix='.tmp', dir=self.directory)
+        except (IOError, OSError):
+            return
+        try:
+            # Write then rename so readers never see a partial entry
+            with os.fdopen(fd, 'wb') as stream:
+                numpy.savez(stream, **arrays)
+            _replace(temp_path, path)
+        except (IOError, OSError):
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        self.size += os.path.getsize(path) - old_size
+        if self.size > self.max_size:
+            self.evict()
+
+    def evict(self, target_size=None):
+        """Remove least recently used entries down to target_size
+
+        Parameters
+        ----------
+        target_size : int
+            Size to shrink the cache to, 90% of ``max_size`` by default
+        """
+        if target_size is None:
+            target_size = int(self.max_size * 0.9)
+        entries = []
+        for path in self._entry_paths():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        self.size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self.size <= target_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            self.size -= size
+
+    def clear(self):
+        """Remove every entry"""
+        self.evict(0)
@@ -0,0 +1,469 @@
+# -*- coding: utf-8 -*-
+"""Find PDS images and make their thumbnails without a GUI
+
+Nothing here depends on Qt, so it can run on machines without a display,
+for example to fill a thumbnail cache ahead of time. The GUI classes in
+:mod:`pystamps.pystamps` are built on top of these.
+"""
+
+import os
+import weakref
+from glob import iglob
+from fnmatch import fnmatch
+from collections import deque
+
+try:
+    from os import scandir
+except ImportError:  # Python < 3.5
+    from scandir import scandir
+
+from planetaryimage import PDS3Image
+
+from . import profiling
+from .pdsfile import PDSFile, looks_like_label
+from .thumbnail import read_thumbnail, MEAN
+from .loader import StampData, NOT_COMPATIBLE, prepare_stamps_data
+
+
+class ImageRecord(object):
+    """A file and what pystamps knows about it
+
+    Parameters
+    ----------
+    file_name : string
+        A file and its relative path from the current working directory
+    size : int
+        Maximum number of lines and samples of the thumbnail
+    decimation : string
+        How the image is reduced to the thumbnail, ``'mean'`` (quality) or
+        ``'stride'`` (speed)
+    cache : pystamps.cache.ThumbnailCache
+        Where the thumbnail and label facts are looked up before opening the
+        file and stored after, None to not use a cache
+    data : StampData
+        The thumbnail and label facts when they were already prepared, the
+        file is then not opened
+    placeholder : bool
+        Do not open the file, the data is given later with load()
+
+    Attributes
+    ----------
+    file_name : string
+        The filename of the image given
+    abspath : string
+        The absolute path of given filename
+    basename : string
+        The name of image
+    thumbnail_size : int
+        Maximum number of lines and samples of the thumbnail
+    pds_file : PDSFile
+        The label facts of the image, read without decoding any pixels
+    shape : tuple
+        The (bands, lines, samples) of the image
+    pds_image : planetaryimage object
+        A planetaryimage object, decoded the first time it is accessed. In
+        low memory mode it is decoded again once nothing else refers to it.
+    thumbnail : numpy.ndarray
+        The image reduced to the thumbnail size, made the first time it is
+        accessed
+    pds_compatible: bool
+        Indicates whether the label describes an image planetaryimage can open
+        (assumed True for a placeholder until it is loaded)
+    loaded : bool
+        False for a placeholder waiting for its data
+    low_memory : bool
+        Only hold on to the thumbnail. The decoded image is only weakly
+        referenced and the label is dropped once the thumbnail is made, both
+        are read from the file again when needed. False by default, set on
+        the class to change every record.
+    """
+
+    # No per-record __dict__, so six figure numbers of records stay small
+    __slots__ = (
+        'file_name', 'abspath', 'thumbnail_size', 'decimation', 'cache',
+        'loaded', 'pds_compatible', '_pds_file', '_pds_image', '_thumbnail',
+        '_shape',
+    )
+
+    low_memory = False
+
+    def __init__(self, file_name, size, decimation=MEAN, cache=None,
+                 data=None, placeholder=False):
+        self.file_name = file_name
+        self.abspath = os.path.abspath(file_name)
+        self.thumbnail_size = size
+        self.decimation = decimation
+        self.cache = cache
+        self._pds_file = None
+        self._pds_image = None
+        self._thumbnail = None
+        self._shape = None
+        self.loaded = not placeholder
+        if placeholder:
+            self.pds_compatible = True
+            return
+        if data is None and self.cache is not None:
+            data = self.cache.get(self.abspath, self.params)
+        if data is not None:
+            self._set_data(data)
+            return
+        try:
+            self._pds_file = PDSFile(file_name)
+            self.pds_compatible = True
+        except Exception:
+            self.pds_compatible = False
+            if self.cache is not None:
+                self.cache.put(self.abspath, NOT_COMPATIBLE, self.params)
+
+    @property
+    def basename(self):
+        return os.path.basename(self.file_name)
+
+    @property
+    def params(self):
+        """The (size, decimation) the thumbnail is made with"""
+        return (self.thumbnail_size, self.decimation)
+
+    def _set_data(self, data):
+        self.pds_compatible = data.compatible
+        self._shape = data.shape
+        self._thumbnail = data.thumbnail
+
+    def load(self, data):
+        """Fill a placeholder with its data
+
+        Parameters
+        ----------
+        data : StampData
+            The prepared thumbnail and label facts of the file
+        """
+        self._set_data(data)
+        self.loaded = True
+
+    def unload(self):
+        """Forget what was read from the file, to load it again later
+
+        The record is a placeholder afterwards, for example after the file
+        changed on disk.
+        """
+        self._pds_file = None
+        self._pds_image = None
+        self._thumbnail = None
+        self._shape = None
+        self.pds_compatible = True
+        self.loaded = False
+
+    @property
+    def data(self):
+        """The thumbnail and label facts as StampData"""
+        if not self.pds_compatible:
+            return NOT_COMPATIBLE
+        return StampData(True, self.shape, self.thumbnail)
+
+    @property
+    def pds_file(self):
+        if self._pds_file is None and self.pds_compatible:
+            self._pds_file = PDSFile(self.file_name)
+        return self._pds_file
+
+    @property
+    def pds_image(self):
+        if not self.pds_compatible:
+            return None
+        pds_image = self._pds_image
+        if isinstance(pds_image, weakref.ref):
+            pds_image = pds_image()
+        if pds_image is None:
+            pds_image = PDS3Image.open(self.file_name)
+            if self.low_memory:
+                self._pds_image = weakref.ref(pds_image)
+            else:
+                self._pds_image = pds_image
+        return pds_image
+
+    @property
+    def shape(self):
+        if self._shape is None and self.pds_compatible:
+            self._shape = self.pds_file.shape
+        return self._shape
+
+    @property
+    def thumbnail(self):
+        if self._thumbnail is None and self.pds_compatible:
+            self._thumbnail = read_thumbnail(self.pds_file, *self.params)
+            if self.cache is not None:
+                self.cache.put(
+                    self.abspath,
+                    StampData(True, self.shape, self._thumbnail), self.params)
+            if self.low_memory:
+                # The shape is kept, the rest of the label is read again
+                self._shape = self.shape
+                self._pds_file = None
+        return self._thumbnail
+
+    def __repr__(self):
+        return self.file_name
+
+
+def unique(file_names):
+    """The file names without duplicates, in the order first seen"""
+    seen = set()
+    result = []
+    for file_name in file_names:
+        if file_name not in seen:
+            seen.add(file_name)
+            result.append(file_name)
+    return result
+
+
+def _patterns(patterns):
+    """A list of patterns from a list or a string separated by commas"""
+    if not patterns:
+        return []
+    if isinstance(patterns, str):
+        patterns = patterns.split(',')
+    return [pattern.strip() for pattern in patterns if pattern.strip()]
+
+
+def _matches(name, patterns):
+    return any(fnmatch(name, pattern) for pattern in patterns)
+
+
+def _walk(directory, recursive=False, exclude=()):
+    """Yield the files of a directory as they are listed
+
+    Subdirectories are visited breadth first after the directory, so the
+    files closest to the top come first. Hidden entries, entries matching an
+    ``exclude`` pattern and symbolic links to directories are skipped.
+    """
+    pending = deque([directory])
+    while pending:
+        directory = pending.popleft()
+        try:
+            entries = scandir(directory or os.curdir)
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name.startswith('.') or _matches(entry.name, exclude):
+                continue
+            path = os.path.join(directory, entry.name)
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if recursive:
+                        pending.append(path)
+                elif entry.is_file():
+                    yield path
+            except OSError:
+                continue
+
+
+def _items(inlist):
+    """The files, globs and directories of a list or of a string"""
+    if inlist is None:
+        inlist = []
+    elif isinstance(inlist, str):
+        inlist = inlist.split(',')
+    return [item.strip() for item in inlist] or ['']
+
+
+def _candidates(inlist, recursive, exclude):
+    for item in _items(inlist):
+        # An empty item is the current directory, as on the command line
+        if not item or os.path.isdir(item):
+            for path in _walk(item, recursive, exclude):
+                yield path
+            continue
+        for path in iglob(item):
+            if not os.path.isdir(path):
+                yield path
+            elif recursive:
+                for nested in _walk(path, recursive, exclude):
+                    yield nested
+
+
+def discover(inlist=None, recursive=False, include=None, exclude=None,
+             prefilter=True):
+    """Find files that may be PDS images, yielding each as soon as it is seen
+
+    Directories are listed with :func:`os.scandir` and globs are expanded
+    lazily, so the first files are available before a large tree has been
+    listed completely.
+
+    Parameters
+    ----------
+    inlist : list or string
+        Files, globs and directories, or a string of them separated by
+        commas. None or an empty list is the current directory.
+    recursive : bool
+        Also look in the subdirectories of the directories, including those
+        matched by a glob
+    include : list or string
+        Only keep files whose name matches one of these patterns, for
+        example ``'*.img'``
+    exclude : list or string
+        Skip files and directories whose name matches one of these patterns
+    prefilter : bool
+        Skip files that certainly are not PDS products, judged by their
+        extension and first bytes, see
+        :func:`pystamps.pdsfile.looks_like_label`
+
+    Yields
+    ------
+    file_name : string
+        Each file found, once, in the order found
+    """
+    include = _patterns(include)
+    exclude = _patterns(exclude)
+    seen = set()
+    for file_name in _candidates(inlist, recursive, exclude):
+        if file_name in seen:
+            continue
+        seen.add(file_name)
+        name = os.path.basename(file_name)
+        if include and not _matches(name, include):
+            continue
+        if _matches(name, exclude):
+            continue
+        if prefilter and not looks_like_label(file_name):
+            continue
+        yield file_name
+
+
+def file_signature(file_name):
+    """The size and modification time of a file, None when it is gone"""
+    try:
+        stat = os.stat(file_name)
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime)
+
+
+def directories(inlist=None, recursive=False, file_names=()):
+    """The directories in which :func:`discover` finds files
+
+    Parameters
+    ----------
+    inlist : list or string
+        Files, globs and directories, see :func:`discover`
+    recursive : bool
+        Also include the directories of ``file_names``, which may be below
+        the ones given
+    file_names : iterable
+        Files found before
+
+    Returns
+    -------
+    directories : list
+        The existing directories, without duplicates
+    """
+    found = []
+    for item in _items(inlist):
+        if not item or os.path.isdir(item):
+            found.append(item or os.curdir)
+        else:
+            found.append(os.path.dirname(item) or os.curdir)
+    if recursive:
+        found.extend(
+            os.path.dirname(file_name) or os.curdir
+            for file_name in file_names)
+    return [
+        directory for directory in unique(found)
+        if os.path.isdir(directory)]
+
+
+def scan(inlist=None, recursive=False, include=None, exclude=None,
+         prefilter=True):
+    """Expand files, globs and directories into a list of files
+
+    Parameters
+    ----------
+    inlist : list or string
+        Files, globs and directories, or a string of them separated by
+        commas. None or an empty list is the current directory.
+    recursive, include, exclude, prefilter
+        How the files are found, see :func:`discover`
+
+    Returns
+    -------
+    file_names : list
+        The files found, without duplicates, in the order found
+    """
+    with profiling.span('discover'):
+        return list(discover(inlist, recursive, include, exclude, prefilter))
+
+
+def generate_records(file_names, size, decimation=MEAN, cache=None,
+                     workers=1, disk_order=False):
+    """Make the records of many files, each as soon as it is ready
+
+    Cached files come first, then the others as they are decoded, see
+    :func:`pystamps.loader.prepare_stamps_data`.
+
+    Parameters
+    ----------
+    file_names : list
+        Paths to the files
+    size : int
+        Maximum number of lines and samples of the thumbnails
+    decimation : string
+        How the images are reduced, see :func:`pystamps.thumbnail.decimate`
+    cache : pystamps.cache.ThumbnailCache
+        Cache to look the files up in and store them to, None for no cache
+    workers : int
+        Number of worker processes, None for one per CPU
+    disk_order : bool
+        Decode the files in the order they are laid out on disk, see
+        :func:`pystamps.loader.read_order`
+
+    Yields
+    ------
+    index : int
+        Index of the file in ``file_names``
+    record : ImageRecord
+        The loaded record of the file
+    """
+    results = prepare_stamps_data(
+        file_names, size, decimation, cache=cache, workers=workers,
+        disk_order=disk_order)
+    try:
+        for index, data in results:
+            yield index, ImageRecord(
+                file_names[index], size, decimation, cache, data)
+    finally:
+        results.close()
+
+
+def precompute(inlist, size, decimation=MEAN, cache=None, workers=None,
+               disk_order=False):
+    """Find the PDS images and make their thumbnails
+
+    With a cache this fills it ahead of time, so the GUI opens from the
+    cached thumbnails when it uses the same size and decimation.
+
+    Parameters
+    ----------
+    inlist : list or string
+        Files, globs and directories, see :func:`scan`
+    size : int
+        Maximum number of lines and samples of the thumbnails
+    decimation : string
+        How the images are reduced, see :func:`pystamps.thumbnail.decimate`
+    cache : pystamps.cache.ThumbnailCache
+        Cache to store the thumbnails in, None for no cache
+    workers : int
+        Number of worker processes, one per CPU by default
+    disk_order : bool
+        Decode the files in the order they are laid out on disk, for fewer
+        seeks on hard disks and network file systems
+
+    Returns
+    -------
+    records : list
+        The records of the PDS compatible files in the order found
+    """
+    file_names = scan(inlist)
+    records = [None] * len(file_names)
+    for index, record in generate_records(
+            file_names, size, decimation, cache, workers, disk_order):
+        records[index] = record
+    return [record for record in records if record.pds_compatible]
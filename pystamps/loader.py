@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""Prepare stamp thumbnails, optionally in a pool of worker processes"""
+
+import os
+import sys
+import errno
+import struct
+import multiprocessing
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from . import profiling
+from .pdsfile import PDSFile
+from .thumbnail import read_thumbnail, MEAN
+
+StampData = namedtuple('StampData', ['compatible', 'shape', 'thumbnail'])
+StampData.__doc__ = """What a stamp needs to be displayed without the file
+
+compatible : bool
+    Whether the file is a PDS image pystamps can display
+shape : tuple
+    The (bands, lines, samples) of the image, None when not compatible
+thumbnail : numpy.ndarray
+    The stamp sized array, None when not compatible
+"""
+
+NOT_COMPATIBLE = StampData(False, None, None)
+
+MAX_CHUNKSIZE = 16
+
+# The Linux ioctl mapping the extents of a file to the device, from
+# linux/fiemap.h: struct fiemap followed by one struct fiemap_extent
+FS_IOC_FIEMAP = 0xC020660B
+FIEMAP = struct.Struct('=QQLLLL')
+FIEMAP_EXTENT = struct.Struct('=QQQQQLLLL')
+# The extent is not allocated or its location is not known yet
+FIEMAP_EXTENT_UNKNOWN = 0x2
+# Errors of file systems that do not map extents
+FIEMAP_UNSUPPORTED = frozenset([errno.ENOTTY, errno.EOPNOTSUPP, errno.EINVAL])
+
+
+def physical_offset(file_name):
+    """Where the first byte of a file is on its device
+
+    Parameters
+    ----------
+    file_name : string
+        Path to the file
+
+    Returns
+    -------
+    offset : int
+        Byte offset on the device, None when the file has no data on disk
+        or its location is not known yet
+
+    Raises
+    ------
+    OSError
+        When the file cannot be opened or its file system does not report
+        extents, which is always the case outside of Linux
+    """
+    if fcntl is None or not sys.platform.startswith('linux'):
+        raise OSError(errno.EOPNOTSUPP, 'Extents are only mapped on Linux')
+    request = bytearray(FIEMAP.size + FIEMAP_EXTENT.size)
+    # The first extent from the start of the file
+    FIEMAP.pack_into(request, 0, 0, 1, 0, 0, 1, 0)
+    with open(file_name, 'rb') as stream:
+        fcntl.ioctl(stream.fileno(), FS_IOC_FIEMAP, request)
+    if not FIEMAP.unpack_from(request)[3]:
+        return None
+    extent = FIEMAP_EXTENT.unpack_from(request, FIEMAP.size)
+    if extent[5] & FIEMAP_EXTENT_UNKNOWN:
+        return None
+    return extent[1]
+
+
+def read_order(file_names):
+    """The order to read files in for the fewest seeks
+
+    Files are grouped by device and ordered by where their data starts on
+    it when the file system reports extents (Linux FIEMAP). Otherwise they
+    are grouped by directory and ordered by inode number, which most file
+    systems hand out as files are created, close to where their data goes.
+    Every file is stat'ed, and on Linux opened, so this is worth it for
+    reading many files from a disk or network file system.
+
+    Parameters
+    ----------
+    file_names : list
+        Paths to the files
+
+    Returns
+    -------
+    order : list
+        The indices of ``file_names`` in the order to read them, files that
+        cannot be stat'ed last
+    """
+    unmapped = set()
+    keys = []
+    for file_name in file_names:
+        try:
+            stat = os.stat(file_name)
+        except OSError:
+            keys.append((sys.maxsize, -1, '', 0))
+            continue
+        offset = None
+        if stat.st_dev not in unmapped:
+            try:
+                offset = physical_offset(file_name)
+            except OSError as error:
+                # Asking again for every file on the device would only cost
+                # another open, which is slow on network file systems
+                if error.errno in FIEMAP_UNSUPPORTED:
+                    unmapped.add(stat.st_dev)
+        keys.append((
+            stat.st_dev, -1 if offset is None else offset,
+            os.path.dirname(os.path.abspath(file_name)), stat.st_ino))
+    return sorted(range(len(keys)), key=keys.__getitem__)
+
+
+def cpu_count():
+    """Number of CPUs, 1 when it cannot be told"""
+    try:
+        return multiprocessing.cpu_count()
+    except NotImplementedError:
+        return 1
+
+
+def load_stamp_data(file_name, size, decimation=MEAN):
+    """Probe, decode and decimate one file
+
+    Parameters
+    ----------
+    file_name : string
+        Path to the file
+    size : int
+        Maximum number of lines and samples of the thumbnail
+    decimation : string
+        How the image is reduced, see :func:`pystamps.thumbnail.decimate`
+
+    Returns
+    -------
+    data : StampData
+        The thumbnail and shape, or :data:`NOT_COMPATIBLE` when the file is
+        not a PDS image that can be displayed
+    """
+    try:
+        # The label probe rejects most files before any pixels are read
+        with profiling.span('probe', file=file_name):
+            pds_file = PDSFile(file_name)
+        thumbnail = read_thumbnail(pds_file, size, decimation)
+    except Exception:
+        return NOT_COMPATIBLE
+    return StampData(True, pds_file.shape, thumbnail)
+
+
+def _load_chunk(file_names, size, decimation, profile=False):
+    """Load files in a worker, with the spans timed when profiling"""
+    if not profile:
+        return [load_stamp_data(name, size, decimation)
+                for name in file_names], []
+    profiler = profiling.enable()
+    try:
+        data = [load_stamp_data(name, size, decimation)
+                for name in file_names]
+    finally:
+        profiling.disable()
+    return data, profiler.spans
+
+
+def load_stamps_data(file_names, size, decimation=MEAN, workers=1,
+                     executor=None):
+    """Prepare the stamp data of many files, in order
+
+    Parameters
+    ----------
+    file_names : list
+        Paths to the files
+    size : int
+        Maximum number of lines and samples of the thumbnails
+    decimation : string
+        How the images are reduced, see :func:`pystamps.thumbnail.decimate`
+    workers : int
+        Number of worker processes, None for one per CPU. With a single
+        worker the files are processed in this process.
+    executor : concurrent.futures.Executor
+        A pool of ``workers`` processes to use instead of starting one, for
+        callers loading many small batches. It is left running.
+
+    Yields
+    ------
+    data : StampData
+        The data of each file in the order of ``file_names``
+    """
+    file_names = list(file_names)
+    if workers is None:
+        workers = cpu_count()
+    workers = min(workers, len(file_names))
+    if workers <= 1:
+        for file_name in file_names:
+            yield load_stamp_data(file_name, size, decimation)
+        return
+    # Hand out several files at a time so small files do not spend most of
+    # their time being passed between processes, but not so many that the
+    # first results take long to arrive
+    chunksize = min(max(1, len(file_names) // (workers * 4)), MAX_CHUNKSIZE)
+    profile = profiling.enabled()
+    owned = executor is None
+    if owned:
+        executor = ProcessPoolExecutor(workers)
+    futures = [
+        executor.submit(
+            _load_chunk, file_names[start:start + chunksize], size,
+            decimation, profile)
+        for start in range(0, len(file_names), chunksize)
+    ]
+    try:
+        for future in futures:
+            chunk, spans = future.result()
+            if spans and profiling.enabled():
+                profiling.profiler().extend(spans)
+            for data in chunk:
+                yield data
+    finally:
+        # Closing the generator early drops the files not started yet
+        for future in futures:
+            future.cancel()
+        if owned:
+            executor.shutdown()
+
+
+def prepare_stamps_data(file_names, size, decimation=MEAN, cache=None,
+                        workers=1, executor=None, disk_order=False):
+    """Get the stamp data of many files from a cache or by decoding them
+
+    Cached files are yielded first, then the others as they are decoded, so
+    the results are not in the order of ``file_names``. Decoded files are
+    stored in the cache.
+
+    Parameters
+    ----------
+    file_names : list
+        Paths to the files
+    size : int
+        Maximum number of lines and samples of the thumbnails
+    decimation : string
+        How the images are reduced, see :func:`pystamps.thumbnail.decimate`
+    cache : pystamps.cache.ThumbnailCache
+        Cache to look the files up in and store them to, None for no cache
+    workers, executor
+        The worker processes, see :func:`load_stamps_data`
+    disk_order : bool
+        Decode the files in the order they are laid out on disk, see
+        :func:`read_order`, instead of the order of ``file_names``
+
+    Yields
+    ------
+    index : int
+        Index of the file in ``file_names``
+    data : StampData
+        The data of the file
+    """
+    params = (size, decimation)
+    abspaths = [os.path.abspath(file_name) for file_name in file_names]
+    missing = []
+    for index, abspath in enumerate(abspaths):
+        data = None if cache is None else cache.get(abspath, params)
+        if data is None:
+            missing.append(index)
+        else:
+            yield index, data
+    if disk_order:
+        missing = [
+            missing[index] for index in read_order(
+                [file_names[index] for index in missing])]
+    loaded = load_stamps_data(
+        [file_names[index] for index in missing], size, decimation, workers,
+        executor)
+    try:
+        for index, data in zip(missing, loaded):
+            if cache is not None:
+                cache.put(abspaths[index], data, params)
+            yield index, data
+    finally:
+        loaded.close()
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+"""Stamp button drawn by matplotlib, imported on first GUI use"""
+
+from qtpy import QT_VERSION
+from qtpy import QtCore
+from matplotlib.figure import Figure
+
+from . import profiling
+
+qt_ver = int(QT_VERSION[0])
+if qt_ver == 4:
+    from matplotlib.backends.backend_qt4agg import FigureCanvasQTAgg
+elif qt_ver == 5:
+    from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+
+
+class ImageButton(FigureCanvasQTAgg):
+    """Button containing the image
+
+    Parameters
+    ----------
+    image_stamp : ImageStamp
+    parent : QtQWidgets.QWidget
+    """
+
+    clicked = QtCore.Signal(object)
+
+    def __init__(self, image_stamp, parent=None, scaled=None):
+        self.parent = parent
+        self.image_stamp = image_stamp
+        fig = Figure(figsize=(1, 1))
+        fig.subplots_adjust(
+            left=0.0, right=1.0, top=1.0, bottom=0.0, wspace=0.0,
+            hspace=0.0)
+        super(ImageButton, self).__init__(fig)
+        self._figure = fig
+        self._ax = fig.add_subplot(111)
+        self._figure.set_facecolor('black')
+        self._ax.axis('off')
+        self.setFixedSize(*image_stamp.size)
+        if image_stamp.loaded:
+            self.show_thumbnail(scaled)
+
+    def show_thumbnail(self, scaled=None):
+        """Draw the thumbnail of the image stamp
+
+        Parameters
+        ----------
+        scaled : numpy.ndarray
+            The thumbnail already stretched to 8 bits, stretched here if None
+        """
+        if scaled is None:
+            scaled = self.image_stamp.stretched()
+        with profiling.span('draw', file=self.image_stamp.file_name):
+            # The stretch is done, so matplotlib must not autoscale again
+            if scaled.ndim == 3:
+                self._ax.imshow(scaled)
+            else:
+                self._ax.imshow(scaled, cmap='gray', vmin=0, vmax=255)
+            self.draw_idle()
+
+    def clear(self):
+        """Remove the thumbnail"""
+        self._ax.clear()
+        self._ax.axis('off')
+        self.draw_idle()
+
+    def paintEvent(self, event):
+        # The figure is rendered here, after draw_idle()
+        with profiling.span('paint', file=self.image_stamp.file_name):
+            super(ImageButton, self).paintEvent(event)
+
+    def mouseReleaseEvent(self, event):
+        self.clicked.emit(self.image_stamp)
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""Read the facts pystamps needs about a PDS product from its label alone"""
+
+import io
+import os
+import re
+import bz2
+import gzip
+
+import pvl
+import numpy
+from planetaryimage import PDS3Image
+from planetaryimage.pds3image import Pointer
+
+# Labels are read in growing chunks until the END statement is found
+LABEL_CHUNK_SIZE = 4096
+MAX_LABEL_SIZE = 1024 * 1024
+
+LABEL_END = re.compile(br'(?:^|\n)[ \t]*END[ \t]*(?:\r?\n|$)')
+
+# A label starts with a comment or a keyword assignment such as
+# PDS_VERSION_ID = PDS3 or the CCSD... = SFDU_LABEL line of older products
+LABEL_START = re.compile(br'\s*(?:/\*|\^?[A-Za-z][A-Za-z0-9_:]*\s*=)')
+LABEL_START_SIZE = 64
+COMPRESSED_MAGIC = {'.gz': b'\x1f\x8b', '.bz2': b'BZh'}
+# Files with these extensions are never PDS image products with a label
+NOT_LABEL_EXTENSIONS = frozenset([
+    '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.pdf', '.html', '.htm',
+    '.xml', '.json', '.csv', '.zip', '.tar', '.py', '.pyc', '.md', '.rst',
+])
+
+
+def _open(file_name):
+    """Open a possibly compressed file the same way planetaryimage does"""
+    if file_name.endswith('.gz'):
+        return gzip.open(file_name, 'rb'), 'gz'
+    elif file_name.endswith('.bz2'):
+        return bz2.BZ2File(file_name, 'rb'), 'bz2'
+    return open(file_name, 'rb'), None
+
+
+def read_label(stream):
+    """Read and parse only the label at the start of a stream
+
+    Parameters
+    ----------
+    stream : file object
+        Binary stream positioned at the start of the label
+
+    Returns
+    -------
+    label : pvl.PVLModule
+        The parsed label
+
+    Raises
+    ------
+    ValueError
+        If the stream does not start with a PDS label
+    """
+    header = b''
+    chunk_size = LABEL_CHUNK_SIZE
+    start = 0
+    while len(header) < MAX_LABEL_SIZE:
+        chunk = stream.read(chunk_size)
+        header += chunk
+        match = LABEL_END.search(header, start)
+        if match is not None and chunk and match.end() == len(header):
+            # An END at the end of what was read so far may go on as
+            # END_OBJECT in the next chunk
+            start = match.start()
+            match = None
+        else:
+            start = max(header.rfind(b'\n'), 0)
+        body = header if match is None else header[:match.end()]
+        # Labels are text, so a NUL byte means this is not a label at all
+        if b'\x00' in body:
+            raise ValueError("Not a PDS label")
+        if match is not None or not chunk:
+            return pvl.load(io.BytesIO(body))
+        chunk_size *= 2
+    raise ValueError("No END statement in the first %d bytes" % len(header))
+
+
+def looks_like_label(file_name):
+    """Cheaply tell whether a file may start with a PDS label
+
+    Only the extension and the first few bytes are looked at, so this rejects
+    most files that are not PDS products without parsing anything. A file
+    that passes can still turn out not to be an image :class:`PDSFile` can
+    open.
+
+    Parameters
+    ----------
+    file_name : string
+        Path to the file
+
+    Returns
+    -------
+    bool
+        False when the file is certainly not a PDS product with a label
+    """
+    extension = os.path.splitext(file_name)[1].lower()
+    if extension in NOT_LABEL_EXTENSIONS:
+        return False
+    try:
+        with open(file_name, 'rb') as stream:
+            head = stream.read(LABEL_START_SIZE)
+    except (IOError, OSError):
+        return False
+    # The label of a compressed product is only seen after decompressing
+    if extension in COMPRESSED_MAGIC:
+        return head.startswith(COMPRESSED_MAGIC[extension])
+    return LABEL_START.match(head) is not None
+
+
+def display_form(data):
+    """View (bands, lines, samples) data the way :attr:`PDS3Image.image` is
+
+    Single band data is squeezed to 2D and three band data is viewed as
+    (lines, samples, bands) without copying it.
+    """
+    if data.shape[0] == 1:
+        return data.squeeze()
+    return numpy.moveaxis(data, 0, -1)
+
+
+class PDSFile(object):
+    """The label facts of a PDS image product, without reading any pixels
+
+    Opening a file only reads the label at the start of it (the attached label
+    or a detached ``.LBL`` file), so it is cheap to probe every file in a
+    directory. The checks mirror what :meth:`PDS3Image.open` needs to decode
+    the image so a file that passes can be opened by planetaryimage later.
+
+    Parameters
+    ----------
+    file_name : string
+        Path to an image with an attached label or to a detached label
+
+    Attributes
+    ----------
+    file_name : string
+        The filename given
+    label : pvl.PVLModule
+        The parsed label
+    compression : string
+        ``'gz'`` or ``'bz2'`` when the file is compressed, otherwise None
+    data_filename : string
+        Path of the file holding the pixel data
+    start_byte : int
+        Offset of the pixel data in ``data_filename``
+    dtype : numpy.dtype
+        Pixel data type
+    bands : int
+        Number of image bands
+    lines : int
+        Number of lines per band
+    samples : int
+        Number of samples per line
+
+    Raises
+    ------
+    ValueError
+        If the label does not describe an image pystamps can display
+    """
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        stream, self.compression = _open(file_name)
+        try:
+            self.label = read_label(stream)
+        finally:
+            stream.close()
+
+        if 'IMAGE' not in self.label or '^IMAGE' not in self.label:
+            raise ValueError("Label has no IMAGE object")
+        image = self.label['IMAGE']
+        pointer = Pointer.parse(
+            self.label['^IMAGE'], self.label.get('RECORD_BYTES', 0))
+        if pointer.filename is None:
+            self.data_filename = file_name
+        else:
+            self.data_filename = os.path.join(
+                os.path.dirname(os.path.abspath(file_name)), pointer.filename)
+        self.start_byte = pointer.bytes
+
+        sample_type = image['SAMPLE_TYPE']
+        if sample_type not in PDS3Image.SAMPLE_TYPES:
+            raise ValueError('Unsupported sample type: %r' % sample_type)
+        self.dtype = numpy.dtype('%s%d' % (
+            PDS3Image.SAMPLE_TYPES[sample_type],
+            int(image['SAMPLE_BITS'] / 8)))
+
+        self.bands = image.get('BANDS', 1)
+        self.lines = image['LINES']
+        self.samples = image['LINE_SAMPLES']
+        # PDS3Image.image only has a displayable form for 1 and 3 bands
+        if self.bands not in (1, 3):
+            raise ValueError('Unsupported number of bands: %r' % self.bands)
+
+        band_storage = image.get('BAND_STORAGE_TYPE', 'BAND_SEQUENTIAL')
+        if band_storage != 'BAND_SEQUENTIAL':
+            raise ValueError('Unsupported band storage: %r' % band_storage)
+
+        if self.compression is None:
+            data_size = os.path.getsize(self.data_filename)
+            if data_size < self.start_byte + self.nbytes:
+                raise ValueError("File is smaller than its label describes")
+
+    def memmap(self):
+        """Map the pixel data of an uncompressed file into memory
+
+        Nothing is read until the array is accessed and then only the pages
+        that are touched, so it costs next to nothing to hold on to.
+
+        Returns
+        -------
+        data : numpy.memmap
+            Read only (bands, lines, samples) array of the pixel data
+
+        Raises
+        ------
+        ValueError
+            If the file is compressed
+        """
+        if self.compression is not None:
+            raise ValueError("Compressed files cannot be memory mapped")
+        return numpy.memmap(
+            self.data_filename, dtype=self.dtype, mode='r',
+            offset=self.start_byte, shape=self.shape)
+
+    def open_image(self):
+        """The pixel data in the form of :attr:`PDS3Image.image`
+
+        Uncompressed files are memory mapped, compressed files are decoded by
+        planetaryimage.
+
+        Returns
+        -------
+        image : numpy.ndarray
+            2D (lines, samples) array or 3D (lines, samples, bands) array
+        """
+        if self.compression is not None:
+            return PDS3Image.open(self.file_name).image
+        return display_form(self.memmap())
+
+    def read_strided(self, step):
+        """Read every step-th sample of every step-th line of each band
+
+        Only the lines that are kept are read, the stream seeks past the
+        others, so a large step reads a small fraction of the file. This
+        matters most on network file systems where reading is the slow part.
+
+        Parameters
+        ----------
+        step : int
+            Keep one line and sample out of step
+
+        Returns
+        -------
+        data : numpy.ndarray
+            The (bands, lines, samples) array ``data[:, ::step, ::step]``
+        """
+        line_bytes = self.samples * self.dtype.itemsize
+        lines = range(0, self.lines, step)
+        data = numpy.empty(
+            (self.bands, len(lines), len(range(0, self.samples, step))),
+            dtype=self.dtype)
+        stream, _ = _open(self.data_filename)
+        try:
+            for band in range(self.bands):
+                band_start = self.start_byte + band * self.lines * line_bytes
+                for index, line in enumerate(lines):
+                    stream.seek(band_start + line * line_bytes)
+                    buf = stream.read(line_bytes)
+                    if len(buf) < line_bytes:
+                        raise ValueError(
+                            "File is smaller than its label describes")
+                    data[band, index] = numpy.frombuffer(
+                        buf, dtype=self.dtype)[::step]
+        finally:
+            stream.close()
+        return data
+
+    def byte_ranges(self, step=1):
+        """The parts of the data file read for every step-th line
+
+        Parameters
+        ----------
+        step : int
+            Keep one line out of step, as :meth:`read_strided` does
+
+        Returns
+        -------
+        ranges : list
+            ``(offset, length)`` pairs in :attr:`data_filename`. A compressed
+            file is decompressed from the start, so it is read whole.
+        """
+        if self.compression is not None:
+            return [(0, os.path.getsize(self.data_filename))]
+        if step <= 1:
+            return [(self.start_byte, self.nbytes)]
+        line_bytes = self.samples * self.dtype.itemsize
+        return [
+            (self.start_byte + (band * self.lines + line) * line_bytes,
+             line_bytes)
+            for band in range(self.bands)
+            for line in range(0, self.lines, step)
+        ]
+
+    @property
+    def shape(self):
+        """Tuple of images bands, lines and samples"""
+        return (self.bands, self.lines, self.samples)
+
+    @property
+    def nbytes(self):
+        """Size of the pixel data in bytes"""
+        return self.bands * self.lines * self.samples * self.dtype.itemsize
+
+    def __repr__(self):
+        return self.file_name
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+"""Warm the page cache with the files the views are scrolling towards"""
+
+import os
+import time
+import threading
+
+from . import profiling
+from .pdsfile import PDSFile
+from .thumbnail import thumbnail_ranges, MEAN
+
+#: Most bytes prefetched and not loaded yet
+PREFETCH_BUDGET = 64 * 1024 * 1024
+# Where the platform has it the kernel reads ahead in the background
+WILLNEED = getattr(os, 'POSIX_FADV_WILLNEED', None)
+# Chunk read at a time when the bytes have to be read to be cached
+READ_SIZE = 1024 * 1024
+
+
+def prefetch_ranges(file_name, ranges, advise=True):
+    """Have parts of a file read into the page cache
+
+    Parameters
+    ----------
+    file_name : string
+        Path to the file
+    ranges : list
+        ``(offset, length)`` pairs of the parts to read
+    advise : bool
+        Ask the kernel to read them with posix_fadvise when the platform
+        has it and return right away. Otherwise they are read and thrown
+        away.
+    """
+    if not ranges:
+        return
+    with open(file_name, 'rb') as stream:
+        if advise and WILLNEED is not None:
+            for offset, length in ranges:
+                os.posix_fadvise(stream.fileno(), offset, length, WILLNEED)
+            return
+        buf = memoryview(bytearray(
+            min(READ_SIZE, max(length for _, length in ranges))))
+        for offset, length in ranges:
+            stream.seek(offset)
+            while length > 0:
+                read = stream.readinto(buf[:min(length, len(buf))])
+                if not read:
+                    break
+                length -= read
+
+
+class Prefetcher(object):
+    """Read ahead the files of the stamps coming into sight
+
+    A background thread parses the label of each requested file, which
+    reads it, works out the parts of the file its thumbnail is made from
+    and has them read into the page cache. The loader then finds them there
+    instead of waiting for the disk or the network.
+
+    The prefetched files count against a byte budget until they drop out of
+    the request, usually because they were loaded. Files past the budget are
+    left alone, so prefetching never evicts data it fetched before that was
+    not used yet.
+
+    Parameters
+    ----------
+    size : int
+        Maximum number of lines and samples of the thumbnails
+    decimation : string
+        How the images are reduced, which decides the parts of the files the
+        thumbnails are made from, see :func:`pystamps.thumbnail.decimate`
+    budget : int
+        Most bytes prefetched and not loaded yet
+    advise : bool
+        Use posix_fadvise where the platform has it, see
+        :func:`prefetch_ranges`
+
+    Attributes
+    ----------
+    files : int
+        Number of files prefetched
+    bytes : int
+        Number of bytes prefetched
+    """
+
+    def __init__(self, size, decimation=MEAN, budget=PREFETCH_BUDGET,
+                 advise=True):
+        self.size = size
+        self.decimation = decimation
+        self.budget = budget
+        self.advise = advise
+        self.files = 0
+        self.bytes = 0
+        self._condition = threading.Condition()
+        self._requested = set()
+        self._pending = []
+        self._prefetched = {}
+        self._used = 0
+        self._busy = False
+        self._thread = None
+        self._closed = False
+
+    @property
+    def used(self):
+        """Bytes prefetched for the files requested, out of the budget"""
+        return self._used
+
+    def request(self, file_names):
+        """Prefetch these files, nearest first, instead of the last ones
+
+        Parameters
+        ----------
+        file_names : list
+            The files to prefetch, in the order they are needed. Files that
+            were requested before and are not in the list no longer count
+            against the budget.
+        """
+        file_names = list(file_names)
+        with self._condition:
+            if self._closed:
+                return
+            self._requested = set(file_names)
+            for file_name in list(self._prefetched):
+                if file_name not in self._requested:
+                    self._used -= self._prefetched.pop(file_name)
+            self._pending = [
+                file_name for file_name in file_names
+                if file_name not in self._prefetched]
+            if self._pending and self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='prefetch')
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify_all()
+
+    def wait(self, timeout=None):
+        """Wait until the files requested are prefetched or over budget
+
+        Returns
+        -------
+        bool
+            False when the timeout expired first
+        """
+        end = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while self._pending or self._busy:
+                remaining = None if end is None else end - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return True
+
+    def close(self):
+        """Stop prefetching and wait for the thread to finish"""
+        with self._condition:
+            self._closed = True
+            self._pending = []
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._busy = False
+                self._condition.notify_all()
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                file_name = self._pending.pop(0)
+                self._busy = True
+            try:
+                with profiling.span('prefetch', file=file_name):
+                    self._prefetch(file_name)
+            except Exception:
+                # The loader reports the files it cannot read
+                pass
+
+    def _prefetch(self, file_name):
+        pds_file = PDSFile(file_name)
+        ranges = thumbnail_ranges(pds_file, self.size, self.decimation)
+        nbytes = sum(length for _, length in ranges)
+        with self._condition:
+            # A newer request may have dropped the file while its label
+            # was read
+            if file_name not in self._requested:
+                return
+            if self._used + nbytes > self.budget:
+                # Nothing more until the loader catches up
+                self._pending = []
+                return
+            self._prefetched[file_name] = nbytes
+            self._used += nbytes
+            self.files += 1
+            self.bytes += nbytes
+        prefetch_ranges(pds_file.data_filename, ranges, self.advise)
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""Time the stages of making stamps and export them as a trace
+
+Profiling is off until :func:`enable` is called, :func:`span` then costs a
+single check. Spans are timed with the wall clock so the spans recorded in
+worker processes line up with the others in the trace.
+"""
+
+import os
+import json
+import time
+import threading
+from collections import namedtuple, OrderedDict
+from contextlib import contextmanager
+
+Span = namedtuple(
+    'Span', ['name', 'start', 'duration', 'pid', 'tid', 'thread', 'args'])
+Span.__doc__ = """A timed stage of the pipeline
+
+name : string
+    The stage, for example ``'read'`` or ``'widgets'``
+start, duration : float
+    Seconds since the epoch the stage started and how long it took
+pid, tid : int
+    The process and thread the stage ran in
+thread : string
+    Name of the thread
+args : dict
+    What the stage worked on, for example the ``file``
+"""
+
+#: The stages in the order they happen to a file
+STAGES = [
+    'discover', 'prefetch', 'probe', 'read', 'decimate', 'fill', 'widgets',
+    'scale', 'draw', 'paint', 'layout',
+]
+
+_profiler = None
+
+
+class Profiler(object):
+    """Collects the spans of the stages
+
+    Attributes
+    ----------
+    spans : list
+        The Span of every stage timed so far
+    """
+
+    def __init__(self):
+        self.spans = []
+
+    @contextmanager
+    def span(self, name, **args):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.time() - start, **args)
+
+    def add(self, name, start, duration, **args):
+        """Record a stage timed elsewhere"""
+        thread = threading.current_thread()
+        self.spans.append(Span(
+            name, start, duration, os.getpid(), thread.ident, thread.name,
+            args))
+
+    def extend(self, spans):
+        """Record spans collected by another profiler, in another process"""
+        self.spans.extend(spans)
+
+    def summary(self):
+        """The count, total, mean and slowest span of each stage
+
+        Returns
+        -------
+        summary : OrderedDict
+            For each stage a dict with ``count``, ``total``, ``mean`` and
+            ``max`` seconds and the ``slowest`` span
+        """
+        stages = OrderedDict()
+        for span in self.spans:
+            stage = stages.setdefault(
+                span.name, {'count': 0, 'total': 0., 'slowest': span})
+            stage['count'] += 1
+            stage['total'] += span.duration
+            if span.duration > stage['slowest'].duration:
+                stage['slowest'] = span
+        order = dict((name, index) for index, name in enumerate(STAGES))
+        summary = OrderedDict()
+        for name in sorted(stages, key=lambda name: order.get(name, 99)):
+            stage = stages[name]
+            stage['mean'] = stage['total'] / stage['count']
+            stage['max'] = stage['slowest'].duration
+            summary[name] = stage
+        return summary
+
+    def format_summary(self):
+        """The summary as a table, one line per stage"""
+        lines = ['%-10s %8s %10s %10s %10s  %s' % (
+            'stage', 'count', 'total s', 'mean ms', 'max ms', 'slowest')]
+        for name, stage in self.summary().items():
+            lines.append('%-10s %8d %10.3f %10.3f %10.3f  %s' % (
+                name, stage['count'], stage['total'], stage['mean'] * 1000,
+                stage['max'] * 1000, stage['slowest'].args.get('file', '')))
+        return '\n'.join(lines)
+
+    def trace(self):
+        """The spans in the Chrome trace event format
+
+        Returns
+        -------
+        trace : dict
+            Complete (``'X'``) events in microseconds since the first span,
+            with the names of the processes and threads
+        """
+        origin = min(span.start for span in self.spans) if self.spans else 0
+        events = []
+        threads = OrderedDict()
+        for span in self.spans:
+            threads[(span.pid, span.tid)] = span.thread
+            events.append({
+                'name': span.name, 'cat': 'pystamps', 'ph': 'X',
+                'ts': (span.start - origin) * 1e6,
+                'dur': span.duration * 1e6,
+                'pid': span.pid, 'tid': span.tid, 'args': span.args,
+            })
+        main = os.getpid()
+        for pid in set(pid for pid, _ in threads):
+            events.append({
+                'name': 'process_name', 'ph': 'M', 'pid': pid, 'tid': 0,
+                'args': {'name': 'pystamps' if pid == main else 'worker'},
+            })
+        for (pid, tid), name in threads.items():
+            events.append({
+                'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                'args': {'name': name},
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+    def write_trace(self, file_name):
+        """Save the trace, to open in chrome://tracing or Perfetto"""
+        with open(file_name, 'w') as stream:
+            json.dump(self.trace(), stream)
+
+
+class _NoSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def enable():
+    """Start profiling with a new Profiler and return it"""
+    global _profiler
+    _profiler = Profiler()
+    return _profiler
+
+
+def disable():
+    """Stop profiling and return the Profiler, None if it was not enabled"""
+    global _profiler
+    profiler, _profiler = _profiler, None
+    return profiler
+
+
+def enabled():
+    return _profiler is not None
+
+
+def profiler():
+    """The Profiler collecting the spans, None when not profiling"""
+    return _profiler
+
+
+def add(name, start, duration, **args):
+    """Record a stage timed by the caller when profiling"""
+    if _profiler is not None:
+        _profiler.add(name, start, duration, **args)
+
+
+def span(name, **args):
+    """Time a stage in a with block when profiling
+
+    Parameters
+    ----------
+    name : string
+        The stage, see :data:`STAGES`
+    args
+        What the stage works on, for example ``file=file_name``
+    """
+    if _profiler is None:
+        return _NO_SPAN
+    return _profiler.span(name, **args)
@@ -1,62 +1,138 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
-import os
 import sys
 import math
+import time
 import argparse
-from glob import glob
-from functools import wraps
+import warnings
+from functools import wraps, partial
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
 
-from qtpy import QT_VERSION
-from planetaryimage import PDS3Image
-from matplotlib.figure import Figure
+import numpy
 from qtpy import QtWidgets, QtCore, QtGui
 
-try:
-    from pdsview import pdsview
-    PDSVIEW_INSTALLED = True
-except ImportError:
-    PDSVIEW_INSTALLED = False
-
-try:
-    from pdsspect import pdsspect
-    PDSSPECT_INSTALLED = True
-except ImportError:
-    PDSSPECT_INSTALLED = False
-
-qt_ver = int(QT_VERSION[0])
-if qt_ver == 4:
-    from matplotlib.backends.backend_qt4agg import FigureCanvasQTAgg
-elif qt_ver == 5:
-    from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
-
-app = QtWidgets.QApplication.instance()
-if not app:
-    app = QtWidgets.QApplication(sys.argv)
+from . import profiling
+from .atlas import ThumbnailAtlas
+from .cache import ThumbnailCache
+from .selection import Selection
+from .core import (
+    ImageRecord, discover, directories, file_signature, unique)
+from .pdsfile import looks_like_label
+from .loader import cpu_count, prepare_stamps_data, read_order
+from .prefetch import Prefetcher, PREFETCH_BUDGET
+from .scheduler import DecodeScheduler
+from .thumbnail import (
+    stretch, stretch_batch, CLIP_PERCENT, DECIMATION_METHODS, MEAN)
+
+# Everything that needs a display is set up by setup_gui() on first GUI use,
+# so importing pystamps is cheap and works in headless batch jobs
+app = None
+pdsview = None
+pdsspect = None
+PDSVIEW_INSTALLED = None
+PDSSPECT_INSTALLED = None
+ImageButton = None
 
 # Create Global Constants
-# Dimensions
-SCREEN_WIDTH = QtWidgets.QDesktopWidget().availableGeometry().width()
-FRAME_WIDTH = math.sqrt(SCREEN_WIDTH ** 2. * 0.15)
-TOOL_BAR_WIDTH = QtWidgets.QToolBar().iconSize().width()
-PSIZE = FRAME_WIDTH / 4.
+# Dimensions, from the screen by setup_gui()
+SCREEN_WIDTH = None
+FRAME_WIDTH = None
+TOOL_BAR_WIDTH = None
+PSIZE = None
 
 # Styles
-NOT_SELECTED = (
-    "QLabel {color: transparent; border: 3px solid rgb(240, 198, 0)}"
-)
-SELECTED = (
-    "QLabel {color: transparent; border: 3px solid rgb(255, 255, 255)}"
-)
 TOOLBAR = "QToolBar {background-color: gray}"
-TITLE_SELECTED = "QLabel{color: white; background-color: black}"
-TITLE_NOT_SELECTED = "QLabel{color: rgb(240, 198, 0); background-color: black}"
+# The borders and titles of the stamps are painted in these colors
+BORDER_WIDTH = 3
+NOT_SELECTED_COLOR = (240, 198, 0)
+SELECTED_COLOR = (255, 255, 255)
+
+# Stamp rendering backends
+MATPLOTLIB = 'matplotlib'
+QIMAGE = 'qimage'
+ITEM = 'item'
+
+# Grid cells
+STAMP_SPACING = 6.
+CELL_SIZE = None
+#: Rows above and below the viewport that keep their widgets
+OVERSCAN_ROWS = 1
+#: Rows above and below the viewport that keep their thumbnails in the atlas
+ATLAS_KEEP_ROWS = 10
+#: Milliseconds between wraps while the window is resized, one frame
+WRAP_DELAY = 16
+
+StampWidgets = namedtuple(
+    'StampWidgets', ['button', 'container', 'title', 'proxy_widget'])
+
+
+def thumbnail_size():
+    """The size of the thumbnails the GUI makes on this screen
+
+    The stamps are sized to the screen and the size is part of the key of
+    the thumbnail cache, so thumbnails made ahead of time with
+    :func:`pystamps.core.precompute` are only found by the GUI when they
+    are made with this size.
+
+    Returns
+    -------
+    size : int
+        Maximum number of lines and samples of the thumbnails
+    """
+    return ImageStamp.thumbnail_params(MEAN)[0]
 
 
-class ImageStamp(object):
+def setup_gui():
+    """Create the QApplication and what depends on it, the first time only
+
+    This works out the stamp dimensions from the screen, imports the
+    matplotlib stamp button and looks for the optional viewers.
+
+    Returns
+    -------
+    app : QtWidgets.QApplication
+        The application
+    """
+    global app, pdsview, pdsspect, PDSVIEW_INSTALLED, PDSSPECT_INSTALLED
+    global ImageButton, SCREEN_WIDTH, FRAME_WIDTH, TOOL_BAR_WIDTH, PSIZE
+    global CELL_SIZE
+    if app is not None:
+        return app
+    app = QtWidgets.QApplication.instance()
+    if not app:
+        app = QtWidgets.QApplication(sys.argv)
+
+    SCREEN_WIDTH = QtWidgets.QDesktopWidget().availableGeometry().width()
+    FRAME_WIDTH = math.sqrt(SCREEN_WIDTH ** 2. * 0.15)
+    TOOL_BAR_WIDTH = QtWidgets.QToolBar().iconSize().width()
+    PSIZE = FRAME_WIDTH / 4.
+    CELL_SIZE = PSIZE + STAMP_SPACING
+    ImageStamp.size = (PSIZE, PSIZE)
+
+    from .mplbutton import ImageButton
+    BUTTONS[MATPLOTLIB] = ImageButton
+
+    try:
+        from pdsview import pdsview
+        PDSVIEW_INSTALLED = True
+    except ImportError:
+        PDSVIEW_INSTALLED = False
+    try:
+        from pdsspect import pdsspect
+        PDSSPECT_INSTALLED = True
+    except ImportError:
+        PDSSPECT_INSTALLED = False
+    return app
+
+
+class ImageStamp(ImageRecord):
     """An image object that will be used to display the image in ImageSetView.
 
+    The GUI side of an :class:`pystamps.core.ImageRecord`, the thumbnail is
+    made to fit the stamp size.
+
     Parameters
     ----------
     file_name: string
@@ -65,6 +141,25 @@ class ImageStamp(object):
         The row the image will be in by default
     column: int
         The column the image will be in by default
+    decimation: string
+        How the image is reduced to the stamp size, ``'mean'`` (quality) or
+        ``'stride'`` (speed)
+    backend: string
+        Draw the stamp with ``'matplotlib'`` (ImageButton), ``'qimage'``
+        (PixmapButton) or ``'item'`` (StampItem, a single graphics item
+        without any widgets)
+    cache: ThumbnailCache
+        Where the thumbnail and label facts are looked up before opening the
+        file and stored after, None to not use a cache
+    data: StampData
+        The thumbnail and label facts when they were already prepared, the
+        file is then not opened
+    placeholder: bool
+        Create the widgets without opening the file, the data is given later
+        with load()
+    widgets: bool
+        Create the widgets now. A virtualized ImageSetView hands widgets to
+        the stamps that are scrolled into view with adopt_widgets() instead.
 
     Attributes
     ----------
@@ -78,60 +173,136 @@ class ImageStamp(object):
         The row the image is in
     column : int
         The column the image is in
+    index : int
+        The place of the stamp in the ImageSet it belongs to, None when it
+        belongs to none
+    pds_file : PDSFile
+        The label facts of the image, read without decoding any pixels
+    shape : tuple
+        The (bands, lines, samples) of the image
     pds_image : planetaryimage object
-        A planetaryimage object
+        A planetaryimage object, decoded the first time it is accessed, see
+        :attr:`pystamps.core.ImageRecord.low_memory`
+    thumbnail : numpy.ndarray
+        The image reduced to the stamp size, made the first time it is accessed
     size : tuple
-        The size of the image (this will be the same for every image)
+        The size of the image (this will be the same for every image), set
+        by setup_gui()
+    clip : float
+        Percent of the pixels saturated at each end when the thumbnail is
+        stretched for display, the same for every image
+    mask_special : bool
+        Leave the PDS special constants out of the stretch, the same for
+        every image
     selected : bool
         Indicate that the image is selected (True) or not (False)
     pds_compatible: bool
-        Indicates whether planetaryimage can open the file
+        Indicates whether the label describes an image planetaryimage can open
+        (assumed True for a placeholder until it is loaded)
+    loaded : bool
+        False for a placeholder waiting for its data
+    button, container, title, proxy_widget : QtWidgets.QWidget
+        The widgets displaying the stamp, None when it has none. With the
+        ``'item'`` backend the StampItem is both the button and the
+        proxy_widget put in the scene and there is no container or title.
     """
 
-    size = (PSIZE, PSIZE)
+    __slots__ = (
+        'row', 'column', 'index', '_selected', 'backend', 'button',
+        'container', 'title', 'proxy_widget',
+    )
+
+    size = None
+    clip = CLIP_PERCENT
+    mask_special = True
 
-    def __init__(self, file_name, row, column):
-        self.file_name = file_name
-        self.abspath = os.path.abspath(file_name)
-        self.basename = os.path.basename(file_name)
+    def __init__(self, file_name, row, column, decimation=MEAN,
+                 backend=MATPLOTLIB, cache=None, data=None,
+                 placeholder=False, widgets=True):
+        size, _ = self.thumbnail_params(decimation)
+        super(ImageStamp, self).__init__(
+            file_name, size, decimation, cache, data, placeholder)
         self.row = row
         self.column = column
+        self.index = None
         self._selected = False
         self.button = None
         self.container = None
         self.title = None
         self.proxy_widget = None
-        try:
-            self.pds_image = PDS3Image.open(file_name)
-            self.pds_compatible = True
-        except Exception:
-            self.pds_image = None
-            self.pds_compatible = False
-
-        if self.pds_compatible:
-            self._create_button()
-            self._create_title()
-            self._create_proxy_widget()
+        self.backend = backend
+
+        if self.pds_compatible and widgets:
+            self.create_widgets()
 
     def __must_be_pds_compatible(func):
         @wraps(func)
-        def wrapper(self):
+        def wrapper(self, *args, **kwargs):
             if not self.pds_compatible:
                 raise RuntimeError("Image not pds compatible")
-            return func(self)
+            return func(self, *args, **kwargs)
         return wrapper
 
     @__must_be_pds_compatible
     def display_selected(self):
         """Change the border to white"""
-        self.container.setStyleSheet(SELECTED)
-        self.title.setStyleSheet(TITLE_SELECTED)
+        if self.container is None:
+            self.button.update()
+            return
+        self.container.set_selected(True)
+        self.title.set_selected(True)
 
     @__must_be_pds_compatible
     def display_not_selected(self):
         """Change the border yellow"""
-        self.container.setStyleSheet(NOT_SELECTED)
-        self.title.setStyleSheet(TITLE_NOT_SELECTED)
+        if self.container is None:
+            self.button.update()
+            return
+        self.container.set_selected(False)
+        self.title.set_selected(False)
+
+    def load(self, data, scaled=None):
+        """Fill a placeholder with its data and draw the thumbnail
+
+        Parameters
+        ----------
+        data : StampData
+            The prepared thumbnail and label facts of the file
+        scaled : numpy.ndarray
+            The thumbnail already stretched to 8 bits, see stretched()
+        """
+        super(ImageStamp, self).load(data)
+        if self.pds_compatible and self.button is not None:
+            self.button.show_thumbnail(scaled)
+
+    def stretched(self):
+        """The thumbnail stretched to 8 bits for display"""
+        with profiling.span('scale', file=self.file_name):
+            return stretch(self.thumbnail, self.clip, self.mask_special)
+
+    @classmethod
+    def stretch_thumbnails(cls, thumbnails):
+        """Stretch many thumbnails for display in batches
+
+        Returns
+        -------
+        scaled : list
+            The 8 bit form of each thumbnail, see stretched()
+        """
+        with profiling.span('scale', files=len(thumbnails)):
+            return stretch_batch(thumbnails, cls.clip, cls.mask_special)
+
+    def unload(self):
+        """Forget the data of the file and clear the thumbnail"""
+        super(ImageStamp, self).unload()
+        if self.button is not None:
+            self.button.clear()
+
+    @classmethod
+    def thumbnail_params(cls, decimation):
+        """The (size, decimation) the thumbnail is made with"""
+        setup_gui()
+        return (int(math.ceil(max(cls.size))), decimation)
 
     @property
     def selected(self):
@@ -143,32 +314,93 @@ class ImageStamp(object):
         if not state_changed:
             return
         self._selected = selected_state
-        if self._selected and self.pds_compatible:
+        if not self.pds_compatible or self.button is None:
+            return
+        if self._selected:
             self.display_selected()
-        elif not self._selected and self.pds_compatible:
+        else:
             self.display_not_selected()
 
     @__must_be_pds_compatible
-    def _create_button(self):
+    def create_widgets(self, scaled=None):
+        """Create the button, title and proxy widget of the stamp
+
+        Parameters
+        ----------
+        scaled : numpy.ndarray
+            The thumbnail already stretched to 8 bits, see stretched()
+        """
+        setup_gui()
+        with profiling.span('widgets', file=self.file_name):
+            if self.backend == ITEM:
+                # The item paints the border and title itself
+                self.button = self.proxy_widget = StampItem(
+                    self, scaled=scaled)
+                return
+            self._create_button(scaled)
+            self._create_title()
+            self._create_proxy_widget()
+
+    def release_widgets(self):
+        """Take the widgets away from the stamp so another can adopt them
+
+        Returns
+        -------
+        widgets : StampWidgets
+            The button, container, title and proxy widget of the stamp
+        """
+        widgets = StampWidgets(
+            self.button, self.container, self.title, self.proxy_widget)
+        self.button = None
+        self.container = None
+        self.title = None
+        self.proxy_widget = None
+        return widgets
+
+    @__must_be_pds_compatible
+    def adopt_widgets(self, widgets):
+        """Display the stamp in widgets released by another stamp
+
+        Parameters
+        ----------
+        widgets : StampWidgets
+            Widgets from release_widgets() of a stamp with the same backend
+        """
+        self.button, self.container, self.title, self.proxy_widget = widgets
+        self.button.image_stamp = self
+        if self.title is not None:
+            self.title.setText(self.basename)
+            self._fit_title()
+        if self._selected:
+            self.display_selected()
+        else:
+            self.display_not_selected()
+        self.button.clear()
+        if self.loaded:
+            self.button.show_thumbnail()
+
+    @__must_be_pds_compatible
+    def _create_button(self, scaled=None):
         """Create the button and set in the container"""
-        self.button = ImageButton(self)
+        self.button = BUTTONS[self.backend](self, scaled=scaled)
 
         # Create image container to create border, set button as parent
-        self.container = QtWidgets.QLabel()
+        self.container = StampBorder()
         self.container.setParent(self.button)
-        self.container.setStyleSheet(NOT_SELECTED)
 
     @__must_be_pds_compatible
     def _create_title(self):
         """Create images title"""
         # Make Title for each image as the file name, set button as parent
-        self.title = QtWidgets.QLabel(self.basename, self.button)
+        self.title = StampTitle(self.basename, self.button)
         self.title.setFont(QtGui.QFont('Helvetica', 12))
-        self.title.setStyleSheet(TITLE_NOT_SELECTED)
         self.title.setAlignment(QtCore.Qt.AlignTop)
         self.title.setFixedWidth(PSIZE)
+        self._fit_title()
 
-        # Make image title fit in space by decreasing font size
+    def _fit_title(self):
+        """Make image title fit in space by decreasing font size"""
+        self.title.setFont(QtGui.QFont('Helvetica', 12))
         title_metrics = self.title.fontMetrics()
         title_width = title_metrics.boundingRect(self.title.text()).width()
         font_size = 12
@@ -187,17 +419,46 @@ class ImageStamp(object):
         self.proxy_widget.setMinimumSize(PSIZE, PSIZE)
         self.proxy_widget.setPalette(QtGui.QPalette(QtCore.Qt.black))
 
-    def __repr__(self):
-        return self.file_name
-
 
 class ImageSet(object):
     """A set of PDS images to be displayed in Pystamps.
 
     Parameters
     ----------
-    filepaths: list
-        A list of file paths to pass through ImageStamp
+    filepaths: list or iterable
+        A list of file paths to pass through ImageStamp. When progressive,
+        an iterator such as :func:`pystamps.core.discover` is consumed by
+        the loader thread and stamps are added as the files are found.
+    decimation: string
+        How each image is reduced to the stamp size, see ImageStamp
+    backend: string
+        How each stamp is drawn, see ImageStamp
+    cache: ThumbnailCache
+        Cache of thumbnails shared by the stamps, None to not use a cache
+    workers: int
+        Number of processes decoding images, None for one per CPU
+    progressive: bool
+        Create a placeholder stamp for every file right away and fill them in
+        from a background thread started with ``loader.start()``. Files that
+        turn out not to be PDS images are removed as they are found.
+    virtual: bool
+        Do not create widgets for the stamps, the views only create them for
+        the rows in sight and reuse them while scrolling
+    records: list
+        Loaded ImageRecords made beforehand, for example by
+        :func:`pystamps.core.precompute`. Their files are not opened again.
+    on_demand: bool
+        When progressive, only load the stamps the views have in sight or
+        are scrolling towards, see prioritize()
+    prefetch: int
+        When progressive, rows past the next screenful whose files are read
+        into the page cache ahead of loading them, see prefetch_files()
+    prefetch_budget: int
+        Most bytes read ahead and not loaded yet
+    disk_order: bool
+        Decode the files in the order they are laid out on disk rather than
+        the order given, for fewer seeks on hard disks and network file
+        systems. The stamps stay in the order given.
 
     Attribute
     ---------
@@ -205,35 +466,278 @@ class ImageSet(object):
         A list of ginga images with attributes set in ImageStamp that can be
         displayed in Pystmaps
     columns : int
-        Number of columns the grid layout has
+        Number of columns of the grid
+    selection : Selection
+        The selected ImageStamps in the order they were selected
     selected_images : list
-        List of ImageStamp that are selected
+        List of ImageStamp that are selected, in the order they were selected
+    loader : ImageSetLoader
+        The background loader when progressive, otherwise None
+    prefetch_rows : int
+        Rows the views read ahead past the next screenful
+    prefetcher : Prefetcher
+        Reads the files ahead when prefetching, otherwise None
+    virtual : bool
+        Whether the views only create widgets for the stamps in sight
+    rows, cols : numpy.ndarray
+        The row and column of each image, in the order of ``images``
+    selected_mask : numpy.ndarray
+        Whether each image is selected
+    shapes : numpy.ndarray
+        The (bands, lines, samples) of each image, zeros until loaded
     """
-    def __init__(self, filepaths):
+    def __init__(self, filepaths, decimation=MEAN, backend=MATPLOTLIB,
+                 cache=None, workers=1, progressive=False, virtual=False,
+                 records=None, on_demand=False, prefetch=0,
+                 prefetch_budget=PREFETCH_BUDGET, disk_order=False):
         self._views = set()
+        self.virtual = virtual
+        self.decimation = decimation
+        self.backend = backend
+
+        known = dict(
+            (record.file_name, record.data) for record in records or ()
+            if record.loaded)
+        self._known = known
 
-        # Remove any duplicates while maintaining order
-        seen = {}
-        inlist = []
-        for filepath in filepaths:
-            if filepath not in seen:
-                seen[filepath] = 1
-                inlist.append(filepath)
-
-        # Create image objects with attributes set in ImageStamp
         self.images = []
         self.columns = 4
-        row = 0
-        column = 0
-        for image in inlist:
-            image_stamp = ImageStamp(image, row, column)
-            if image_stamp.pds_compatible:
-                self.images.append(image_stamp)
-                column += 1
-                if column == self.columns:
-                    row += 1
-                    column = 0
-        self.selected_images = []
+        self.selection = Selection()
+        self.loader = None
+        self.prefetch_rows = prefetch if progressive else 0
+        self.prefetcher = None
+        if self.prefetch_rows:
+            self.prefetcher = Prefetcher(
+                *ImageStamp.thumbnail_params(decimation),
+                budget=prefetch_budget)
+        self._placeholders = []
+        # The loader job of each placeholder, its index in _placeholders
+        self._jobs = {}
+        # Per image arrays, so the whole grid is handled in single operations
+        self.rows = numpy.zeros(0, dtype=numpy.intp)
+        self.cols = numpy.zeros(0, dtype=numpy.intp)
+        self.selected_mask = numpy.zeros(0, dtype=bool)
+        self.shapes = numpy.zeros((0, 3), dtype=numpy.intp)
+        if progressive and not isinstance(filepaths, (list, tuple)):
+            # Files are found and loaded in the loader thread, which hands
+            # over each batch of found files before loading it
+            self.loader = ImageSetLoader(
+                filepaths, decimation, cache, workers, on_demand, disk_order)
+            self.loader.found.connect(self.add_placeholders)
+            self.loader.loaded.connect(self.load_images)
+            return
+
+        # Remove any duplicates while maintaining order
+        inlist = unique(filepaths)
+        if progressive:
+            stamps = self.create_placeholders(inlist)
+            self.add_images(
+                [stamp for stamp in stamps if stamp.pds_compatible])
+            self._placeholders = [
+                stamp for stamp in stamps if not stamp.loaded]
+            self._jobs = dict(
+                (stamp, job) for job, stamp in enumerate(self._placeholders))
+            self.loader = ImageSetLoader(
+                [stamp.file_name for stamp in self._placeholders],
+                decimation, cache, workers, on_demand, disk_order)
+            self.loader.loaded.connect(self.load_images)
+            return
+
+        # Decode the images, in worker processes when asked, and keep only
+        # the widget creation in this thread
+        stamps_data = [known.get(image) for image in inlist]
+        missing = [
+            index for index, data in enumerate(stamps_data) if data is None]
+        params = ImageStamp.thumbnail_params(decimation)
+        for index, data in prepare_stamps_data(
+                [inlist[index] for index in missing], *params, cache=cache,
+                workers=workers, disk_order=disk_order):
+            stamps_data[missing[index]] = data
+
+        # Create image objects with attributes set in ImageStamp, the widgets
+        # after the thumbnails are stretched together
+        stamps = [
+            ImageStamp(
+                image, 0, 0, decimation, backend, cache, data, widgets=False)
+            for image, data in zip(inlist, stamps_data)
+        ]
+        stamps = [stamp for stamp in stamps if stamp.pds_compatible]
+        if not virtual:
+            scaled = ImageStamp.stretch_thumbnails(
+                [stamp.thumbnail for stamp in stamps])
+            for stamp, data in zip(stamps, scaled):
+                stamp.create_widgets(data)
+        self.add_images(stamps)
+
+    def create_placeholders(self, file_names):
+        """Make placeholder stamps for files, not yet added to the set
+
+        Files of the records the set was made with are loaded right away.
+
+        Parameters
+        ----------
+        file_names : list
+            The files to make stamps for
+
+        Returns
+        -------
+        stamps : list
+            An ImageStamp for each file
+        """
+        return [
+            ImageStamp(
+                file_name, 0, 0, self.decimation, self.backend,
+                data=self._known.get(file_name),
+                placeholder=file_name not in self._known,
+                widgets=not self.virtual)
+            for file_name in file_names
+        ]
+
+    def add_placeholders(self, file_names):
+        """Add a placeholder stamp for each of the files the loader found
+
+        Parameters
+        ----------
+        file_names : list
+            The files in the order the loader will index them
+        """
+        stamps = self.create_placeholders(file_names)
+        self._jobs.update(
+            (stamp, job) for job, stamp in enumerate(
+                stamps, len(self._placeholders)))
+        self._placeholders.extend(stamps)
+        self.add_images([stamp for stamp in stamps if stamp.pds_compatible])
+
+    def add_images(self, images):
+        """Append images to the set and show them in the views"""
+        start = len(self.images)
+        self.images.extend(images)
+        for index, image in enumerate(images, start):
+            image.index = index
+        count = len(images)
+        self.rows = numpy.append(self.rows, numpy.fromiter(
+            (image.row for image in images), numpy.intp, count))
+        self.cols = numpy.append(self.cols, numpy.fromiter(
+            (image.column for image in images), numpy.intp, count))
+        self.selected_mask = numpy.append(self.selected_mask, numpy.fromiter(
+            (image.selected for image in images), bool, count))
+        shapes = numpy.zeros((count, 3), dtype=numpy.intp)
+        for row, image in enumerate(images):
+            if image.loaded:
+                shapes[row] = image.shape
+        self.shapes = numpy.concatenate([self.shapes, shapes])
+        self.set_images_positions()
+        for view in self._views:
+            view.add_images(images)
+
+    def _owns(self, image):
+        index = image.index
+        return (
+            index is not None and index < len(self.images) and
+            self.images[index] is image)
+
+    def load_images(self, loaded):
+        """Fill placeholders with their data, removing incompatible files
+
+        Parameters
+        ----------
+        loaded : list
+            Pairs of the index of a file in the files the loader was given
+            and its StampData
+        """
+        for index, _ in loaded:
+            self._jobs.pop(self._placeholders[index], None)
+        self.fill_placeholders(self._placeholders, loaded)
+
+    def prioritize(self, visible, ahead=()):
+        """Have the loader load these placeholders before the others
+
+        Parameters
+        ----------
+        visible : list
+            The stamps in sight, loaded first
+        ahead : list
+            The stamps that come into sight next, loaded after them
+        """
+        jobs = self._jobs
+        if self.loader is None or not jobs:
+            return
+        self.loader.scheduler.update_view(
+            [jobs[image] for image in visible if image in jobs],
+            [jobs[image] for image in ahead if image in jobs])
+
+    def prefetch_files(self, images):
+        """Have the files of these placeholders read ahead of loading
+
+        Parameters
+        ----------
+        images : list
+            The stamps coming into sight after the next screenful, nearest
+            first. The stamps already loaded are skipped.
+        """
+        if self.prefetcher is None:
+            return
+        self.prefetcher.request([
+            image.file_name for image in images if image in self._jobs])
+
+    def fill_placeholders(self, stamps, loaded):
+        """Fill stamps with their data, removing incompatible files
+
+        Parameters
+        ----------
+        stamps : list
+            The stamps of the files a loader was given, in the same order
+        loaded : list
+            Pairs of the index of a stamp and its StampData
+        """
+        not_compatible = []
+        with profiling.span('fill', files=len(loaded)):
+            # Stretch the thumbnails that are drawn right away in one go
+            shown = [
+                (index, data.thumbnail) for index, data in loaded
+                if data.compatible and stamps[index].button is not None]
+            scaled = dict(zip(
+                [index for index, _ in shown],
+                ImageStamp.stretch_thumbnails(
+                    [thumbnail for _, thumbnail in shown])))
+            for index, data in loaded:
+                image = stamps[index]
+                image.load(data, scaled.get(index))
+                # A file may have been removed from the set while it loaded
+                if not self._owns(image):
+                    continue
+                if image.pds_compatible:
+                    self.shapes[image.index] = image.shape
+                else:
+                    not_compatible.append(image)
+        if not_compatible:
+            self.remove_images(not_compatible)
+
+    def remove_images(self, images):
+        """Remove images from the set and the views and close the gaps"""
+        removed = set(images)
+        keep = numpy.fromiter(
+            (image not in removed for image in self.images), bool,
+            len(self.images))
+        # Modify in place, the views hold on to these lists
+        self.images[:] = [
+            image for image, kept in zip(self.images, keep) if kept]
+        for index, image in enumerate(self.images):
+            image.index = index
+        for image in removed:
+            image.index = None
+        self.rows = self.rows[keep]
+        self.cols = self.cols[keep]
+        self.selected_mask = self.selected_mask[keep]
+        self.shapes = self.shapes[keep]
+        self.selection.difference_update(images)
+        if self.loader is not None:
+            self.loader.scheduler.cancel([
+                self._jobs.pop(image) for image in images
+                if image in self._jobs])
+        for view in self._views:
+            view.remove_images(images)
+        self.set_images_positions()
 
     def register(self, view):
         self._views.add(view)
@@ -241,37 +745,578 @@ class ImageSet(object):
     def unregister(self, view):
         self._views.remove(view)
 
+    @property
+    def selected_images(self):
+        return self.selection.to_list()
+
+    @selected_images.setter
+    def selected_images(self, images):
+        self.selection = Selection(images)
+        self.selected_mask[:] = False
+        for image in self.selection:
+            if self._owns(image):
+                self.selected_mask[image.index] = True
+
     def set_image_selected(self, image):
         """Set the image as selected, add to list, and display selection"""
-        image.selected = True
-        if image not in self.selected_images:
-            self.selected_images.append(image)
-        # for view in self._views:
-        #     view.display_selected(image)
+        self.set_images_selected([image], True)
 
     def set_image_not_selected(self, image):
         """Set image as not selected, remove from list, display unselection"""
-        image.selected = False
-        if image in self.selected_images:
-            self.selected_images.remove(image)
-        # for view in self._views:
-        #     view.display_not_selected(image)
+        self.set_images_selected([image], False)
+
+    def set_images_selected(self, images, selected):
+        """Select or unselect many images, updating the selection once
+
+        Only the stamps whose state changes are touched. Their borders and
+        titles are painted in the color of their state instead of being
+        styled, so each only schedules a repaint and Qt paints the view once
+        for all of them.
+
+        Parameters
+        ----------
+        images : iterable
+            The ImageStamps to change
+        selected : bool
+            Select (True) or unselect (False) the images
+        """
+        changed = []
+        for image in images:
+            in_selection = image in self.selection
+            if image.selected != selected or in_selection != selected:
+                image.selected = selected
+                changed.append(image)
+            if self._owns(image):
+                self.selected_mask[image.index] = selected
+        if selected:
+            self.selection.update(changed)
+        else:
+            self.selection.difference_update(changed)
+
+    def select_mask(self, mask, selected=True):
+        """Select or unselect the images where mask is True
+
+        Only the images whose state changes are touched, for example
+        ``image_set.select_mask(image_set.shapes[:, 1] > 1024)`` selects the
+        images with more than 1024 lines.
+
+        Parameters
+        ----------
+        mask : numpy.ndarray
+            A boolean for each image, in the order of ``images``
+        selected : bool
+            Select (True) or unselect (False) the images
+        """
+        mask = numpy.asarray(mask, dtype=bool)
+        changed = numpy.flatnonzero(mask & (self.selected_mask != selected))
+        self.set_images_selected(
+            [self.images[index] for index in changed], selected)
+
+    def select_all(self):
+        """Select every image, appended in grid order"""
+        self.select_mask(numpy.ones(len(self.images), dtype=bool))
+
+    def unselect_all(self):
+        """Unselect every image"""
+        self.select_mask(numpy.ones(len(self.images), dtype=bool), False)
+
+    def invert_selection(self):
+        """Select the images that are not selected and unselect the others"""
+        not_selected = ~self.selected_mask
+        self.set_images_selected(self.selection.to_list(), False)
+        self.select_mask(not_selected)
+
+    def select_range(self, first, last):
+        """Select the images from first to last, inclusive, in grid order
+
+        Parameters
+        ----------
+        first, last : ImageStamp
+            The images at either end of the range, in any order
+
+        Raises
+        ------
+        ValueError
+            If either image is not in the set, for example because it was
+            removed
+        """
+        for image in (first, last):
+            if not self._owns(image):
+                raise ValueError("%s is not in the image set" % image)
+        start, stop = sorted((first.index, last.index))
+        self.set_images_selected(self.images[start:stop + 1], True)
+
+    def select_where(self, predicate):
+        """Select the images for which predicate(image) is true"""
+        self.set_images_selected(
+            [image for image in self.images if predicate(image)], True)
 
     def set_images_positions(self):
-        """Assign the positions based on columns and display in grid"""
-        row = 0
-        column = 0
-        for image in self.images:
+        """Assign the positions based on columns and move changed images"""
+        with profiling.span('layout', images=len(self.images)):
+            rows, cols = numpy.divmod(
+                numpy.arange(len(self.images)), max(self.columns, 1))
             # Reassign position only if different than before
-            image.row = row
-            image.column = column
-            column += 1
-            if column == self.columns:
-                row += 1
-                column = 0
+            indices = numpy.flatnonzero(
+                (rows != self.rows) | (cols != self.cols))
+            self.rows = rows
+            self.cols = cols
+            moved = []
+            for index, row, column in zip(
+                    indices.tolist(), rows[indices].tolist(),
+                    cols[indices].tolist()):
+                image = self.images[index]
+                image.row = row
+                image.column = column
+                moved.append(image)
+
+            for view in self._views:
+                view.move_images(moved)
+
+
+class ImageSetLoader(QtCore.QThread):
+    """Prepare the stamps of an ImageSet in a background thread
+
+    Results are emitted in batches with the loaded signal, the first one as
+    soon as it is ready and then at most every BATCH_INTERVAL seconds, so the
+    view is not repainted for every single file.
+
+    An iterator of file paths is consumed in this thread. The files are
+    loaded in chunks, each announced with the found signal before it is
+    loaded. The first chunk is small so stamps show up right away and the
+    chunks double in size up to MAX_CHUNK, or are cut short when finding
+    the files takes longer than BATCH_INTERVAL.
+
+    The files found are queued in a DecodeScheduler and taken TAKE_SIZE per
+    worker at a time, so the views can move the stamps in sight to the
+    front with ImageSet.prioritize() while loading. One pool of worker
+    processes is used for all of them.
+
+    The discovered signal is emitted once every file is found and queued.
+    On demand the thread then keeps waiting for stamps to come into sight
+    and only finishes when stopped.
 
-        for view in self._views:
-            view.set_grid_layout()
+    Parameters
+    ----------
+    filepaths: list or iterable
+        The deduplicated file paths of the ImageSet, or an iterator
+        yielding them as they are found
+    decimation: string
+        How each image is reduced to the stamp size, see ImageStamp
+    cache: ThumbnailCache
+        Cache of thumbnails, None to not use a cache
+    workers: int
+        Number of processes decoding images, None for one per CPU
+    on_demand: bool
+        Only decode the files whose stamps are in sight or coming into
+        sight, see DecodeScheduler. The thread then runs until stopped.
+    disk_order: bool
+        Queue the files in the order they are laid out on disk, see
+        :func:`pystamps.loader.read_order`, each chunk of them when
+        streaming. The stamps in sight still come first.
+
+    Attributes
+    ----------
+    streaming : bool
+        Whether the file paths are an iterator consumed while loading
+    total : int
+        Number of files to load, growing as files are found when streaming
+    found_all : bool
+        Whether every file was found and queued
+    scheduler : DecodeScheduler
+        The queue of files to load, by their index in the files found
+    """
+
+    loaded = QtCore.Signal(object)
+    found = QtCore.Signal(object)
+    discovered = QtCore.Signal()
+
+    BATCH_INTERVAL = 0.1
+    FIRST_CHUNK = 16
+    MAX_CHUNK = 1024
+    TAKE_SIZE = 8
+
+    def __init__(self, filepaths, decimation=MEAN, cache=None, workers=1,
+                 on_demand=False, disk_order=False):
+        super(ImageSetLoader, self).__init__()
+        self.filepaths = filepaths
+        self.disk_order = disk_order
+        self.decimation = decimation
+        self.cache = cache
+        self.workers = workers
+        self.streaming = not isinstance(filepaths, (list, tuple))
+        self.total = 0 if self.streaming else len(filepaths)
+        self.found_all = False
+        self.scheduler = DecodeScheduler(on_demand)
+        self._files = []
+        self._workers = 1
+        self._executor = None
+        self._stopped = False
+        self._last_emit = 0.
+        # Worked out here because it needs the GUI thread
+        self._params = ImageStamp.thumbnail_params(decimation)
+        # Working out the disk order looks at every file, which is left to
+        # the thread
+        if not self.streaming and not disk_order:
+            self._queue(filepaths)
+
+    def run(self):
+        workers = self.workers
+        if workers is None:
+            workers = cpu_count()
+        self._workers = workers
+        if workers > 1 and (self.streaming or self.total > 1):
+            self._executor = ProcessPoolExecutor(workers)
+        try:
+            if self.streaming:
+                self._find()
+            elif self.disk_order:
+                self._queue(self.filepaths)
+            if not self._stopped:
+                self.found_all = True
+                self.discovered.emit()
+            # On demand, wait for the stamps scrolled into sight until stopped
+            self._drain(self.scheduler.on_demand)
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+                self._executor = None
+
+    @property
+    def files(self):
+        """The files queued so far, in the order found"""
+        return self._files
+
+    def _find(self):
+        """Consume the file paths, loading each chunk as it is found"""
+        chunk = []
+        chunk_size = self.FIRST_CHUNK
+        started = time.time()
+        for file_name in self.filepaths:
+            if self._stopped:
+                return
+            chunk.append(file_name)
+            if (len(chunk) >= chunk_size or
+                    time.time() - started >= self.BATCH_INTERVAL):
+                profiling.add(
+                    'discover', started, time.time() - started,
+                    files=len(chunk))
+                self.total += len(chunk)
+                self.found.emit(chunk)
+                self._queue(chunk)
+                if not self._drain():
+                    return
+                chunk = []
+                chunk_size = min(chunk_size * 2, self.MAX_CHUNK)
+                started = time.time()
+        if chunk and not self._stopped:
+            profiling.add(
+                'discover', started, time.time() - started, files=len(chunk))
+            self.total += len(chunk)
+            self.found.emit(chunk)
+            self._queue(chunk)
+
+    def _queue(self, file_names):
+        start = len(self._files)
+        self._files.extend(file_names)
+        if self.disk_order:
+            self.scheduler.submit(
+                start + index for index in read_order(file_names))
+        else:
+            self.scheduler.submit(range(start, len(self._files)))
+
+    def _drain(self, wait=False):
+        """Load the queued files, most urgent first
+
+        Returns False when loading was stopped.
+        """
+        take_size = self.TAKE_SIZE * max(self._workers, 1)
+        while not self._stopped:
+            jobs = self.scheduler.take(take_size, wait)
+            if not jobs:
+                return True
+            if not self._load(jobs):
+                return False
+        return False
+
+    def _load(self, jobs):
+        """Load the files of jobs, emitting their indices
+
+        Returns False when loading was stopped.
+        """
+        results = prepare_stamps_data(
+            [self._files[job] for job in jobs], *self._params,
+            cache=self.cache, workers=self._workers, executor=self._executor)
+        batch = []
+        try:
+            for index, data in results:
+                if self._stopped:
+                    return False
+                self.scheduler.done()
+                batch.append((jobs[index], data))
+                if time.time() - self._last_emit >= self.BATCH_INTERVAL:
+                    self.loaded.emit(batch)
+                    batch = []
+                    self._last_emit = time.time()
+        finally:
+            results.close()
+        if batch:
+            self.loaded.emit(batch)
+        return True
+
+    def stop(self):
+        """Stop loading and wait for the thread to finish"""
+        self._stopped = True
+        self.scheduler.close()
+        self.wait()
+
+
+class DirectoryScanner(QtCore.QThread):
+    """List files and their signatures in a background thread
+
+    Parameters
+    ----------
+    inlist, recursive, include, exclude
+        How the files are found, see :func:`pystamps.core.discover`. The
+        prefilter is left to the receiver so it only reads new files.
+
+    Attributes
+    ----------
+    files : list
+        Pairs of each file found and its :func:`file_signature`, in the
+        order found, filled in when the thread finishes
+    """
+
+    def __init__(self, inlist=None, recursive=False, include=None,
+                 exclude=None):
+        super(DirectoryScanner, self).__init__()
+        self.inlist = inlist
+        self.recursive = recursive
+        self.include = include
+        self.exclude = exclude
+        self.files = []
+
+    def run(self):
+        with profiling.span('discover'):
+            self.files = [
+                (file_name, file_signature(file_name))
+                for file_name in discover(
+                    self.inlist, self.recursive, self.include, self.exclude,
+                    prefilter=False)
+            ]
+
+
+class ImageSetWatcher(QtCore.QObject):
+    """Keep an ImageSet in step with the directories it was made from
+
+    Changes are noticed by watching the directories with a
+    QFileSystemWatcher and, for network file systems and files rewritten in
+    place, by polling. Each rescan lists the files in a background thread
+    and only touches the stamps of files that were added, changed or
+    removed, so the others keep their widgets, place and selection.
+
+    Parameters
+    ----------
+    image_set : ImageSet
+        The set to update
+    inlist, recursive, include, exclude
+        How the files of the set were found, see
+        :func:`pystamps.core.discover`
+    cache : ThumbnailCache
+        Cache of thumbnails, None to not use a cache
+    workers : int
+        Number of processes decoding new and changed images, when there are
+        at least POOL_FILES of them. Fewer are decoded in the loader thread,
+        which is quicker than starting the processes.
+    poll_interval : int
+        Milliseconds between rescans when nothing was noticed, 0 to only
+        rescan on notifications
+
+    Attributes
+    ----------
+    watcher : QtCore.QFileSystemWatcher
+        Watches the directories the files are found in
+    """
+
+    updated = QtCore.Signal(object, object, object)
+
+    RESCAN_DELAY = 250
+    POOL_FILES = 32
+
+    def __init__(self, image_set, inlist=None, recursive=False, include=None,
+                 exclude=None, cache=None, workers=1, poll_interval=5000):
+        super(ImageSetWatcher, self).__init__()
+        self.image_set = image_set
+        self.inlist = inlist
+        self.recursive = recursive
+        self.include = include
+        self.exclude = exclude
+        self.cache = cache
+        self.workers = workers
+        # Signature of every file seen, including those that were rejected
+        self._seen = {}
+        self._loaders = []
+        self._scanner = None
+        self._pending = False
+        self.watcher = QtCore.QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.schedule_rescan)
+        # Rescan once for a burst of notifications
+        self.rescan_timer = QtCore.QTimer(self)
+        self.rescan_timer.setSingleShot(True)
+        self.rescan_timer.setInterval(self.RESCAN_DELAY)
+        self.rescan_timer.timeout.connect(self.rescan)
+        self.poll_timer = QtCore.QTimer(self)
+        self.poll_timer.setInterval(poll_interval)
+        self.poll_timer.timeout.connect(self.schedule_rescan)
+
+        self._record(
+            image.file_name
+            for image in image_set.images + image_set._placeholders)
+        loader = image_set.loader
+        if loader is not None and loader.streaming:
+            loader.found.connect(self._record)
+        self._watch(directories(inlist, recursive, self._seen))
+
+    def _record(self, file_names):
+        for file_name in file_names:
+            self._seen[file_name] = file_signature(file_name)
+
+    def _watch(self, paths):
+        watched = set(self.watcher.directories())
+        new = [path for path in paths if path not in watched]
+        if new:
+            self.watcher.addPaths(new)
+
+    def start(self):
+        """Start polling, notifications are handled from the start"""
+        if self.poll_timer.interval() > 0:
+            self.poll_timer.start()
+
+    def stop(self):
+        """Stop watching and wait for the background threads"""
+        self.poll_timer.stop()
+        self.rescan_timer.stop()
+        watched = self.watcher.directories()
+        if watched:
+            self.watcher.removePaths(watched)
+        if self._scanner is not None:
+            self._scanner.wait()
+        for loader in list(self._loaders):
+            loader.stop()
+
+    def schedule_rescan(self, *args):
+        """Rescan soon, once for all the changes noticed until then"""
+        if not self.rescan_timer.isActive():
+            self.rescan_timer.start()
+
+    def rescan(self):
+        """List the files again in the background and then apply changes"""
+        loader = self.image_set.loader
+        if (loader is not None and loader.isRunning() and
+                not loader.found_all):
+            # The files are still being found for the first time
+            self.schedule_rescan()
+            return
+        if self._scanner is not None:
+            self._pending = True
+            return
+        self._scanner = DirectoryScanner(
+            self.inlist, self.recursive, self.include, self.exclude)
+        self._scanner.finished.connect(self._scanned)
+        self._scanner.start()
+
+    def _scanned(self):
+        files = self._scanner.files
+        self._scanner = None
+        self.apply(files)
+        if self._pending:
+            self._pending = False
+            self.schedule_rescan()
+
+    def apply(self, files):
+        """Add, reload and remove stamps to match the files listed
+
+        Parameters
+        ----------
+        files : list
+            Pairs of each file found and its :func:`file_signature`, in
+            the order found
+
+        Returns
+        -------
+        added, changed, removed : list
+            The files that are new, that changed and that are gone
+        """
+        loader = self.image_set.loader
+        if (loader is not None and loader.streaming and
+                (loader.found_all or loader.isFinished())):
+            # Files found before the watcher was connected to the loader
+            self._record(
+                file_name for file_name in loader.files
+                if file_name not in self._seen)
+        stamps = dict(
+            (image.file_name, image) for image in self.image_set.images)
+        found = set()
+        added = []
+        changed = []
+        for file_name, signature in files:
+            if signature is None:
+                continue
+            found.add(file_name)
+            known = file_name in self._seen
+            seen = self._seen.get(file_name)
+            self._seen[file_name] = signature
+            if not known:
+                added.append(file_name)
+            elif seen != signature:
+                changed.append(file_name)
+        removed = [
+            file_name for file_name in self._seen if file_name not in found]
+        for file_name in removed:
+            del self._seen[file_name]
+        for file_name in removed + changed:
+            # The records the set was made with are out of date
+            self.image_set._known.pop(file_name, None)
+
+        gone = [stamps[name] for name in removed if name in stamps]
+        reload = []
+        new = []
+        for file_name in added + changed:
+            stamp = stamps.get(file_name)
+            if not looks_like_label(file_name):
+                if stamp is not None:
+                    gone.append(stamp)
+            elif stamp is not None:
+                reload.append(stamp)
+            else:
+                new.append(file_name)
+        if gone:
+            self.image_set.remove_images(gone)
+        for stamp in reload:
+            stamp.unload()
+        new = self.image_set.create_placeholders(new)
+        self.image_set.add_images(
+            [stamp for stamp in new if stamp.pds_compatible])
+        self._load(reload + [stamp for stamp in new if not stamp.loaded])
+
+        self._watch(directories(self.inlist, self.recursive, found))
+        if added or changed or removed:
+            self.updated.emit(added, changed, removed)
+        return added, changed, removed
+
+    def _load(self, stamps):
+        """Load stamps in the background"""
+        if not stamps:
+            return
+        workers = self.workers if len(stamps) >= self.POOL_FILES else 1
+        loader = ImageSetLoader(
+            [stamp.file_name for stamp in stamps], self.image_set.decimation,
+            self.cache, workers)
+        loader.loaded.connect(
+            partial(self.image_set.fill_placeholders, stamps))
+        loader.finished.connect(partial(self._loaders.remove, loader))
+        self._loaders.append(loader)
+        loader.start()
 
 
 class ImageSetController(object):
@@ -297,13 +1342,15 @@ class ImageSetController(object):
 
     def select_all(self):
         """Set all images as selected"""
-        for image in self.model.images:
-            self.model.set_image_selected(image)
+        self.model.select_all()
 
     def unselect_all(self):
         """Set all images as not selected"""
-        for image in self.model.images:
-            self.model.set_image_not_selected(image)
+        self.model.unselect_all()
+
+    def invert_selection(self):
+        """Swap the selected and not selected images"""
+        self.model.invert_selection()
 
     def wrap_images(self, new_columns):
         """Given new columns, reposition images"""
@@ -312,8 +1359,11 @@ class ImageSetController(object):
             self.model.set_images_positions()
 
 
-class ImageButton(FigureCanvasQTAgg):
-    """Button containing the image
+class PixmapButton(QtWidgets.QWidget):
+    """Button painting the image from an 8 bit QImage
+
+    A lighter alternative to ImageButton that does not need a matplotlib
+    figure per stamp.
 
     Parameters
     ----------
@@ -323,34 +1373,317 @@ class ImageButton(FigureCanvasQTAgg):
 
     clicked = QtCore.Signal(object)
 
-    def __init__(self, image_stamp, parent=None):
-        self.parent = parent
+    def __init__(self, image_stamp, parent=None, scaled=None):
+        setup_gui()
+        super(PixmapButton, self).__init__(parent)
         self.image_stamp = image_stamp
-        fig = Figure(figsize=(1, 1))
-        fig.subplots_adjust(
-            left=0.0, right=1.0, top=1.0, bottom=0.0, wspace=0.0,
-            hspace=0.0)
-        super(ImageButton, self).__init__(fig)
-        self._figure = fig
-        self._ax = fig.add_subplot(111)
-        if len(image_stamp.pds_image.image.shape) == 1:
-            shape = image_stamp.pds_image.image.shape
-            data = image_stamp.pds_image.image.reshape((shape[0], 1))
-        else:
-            data = image_stamp.pds_image.image
-        imgplot = self._ax.imshow(data)
-        if image_stamp.pds_image.bands != 3:
-            imgplot.set_cmap('gray')
-        self._figure.set_facecolor('black')
-        self._ax.axis('off')
+        self.pixmap = QtGui.QPixmap()
         self.setFixedSize(PSIZE, PSIZE)
+        if image_stamp.loaded:
+            self.show_thumbnail(scaled)
+
+    def show_thumbnail(self, scaled=None):
+        """Convert the thumbnail of the image stamp to a pixmap and paint it
+
+        Parameters
+        ----------
+        scaled : numpy.ndarray
+            The thumbnail already stretched to 8 bits, stretched here if None
+        """
+        file_name = self.image_stamp.file_name
+        data = scaled
+        if data is None:
+            data = self.image_stamp.stretched()
+        with profiling.span('draw', file=file_name):
+            self.pixmap = thumbnail_pixmap(data)
+        self.update()
+
+    def clear(self):
+        """Remove the thumbnail"""
+        self.pixmap = QtGui.QPixmap()
+        self.update()
+
+    def paintEvent(self, event):
+        with profiling.span('paint', file=self.image_stamp.file_name):
+            painter = QtGui.QPainter(self)
+            painter.fillRect(self.rect(), QtCore.Qt.black)
+            painter.drawPixmap(
+                (self.width() - self.pixmap.width()) // 2,
+                (self.height() - self.pixmap.height()) // 2,
+                self.pixmap)
+            painter.end()
 
     def mouseReleaseEvent(self, event):
         self.clicked.emit(self.image_stamp)
 
 
+class StampBorder(QtWidgets.QLabel):
+    """Border around the thumbnail of a stamp, white when it is selected
+
+    Painted like the border of StampItem rather than styled with a style
+    sheet, which Qt parses and applies to each widget again whenever it
+    changes.
+
+    Attributes
+    ----------
+    selected : bool
+        Whether the border is painted in the selected color
+    """
+
+    def __init__(self, parent=None):
+        super(StampBorder, self).__init__(parent)
+        self.selected = False
+
+    def set_selected(self, selected):
+        """Paint the border white (True) or yellow (False)"""
+        if selected != self.selected:
+            self.selected = selected
+            self.update()
+
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        pen = QtGui.QPen(QtGui.QColor(*(
+            SELECTED_COLOR if self.selected else NOT_SELECTED_COLOR)),
+            BORDER_WIDTH)
+        pen.setJoinStyle(QtCore.Qt.MiterJoin)
+        painter.setPen(pen)
+        inset = BORDER_WIDTH / 2.
+        painter.drawRect(QtCore.QRectF(self.rect()).adjusted(
+            inset, inset, -inset, -inset))
+        painter.end()
+
+
+class StampTitle(QtWidgets.QLabel):
+    """File name above the thumbnail of a stamp, white when it is selected
+
+    Colored through its palette rather than a style sheet, see StampBorder.
+
+    Attributes
+    ----------
+    selected : bool
+        Whether the name is written in the selected color
+    """
+
+    def __init__(self, text, parent=None):
+        super(StampTitle, self).__init__(text, parent)
+        self.setAutoFillBackground(True)
+        self.selected = None
+        self.set_selected(False)
+
+    def set_selected(self, selected):
+        """Write the name in white (True) or yellow (False)"""
+        if selected == self.selected:
+            return
+        self.selected = selected
+        palette = self.palette()
+        palette.setColor(QtGui.QPalette.Window, QtCore.Qt.black)
+        palette.setColor(QtGui.QPalette.WindowText, QtGui.QColor(*(
+            SELECTED_COLOR if selected else NOT_SELECTED_COLOR)))
+        self.setPalette(palette)
+
+
+class StampItem(QtWidgets.QGraphicsObject):
+    """Stamp painting its thumbnail, border and title as one graphics item
+
+    Unlike the buttons it is not a widget tree wrapped in a
+    QGraphicsProxyWidget, and the selection is painted instead of set with
+    style sheets. The painting is cached in device coordinates, so it is
+    only done again when the thumbnail or the selection changes.
+
+    When :attr:`atlas` is set the thumbnails are drawn from its pages
+    instead, which then are the only cache. A thumbnail is packed into the
+    atlas the first time it is painted, and ImageSetView takes it out again
+    once it is scrolled far out of sight.
+
+    Parameters
+    ----------
+    image_stamp : ImageStamp
+    parent : QtWidgets.QGraphicsItem
+    scaled : numpy.ndarray
+        The thumbnail already stretched to 8 bits, see ImageStamp.stretched()
+    """
+
+    clicked = QtCore.Signal(object)
+    #: The ThumbnailAtlas shared by every item, None to not use one
+    atlas = None
+
+    def __init__(self, image_stamp, parent=None, scaled=None):
+        setup_gui()
+        super(StampItem, self).__init__(parent)
+        self.pixmap = QtGui.QPixmap()
+        self.title_font = None
+        self._image_stamp = None
+        self.image_stamp = image_stamp
+        if self.atlas is None:
+            self.setCacheMode(QtWidgets.QGraphicsItem.DeviceCoordinateCache)
+        self.setAcceptedMouseButtons(QtCore.Qt.LeftButton)
+        if image_stamp.loaded:
+            self.show_thumbnail(scaled)
+
+    @property
+    def image_stamp(self):
+        return self._image_stamp
+
+    @image_stamp.setter
+    def image_stamp(self, image_stamp):
+        self._image_stamp = image_stamp
+        self.title_font = fit_title_font(image_stamp.basename)
+        self.update()
+
+    def show_thumbnail(self, scaled=None):
+        """Convert the thumbnail of the image stamp to a pixmap and paint it
+
+        Parameters
+        ----------
+        scaled : numpy.ndarray
+            The thumbnail already stretched to 8 bits, stretched here if None
+        """
+        if self.atlas is not None:
+            # Packed into the atlas when it is painted, if it ever is
+            self.atlas.discard(self)
+            self.update()
+            return
+        data = scaled
+        if data is None:
+            data = self._image_stamp.stretched()
+        with profiling.span('draw', file=self._image_stamp.file_name):
+            self.pixmap = thumbnail_pixmap(data)
+        self.update()
+
+    def clear(self):
+        """Remove the thumbnail"""
+        self.pixmap = QtGui.QPixmap()
+        if self.atlas is not None:
+            self.atlas.discard(self)
+        self.update()
+
+    def _draw_thumbnail(self, painter):
+        atlas = self.atlas
+        if atlas is None:
+            painter.drawPixmap(QtCore.QPointF(
+                (PSIZE - self.pixmap.width()) / 2.,
+                (PSIZE - self.pixmap.height()) / 2.), self.pixmap)
+            return
+        image_stamp = self._image_stamp
+        if not (image_stamp.loaded and image_stamp.pds_compatible):
+            return
+        if self not in atlas:
+            data = image_stamp.stretched()
+            with profiling.span('draw', file=image_stamp.file_name):
+                atlas.add(self, thumbnail_image(data))
+        width, height = atlas.size(self)
+        atlas.draw(
+            painter, (PSIZE - width) / 2., (PSIZE - height) / 2., self)
+
+    def boundingRect(self):
+        return QtCore.QRectF(0, 0, PSIZE, PSIZE)
+
+    def paint(self, painter, option, widget=None):
+        with profiling.span('paint', file=self._image_stamp.file_name):
+            painter.fillRect(self.boundingRect(), QtCore.Qt.black)
+            self._draw_thumbnail(painter)
+            color = QtGui.QColor(*(
+                SELECTED_COLOR if self._image_stamp.selected
+                else NOT_SELECTED_COLOR))
+            # The title covers the top of the thumbnail, the border the rest
+            title_height = QtGui.QFontMetrics(self.title_font).height()
+            title = QtCore.QRectF(0, 0, PSIZE, title_height)
+            painter.fillRect(title, QtCore.Qt.black)
+            painter.setFont(self.title_font)
+            painter.setPen(color)
+            painter.drawText(
+                title, QtCore.Qt.AlignCenter, self._image_stamp.basename)
+            pen = QtGui.QPen(color, BORDER_WIDTH)
+            pen.setJoinStyle(QtCore.Qt.MiterJoin)
+            painter.setPen(pen)
+            painter.setBrush(QtCore.Qt.NoBrush)
+            inset = BORDER_WIDTH / 2.
+            painter.drawRect(QtCore.QRectF(
+                inset, title_height + inset, PSIZE - BORDER_WIDTH,
+                PSIZE - title_height - BORDER_WIDTH))
+
+    def mousePressEvent(self, event):
+        # Accept the press so the release is delivered to this item
+        event.accept()
+
+    def mouseReleaseEvent(self, event):
+        self.clicked.emit(self._image_stamp)
+
+
+def thumbnail_pixmap(data):
+    """Make the pixmap of an 8 bit thumbnail, scaled to fit the stamp
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        2D gray or 3D RGB ``uint8`` thumbnail, see ImageStamp.stretched()
+
+    Returns
+    -------
+    pixmap : QtGui.QPixmap
+        Scaled once here so painting is only a copy of the pixmap
+    """
+    return QtGui.QPixmap.fromImage(thumbnail_image(data))
+
+
+def thumbnail_image(data):
+    """Make the image of an 8 bit thumbnail, scaled to fit the stamp
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        2D gray or 3D RGB ``uint8`` thumbnail, see ImageStamp.stretched()
+
+    Returns
+    -------
+    image : QtGui.QImage
+        An image owning its pixels, no larger than the stamp
+    """
+    lines, samples = data.shape[:2]
+    if data.ndim == 3:
+        image = QtGui.QImage(
+            data.tobytes(), samples, lines, samples * 3,
+            QtGui.QImage.Format_RGB888)
+    else:
+        image = QtGui.QImage(
+            data.tobytes(), samples, lines, samples,
+            QtGui.QImage.Format_Indexed8)
+        image.setColorTable(GRAY_COLOR_TABLE)
+    scaled = image.scaled(
+        int(PSIZE), int(PSIZE), QtCore.Qt.KeepAspectRatio,
+        QtCore.Qt.SmoothTransformation)
+    if scaled.size() == image.size():
+        # Not scaled, so still sharing the pixels of the bytes above
+        scaled = image.copy()
+    return scaled
+
+
+def fit_title_font(text):
+    """The largest font up to 12 points that fits text in the stamp width"""
+    font_size = 12
+    font = QtGui.QFont('Helvetica', font_size)
+    while (font_size > 1 and
+           QtGui.QFontMetrics(font).boundingRect(text).width() > PSIZE):
+        font_size -= 1
+        font = QtGui.QFont('Helvetica', font_size)
+    return font
+
+
+GRAY_COLOR_TABLE = [QtGui.qRgb(i, i, i) for i in range(256)]
+# The matplotlib button is added by setup_gui()
+BUTTONS = {MATPLOTLIB: None, QIMAGE: PixmapButton, ITEM: StampItem}
+
+
 class ImageSetView(QtWidgets.QGraphicsView):
-    """The scene and grid layout where the pictures are displayed
+    """The scene where the pictures are displayed in a grid
+
+    Each stamp is placed at ``(column, row) * CELL_SIZE`` in the scene, so
+    wrapping to a different number of columns only moves the stamps whose
+    cell changed.
+
+    When the image set is virtual only the rows in sight, plus OVERSCAN_ROWS
+    above and below, are given widgets, which are handed over to other
+    stamps as they are scrolled out of sight.
 
     Parameters
     ----------
@@ -358,39 +1691,207 @@ class ImageSetView(QtWidgets.QGraphicsView):
     """
 
     def __init__(self, image_set):
+        setup_gui()
         super(ImageSetView, self).__init__()
         # Initialize Objects
         self.image_set = image_set
         self.image_set.register(self)
         self.controller = ImageSetController(image_set, self)
         self.images = image_set.images
-
-        # Set Scene and Layout
+        self.virtual = image_set.virtual
+        # Stamps showing in the virtual grid and widgets waiting for reuse
+        self._shown = set()
+        self._spare_widgets = []
+        # The first row in sight when the loader was last told and whether
+        # the view was scrolled up to it, see prioritize_loading()
+        self._first_row = 0
+        self._scrolled_up = False
+
+        # Set Scene
         scene = QtWidgets.QGraphicsScene()
-        self.grid = QtWidgets.QGraphicsGridLayout()
-        self.grid.setMaximumWidth(PSIZE)
-
-        for image in self.images:
-            image.button.clicked.connect(self.select_image)
-            self.grid.addItem(
-                image.proxy_widget, image.row, image.column)
-            image.container.move(0, image.title.height())
-            image.title.setAlignment(QtCore.Qt.AlignCenter)
-            image.container.setFixedSize(PSIZE, PSIZE - image.title.height())
-
-        # Set grid in view and MainWindow
-        self.layout_container = QtWidgets.QGraphicsWidget()
-        self.layout_container.setLayout(self.grid)
-        scene.addItem(self.layout_container)
         self.setScene(scene)
         self.setBackgroundBrush(QtCore.Qt.black)
         self.setAlignment(QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop)
+        if not self.virtual:
+            for image in self.images:
+                self._setup_widgets(image)
+                scene.addItem(image.proxy_widget)
+        self.set_grid_layout()
+
+    def _setup_widgets(self, image):
+        """Connect and arrange the widgets of a stamp once after creation"""
+        image.button.clicked.connect(self.select_image)
+        if image.container is None:
+            return
+        image.container.move(0, image.title.height())
+        image.title.setAlignment(QtCore.Qt.AlignCenter)
+        image.container.setFixedSize(PSIZE, PSIZE - image.title.height())
+
+    def _place(self, image):
+        image.proxy_widget.setPos(
+            image.column * CELL_SIZE, image.row * CELL_SIZE)
+
+    def _set_scene_size(self):
+        columns = max(self.image_set.columns, 1)
+        rows = int(math.ceil(len(self.images) / float(columns)))
+        self.scene().setSceneRect(
+            0, 0, columns * CELL_SIZE, rows * CELL_SIZE)
 
     def set_grid_layout(self):
-        self.grid = QtWidgets.QGraphicsGridLayout()
-        for image in self.images:
-            self.grid.addItem(image.proxy_widget, image.row, image.column)
-        self.layout_container.setLayout(self.grid)
+        """Place every stamp at its cell"""
+        self.move_images(self.images)
+
+    def move_images(self, images):
+        """Place the stamps whose row or column changed at their new cell"""
+        self._set_scene_size()
+        if self.virtual:
+            self.update_visible_stamps()
+            return
+        for image in images:
+            self._place(image)
+        # The stamps in sight change without scrolling or resizing
+        self.prioritize_loading()
+
+    def visible_rows(self):
+        """The first and last row of the virtual grid that have widgets"""
+        area = self.mapToScene(self.viewport().rect()).boundingRect()
+        first = max(int(area.top() // CELL_SIZE) - OVERSCAN_ROWS, 0)
+        last = int(area.bottom() // CELL_SIZE) + OVERSCAN_ROWS
+        return first, last
+
+    def update_visible_stamps(self):
+        """Give widgets to the stamps in sight and take them from the rest"""
+        if StampItem.atlas is not None:
+            self.trim_atlas()
+        if self.virtual:
+            first, last = self.visible_rows()
+            columns = self.image_set.columns
+            visible = self.images[first * columns:(last + 1) * columns]
+            wanted = set(visible)
+            # Release first so the widgets are reused by the stamps coming in
+            for image in self._shown - wanted:
+                self._release_widgets(image)
+            for image in visible:
+                if image not in self._shown:
+                    self._adopt_widgets(image)
+                self._place(image)
+        if StampItem.atlas is not None:
+            self.pack_atlas()
+        self.prioritize_loading()
+
+    def prioritize_loading(self):
+        """Have the stamps in sight loaded first, then the next screenful
+
+        The next screenful is below when the view last scrolled down and
+        above when it last scrolled up, even if it was only resized since.
+        The files of the prefetch_rows of the image set past it are read
+        ahead, nearest first.
+        """
+        image_set = self.image_set
+        if image_set.loader is None:
+            return
+        first, last = self.visible_rows()
+        rows = last - first + 1
+        if first != self._first_row:
+            self._scrolled_up = first < self._first_row
+            self._first_row = first
+        if self._scrolled_up:
+            ahead = (max(first - rows, 0), first - 1)
+            prefetch = range(
+                ahead[0] - 1, ahead[0] - 1 - image_set.prefetch_rows, -1)
+        else:
+            ahead = (last + 1, last + rows)
+            prefetch = range(
+                ahead[1] + 1, ahead[1] + 1 + image_set.prefetch_rows)
+        columns = image_set.columns
+        image_set.prioritize(
+            self.images[first * columns:(last + 1) * columns],
+            self.images[ahead[0] * columns:(ahead[1] + 1) * columns])
+        image_set.prefetch_files([
+            image for row in prefetch if row >= 0
+            for image in self.images[row * columns:(row + 1) * columns]])
+
+    def trim_atlas(self):
+        """Free the atlas cells of the stamps scrolled far out of sight
+
+        The stamps within ATLAS_KEEP_ROWS rows of the viewport keep their
+        thumbnails, the others are packed again when they are next painted.
+        """
+        atlas = StampItem.atlas
+        first, last = self.visible_rows()
+        first -= ATLAS_KEEP_ROWS
+        last += ATLAS_KEEP_ROWS
+        for item in atlas.keys():
+            if item.scene() not in (None, self.scene()):
+                continue
+            if item.scene() is None or not item.isVisible() or not (
+                    first <= item.image_stamp.row <= last):
+                atlas.discard(item)
+
+    def pack_atlas(self):
+        """Pack the thumbnails of the stamps in sight into the atlas
+
+        They are stretched in one batch before they are painted, instead of
+        one at a time while painting.
+        """
+        atlas = StampItem.atlas
+        first, last = self.visible_rows()
+        columns = self.image_set.columns
+        missing = [
+            image for image in
+            self.images[first * columns:(last + 1) * columns]
+            if image.loaded and image.button is not None and
+            image.button not in atlas]
+        if not missing:
+            return
+        scaled = ImageStamp.stretch_thumbnails(
+            [image.thumbnail for image in missing])
+        for image, data in zip(missing, scaled):
+            with profiling.span('draw', file=image.file_name):
+                atlas.add(image.button, thumbnail_image(data))
+
+    def _adopt_widgets(self, image):
+        if self._spare_widgets:
+            image.adopt_widgets(self._spare_widgets.pop())
+            image.proxy_widget.show()
+        else:
+            image.create_widgets()
+            self._setup_widgets(image)
+            self.scene().addItem(image.proxy_widget)
+        self._shown.add(image)
+
+    def _release_widgets(self, image):
+        widgets = image.release_widgets()
+        widgets.proxy_widget.hide()
+        self._spare_widgets.append(widgets)
+        self._shown.discard(image)
+
+    def scrollContentsBy(self, dx, dy):
+        super(ImageSetView, self).scrollContentsBy(dx, dy)
+        self.update_visible_stamps()
+
+    def resizeEvent(self, event):
+        super(ImageSetView, self).resizeEvent(event)
+        self.update_visible_stamps()
+
+    def add_images(self, images):
+        """Put the widgets of images added to the set in the scene"""
+        if self.virtual:
+            # Widgets are given to the new stamps once they are in sight
+            return
+        for image in images:
+            self._setup_widgets(image)
+            self.scene().addItem(image.proxy_widget)
+            self._place(image)
+        self.prioritize_loading()
+
+    def remove_images(self, images):
+        """Take the widgets of removed images out of the scene"""
+        for image in images:
+            if not self.virtual:
+                self.scene().removeItem(image.proxy_widget)
+            elif image in self._shown:
+                self._release_widgets(image)
 
     def select_image(self, image_stamp):
         """Updates the border indicating selected/not selected"""
@@ -405,6 +1906,7 @@ class MainWindow(QtWidgets.QMainWindow):
     """
 
     def __init__(self, image_set):
+        setup_gui()
         super(MainWindow, self).__init__()
         self.image_set = image_set
         self.set_view = ImageSetView(image_set)
@@ -415,11 +1917,22 @@ class MainWindow(QtWidgets.QMainWindow):
         self.not_installed_action = None
         self.print_action = None
         self.exit_action = None
+        self.progress_bar = None
+        self.progress_action = None
+        # Wrap once for a burst of resize events
+        self.wrap_timer = QtCore.QTimer(self)
+        self.wrap_timer.setSingleShot(True)
+        self.wrap_timer.setInterval(WRAP_DELAY)
+        self.wrap_timer.timeout.connect(self.wrap_images)
         self.main_window_set()
         self.selected_all_toggle = False
-        self.selected = self.image_set.selected_images
         self._pdsviewer = None
 
+    @property
+    def selected(self):
+        """The selected images in the order they were selected"""
+        return self.image_set.selected_images
+
     def main_window_set(self):
         """Create the main window of GUI with tool bars"""
         min_frame_width = FRAME_WIDTH + TOOL_BAR_WIDTH * 2.
@@ -471,6 +1984,22 @@ class MainWindow(QtWidgets.QMainWindow):
         self.exit_action.triggered.connect(self.close)
         self.toolbar.addAction(self.exit_action)
 
+        # Show how many images are loaded while they load in the background
+        loader = self.image_set.loader
+        if loader is not None:
+            self.progress_bar = QtWidgets.QProgressBar()
+            self.progress_bar.setRange(0, loader.total)
+            self.progress_bar.setValue(0)
+            self.progress_bar.setFormat('Loading %v/%m')
+            self.progress_action = self.toolbar.addWidget(self.progress_bar)
+            loader.found.connect(self.update_total)
+            loader.loaded.connect(self.update_progress)
+            if loader.scheduler.on_demand:
+                # Only the stamps in sight are ever loaded
+                loader.discovered.connect(self.loading_finished)
+            else:
+                loader.finished.connect(self.loading_finished)
+
         # Display Window
         self.setWindowTitle('Pystamps')
         self.setCentralWidget(self.set_view)
@@ -539,16 +2068,109 @@ class MainWindow(QtWidgets.QMainWindow):
         else:
             print("No Images Selected")
 
+    def update_total(self, found):
+        """Count the newly found files in the progress bar"""
+        self.progress_bar.setMaximum(self.progress_bar.maximum() + len(found))
+
+    def update_progress(self, loaded):
+        """Count the newly loaded images in the progress bar"""
+        self.progress_bar.setValue(self.progress_bar.value() + len(loaded))
+
+    def loading_finished(self):
+        """Hide the progress bar once all images are loaded
+
+        On demand, once all the files are found instead.
+        """
+        self.progress_action.setVisible(False)
+
+    def closeEvent(self, event):
+        """Stop loading images when the window is closed"""
+        if self.image_set.loader is not None:
+            self.image_set.loader.stop()
+        if self.image_set.prefetcher is not None:
+            self.image_set.prefetcher.close()
+        super(MainWindow, self).closeEvent(event)
+
     def resizeEvent(self, resizeEvent):
-        """Wrap images when a resize event occurs"""
+        """Wrap images at most once a frame while the window is resized"""
+        if not self.wrap_timer.isActive():
+            self.wrap_timer.start()
+
+    def wrap_images(self):
+        """Wrap images to the number of columns that fit in the window"""
         FRAME_WIDTH = self.width()
-        new_columns = int(FRAME_WIDTH / PSIZE)
+        new_columns = max(int(FRAME_WIDTH / CELL_SIZE), 1)
         self.set_view.controller.wrap_images(new_columns)
 
 
-def pystamps(inlist=None):
+def pystamps(inlist=None, decimation=MEAN, backend=MATPLOTLIB, cache=True,
+             rebuild_cache=False, workers=None, virtual=False,
+             recursive=False, include=None, exclude=None, watch=False,
+             profile=None, low_memory=False, clip=CLIP_PERCENT,
+             mask_special=True, atlas=False, on_demand=False, prefetch=0,
+             prefetch_budget=PREFETCH_BUDGET, disk_order=False,
+             records=None):
     """Run pystamps from python shell or command line with arguments
 
+    Parameters
+    ----------
+    inlist : list or string
+        Files, globs and directories to display, see the examples below
+    decimation : string
+        How images are reduced to the stamp size, ``'mean'`` averages blocks
+        of pixels for the best quality while ``'stride'`` is faster
+    backend : string
+        Draw stamps with ``'matplotlib'``, paint them directly from an 8 bit
+        image with ``'qimage'`` or as light graphics items with ``'item'``
+    cache : bool
+        Reuse thumbnails stored in ``~/.cache/pystamps`` by previous runs and
+        store the new ones
+    rebuild_cache : bool
+        Make every thumbnail again and replace the cached ones
+    workers : int
+        Number of processes decoding images, one per CPU by default
+    virtual : bool
+        Only create widgets for the stamps in sight, for very large sets
+    recursive : bool
+        Also look for images in the subdirectories of the directories
+    include : list or string
+        Only show files whose name matches one of these patterns
+    exclude : list or string
+        Skip files and directories whose name matches one of these patterns
+    watch : bool
+        Keep adding, updating and removing stamps as the files change
+    profile : string
+        Time each stage of making the stamps, print a summary when the window
+        is closed and save a Chrome trace to this file
+    low_memory : bool
+        Only keep the stamp sized arrays, the full resolution ``pds_image``
+        of a stamp is decoded again when it is accessed after it was released
+    clip : float
+        Percent of the pixels of each stamp displayed as black and as white
+    mask_special : bool
+        Leave the PDS special constants (NULL and saturation values) out of
+        the contrast stretch
+    atlas : bool
+        Pack the thumbnails into a few large pixmaps the stamps are drawn
+        from, only keeping the ones near the viewport (uses the ``'item'``
+        backend)
+    on_demand : bool
+        Only decode the images in sight or coming into sight while scrolling,
+        for directories too large to load completely
+    prefetch : int
+        Rows of images past the next screenful read into the page cache while
+        scrolling, for slow disks and network file systems
+    prefetch_budget : int
+        Most bytes read ahead and not loaded yet
+    disk_order : bool
+        Read the images in the order they are laid out on disk, for fewer
+        seeks on hard disks and network file systems. The stamps are still
+        shown in the order given.
+    records : list
+        ImageRecords made beforehand with :func:`pystamps.core.precompute`
+        and the :func:`thumbnail_size` of this screen. Their files are not
+        opened again.
+
     Examples
     --------
 
@@ -601,40 +2223,89 @@ def pystamps(inlist=None):
     return information stored in that attribute
     # See ImageStamp for accessible attributes
     >>> example[#].pds_image.pds_attribute
-    Access pds attributes
+    Access pds attributes (with low_memory the image is decoded again, keep a
+    reference to it while using it)
     # See planetaryimage documentation on accessible pds_iamge attributes
     """
-    files = []
-    if isinstance(inlist, list):
-        if inlist:
-            for item in inlist:
-                files += arg_parser(item)
-        else:
-            files = glob('*')
-    elif isinstance(inlist, str):
-        names = inlist.split(',')
-        for name in names:
-            files = files + arg_parser(name.strip())
-    elif inlist is None:
-        files = glob('*')
-
-    image_set = ImageSet(files)
+    if profile:
+        profiling.enable()
+    ImageRecord.low_memory = low_memory
+    ImageStamp.clip = clip
+    ImageStamp.mask_special = mask_special
+    StampItem.atlas = None
+    if atlas:
+        setup_gui()
+        backend = ITEM
+        StampItem.atlas = ThumbnailAtlas(PSIZE)
+    # Stamps are added as the files are found, not after the whole listing
+    files = discover(inlist, recursive, include, exclude)
+
+    thumbnail_cache = None
+    if cache:
+        try:
+            thumbnail_cache = ThumbnailCache(refresh=rebuild_cache)
+        except OSError as error:
+            print("Not using the thumbnail cache: %s" % error)
+    # Open the window right away and fill in the stamps as they load
+    image_set = ImageSet(
+        files, decimation, backend, thumbnail_cache, workers,
+        progressive=True, virtual=virtual, on_demand=on_demand,
+        prefetch=prefetch, prefetch_budget=prefetch_budget,
+        disk_order=disk_order, records=records)
     display = MainWindow(image_set)
+    if watch:
+        # Made first so it is connected to every file the loader finds
+        watcher = ImageSetWatcher(
+            image_set, inlist, recursive, include, exclude, thumbnail_cache,
+            workers)
+        watcher.start()
+        app.aboutToQuit.connect(watcher.stop)
+    image_set.loader.start()
     try:
         sys.exit(app.exec_())
     except Exception:
         pass
+    finally:
+        if profile:
+            report_profile(profiling.disable(), profile)
+            print("Decode queue: %(completed)d completed, %(cancelled)d "
+                  "cancelled, %(queued)d queued" %
+                  image_set.loader.scheduler.stats())
+            if image_set.prefetcher is not None:
+                print("Prefetched: %d files, %.1f MB" % (
+                    image_set.prefetcher.files,
+                    image_set.prefetcher.bytes / 2 ** 20))
     return display.selected
 
 
+def report_profile(profiler, trace_file):
+    """Print the stage summary and save the trace of a profiled run"""
+    print(profiler.format_summary())
+    profiler.write_trace(trace_file)
+    print("Trace written to %s, open it in chrome://tracing or "
+          "https://ui.perfetto.dev" % trace_file)
+
+
 def arg_parser(args):
-    if os.path.isdir(args):
-        files = glob(os.path.join('%s' % (args), '*'))
-    elif args:
-        files = glob(args)
-    else:
-        files = glob('*')
-    return files
+    """The files of a directory or a glob, the current directory when empty
+
+    Deprecated, use :func:`pystamps.core.discover` which also finds the
+    files of several directories and globs, recursively if asked.
+
+    Parameters
+    ----------
+    args : string
+        A directory, a glob or an empty string
+
+    Returns
+    -------
+    files : list
+        The files found, without looking at what they contain
+    """
+    warnings.warn(
+        "arg_parser() is deprecated, use pystamps.core.discover()",
+        DeprecationWarning, stacklevel=2)
+    return list(discover(args or None, prefilter=False))
 
 
 def cli():
@@ -644,5 +2315,103 @@ def cli():
         'file', nargs='*',
         help="Input filename or glob for files with certain extensions"
     )
+    parser.add_argument(
+        '--decimation', choices=DECIMATION_METHODS, default=MEAN,
+        help="Reduce images to stamps by block mean (quality) or by keeping "
+        "every nth pixel (speed)"
+    )
+    parser.add_argument(
+        '--backend', choices=sorted(BUTTONS), default=MATPLOTLIB,
+        help="Draw stamps with matplotlib, paint them directly as QImages or "
+        "as single graphics items without widgets (fastest to scroll)"
+    )
+    parser.add_argument(
+        '--no-cache', dest='cache', action='store_false',
+        help="Do not read or write the thumbnail cache"
+    )
+    parser.add_argument(
+        '--rebuild-cache', action='store_true',
+        help="Make every thumbnail again and replace the cached ones"
+    )
+    parser.add_argument(
+        '--workers', type=int, default=None,
+        help="Number of processes decoding images (default: one per CPU)"
+    )
+    parser.add_argument(
+        '--virtual', action='store_true',
+        help="Only create widgets for the stamps in sight, for very large "
+        "directories"
+    )
+    parser.add_argument(
+        '-r', '--recursive', action='store_true',
+        help="Also look for images in subdirectories"
+    )
+    parser.add_argument(
+        '--include', action='append', metavar='PATTERN',
+        help="Only show files whose name matches the pattern, for example "
+        "'*.IMG' (can be given more than once)"
+    )
+    parser.add_argument(
+        '--exclude', action='append', metavar='PATTERN',
+        help="Skip files and directories whose name matches the pattern "
+        "(can be given more than once)"
+    )
+    parser.add_argument(
+        '--watch', action='store_true',
+        help="Keep adding, updating and removing stamps as the files in the "
+        "directories change"
+    )
+    parser.add_argument(
+        '--profile', nargs='?', const='pystamps-trace.json', metavar='TRACE',
+        help="Time each stage, print a summary on exit and save a Chrome "
+        "trace (default: pystamps-trace.json)"
+    )
+    parser.add_argument(
+        '--low-memory', action='store_true',
+        help="Only keep the stamp sized arrays in memory and decode full "
+        "images again when they are needed"
+    )
+    parser.add_argument(
+        '--clip', type=float, default=CLIP_PERCENT, metavar='PERCENT',
+        help="Percent of the pixels of each stamp displayed as black and as "
+        "white (default: %(default)s)"
+    )
+    parser.add_argument(
+        '--no-mask-special', dest='mask_special', action='store_false',
+        help="Include the PDS special constants (NULL and saturation values) "
+        "in the contrast stretch"
+    )
+    parser.add_argument(
+        '--atlas', action='store_true',
+        help="Draw the stamps from thumbnails packed into a few large "
+        "pixmaps, for steady scrolling of large sets (implies --backend item)"
+    )
+    parser.add_argument(
+        '--on-demand', action='store_true',
+        help="Only decode the images in sight or coming into sight, for "
+        "directories too large to load completely"
+    )
+    parser.add_argument(
+        '--prefetch', type=int, default=0, metavar='ROWS',
+        help="Read the files of this many rows past the next screenful "
+        "ahead of loading them, for slow disks and network file systems"
+    )
+    parser.add_argument(
+        '--prefetch-budget', type=float, default=PREFETCH_BUDGET / 2 ** 20,
+        metavar='MB',
+        help="Most megabytes read ahead and not loaded yet "
+        "(default: %(default)s)"
+    )
+    parser.add_argument(
+        '--disk-order', action='store_true',
+        help="Read the images in the order they are laid out on disk, for "
+        "fewer seeks on hard disks and network file systems"
+    )
     args = parser.parse_args()
-    pystamps(args.file)
+    pystamps(
+        args.file, args.decimation, args.backend, args.cache,
+        args.rebuild_cache, args.workers, args.virtual, args.recursive,
+        args.include, args.exclude, args.watch, args.profile,
+        args.low_memory, args.clip, args.mask_special, args.atlas,
+        args.on_demand, args.prefetch, int(args.prefetch_budget * 2 ** 20),
+        args.disk_order)
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""Order the thumbnail jobs of a loader by what is in sight"""
+
+import heapq
+import threading
+from itertools import count
+
+#: Jobs of the stamps in sight
+VISIBLE = 0
+#: Jobs of the next screenful in the direction of scrolling
+AHEAD = 1
+#: Every other job, in the order they were submitted
+BACKGROUND = 2
+
+
+class DecodeScheduler(object):
+    """Thread safe priority queue of thumbnail jobs
+
+    The GUI thread submits jobs, each an int such as the index of a file,
+    and tells the scheduler which jobs belong to the stamps in sight and to
+    the screenful ahead with update_view(). The loader thread takes the most
+    urgent jobs first: visible, then ahead, then the rest in submission
+    order.
+
+    A job that leaves the visible neighbourhood before it is taken goes back
+    to the background, or is cancelled when the scheduler is ``on_demand``.
+    Cancelled jobs are queued again when they come back into the
+    neighbourhood, so with ``on_demand`` only the stamps that are looked at
+    are ever decoded.
+
+    Parameters
+    ----------
+    on_demand : bool
+        Only queue the jobs of the visible neighbourhood
+
+    Attributes
+    ----------
+    completed : int
+        Number of jobs reported with done()
+    cancelled : int
+        Number of queued jobs cancelled
+    """
+
+    def __init__(self, on_demand=False):
+        self.on_demand = on_demand
+        self.completed = 0
+        self.cancelled = 0
+        self._condition = threading.Condition()
+        self._sequence = count()
+        self._order = {}
+        self._tiers = {}
+        self._heap = []
+        self._waiting = set()
+        self._wanted = {}
+        self._closed = False
+
+    @property
+    def depth(self):
+        """Number of jobs queued"""
+        return len(self._tiers)
+
+    def stats(self):
+        """The depth, completed and cancelled counts and the waiting jobs
+
+        Returns
+        -------
+        stats : dict
+            ``queued``, ``waiting`` (on demand jobs out of sight),
+            ``completed`` and ``cancelled``
+        """
+        with self._condition:
+            return {
+                'queued': len(self._tiers), 'waiting': len(self._waiting),
+                'completed': self.completed, 'cancelled': self.cancelled,
+            }
+
+    def submit(self, jobs):
+        """Queue jobs, behind the ones already in their tier"""
+        with self._condition:
+            for job in jobs:
+                self._order[job] = next(self._sequence)
+                tier = self._wanted.get(job)
+                if tier is None and self.on_demand:
+                    self._waiting.add(job)
+                else:
+                    self._push(job, BACKGROUND if tier is None else tier)
+            self._condition.notify_all()
+
+    def update_view(self, visible, ahead=()):
+        """Move the jobs in sight and ahead to the front of the queue
+
+        Parameters
+        ----------
+        visible : iterable
+            Jobs of the stamps in sight
+        ahead : iterable
+            Jobs of the stamps that come into sight next
+        """
+        wanted = dict((job, AHEAD) for job in ahead)
+        wanted.update((job, VISIBLE) for job in visible)
+        with self._condition:
+            for job in self._wanted:
+                if job in wanted or job not in self._tiers:
+                    continue
+                if self.on_demand:
+                    del self._tiers[job]
+                    self._waiting.add(job)
+                    self.cancelled += 1
+                else:
+                    self._push(job, BACKGROUND)
+            for job, tier in wanted.items():
+                if job in self._waiting:
+                    self._waiting.discard(job)
+                    self._push(job, tier)
+                elif self._tiers.get(job, tier) != tier:
+                    self._push(job, tier)
+            self._wanted = wanted
+            self._compact()
+            self._condition.notify_all()
+
+    def cancel(self, jobs):
+        """Drop jobs that are no longer needed, queued or not"""
+        with self._condition:
+            for job in jobs:
+                if self._tiers.pop(job, None) is not None:
+                    self.cancelled += 1
+                self._waiting.discard(job)
+                self._order.pop(job, None)
+
+    def take(self, count, wait=False):
+        """Remove and return the most urgent jobs
+
+        Parameters
+        ----------
+        count : int
+            Most jobs to return
+        wait : bool
+            Block until there is a job or the scheduler is closed, instead
+            of returning an empty list
+
+        Returns
+        -------
+        jobs : list
+            Up to count jobs, most urgent first
+        """
+        with self._condition:
+            while True:
+                jobs = []
+                while self._heap and len(jobs) < count:
+                    tier, _, job = heapq.heappop(self._heap)
+                    # Entries left behind by a change of tier are skipped
+                    if self._tiers.get(job) != tier:
+                        continue
+                    del self._tiers[job]
+                    del self._order[job]
+                    jobs.append(job)
+                if jobs or not wait or self._closed:
+                    return jobs
+                self._condition.wait()
+
+    def done(self, count=1):
+        """Count jobs taken with take() as completed"""
+        with self._condition:
+            self.completed += count
+
+    def close(self):
+        """Wake up and return from take() for good, when loading stops"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+    def _push(self, job, tier):
+        self._tiers[job] = tier
+        heapq.heappush(self._heap, (tier, self._order[job], job))
+
+    def _compact(self):
+        """Drop the entries of old tiers once they outnumber the jobs"""
+        if len(self._heap) > 2 * len(self._tiers) + 64:
+            self._heap = [
+                (tier, self._order[job], job)
+                for job, tier in self._tiers.items()]
+            heapq.heapify(self._heap)
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""Ordered set of the selected stamps"""
+
+from collections import OrderedDict
+
+
+class Selection(object):
+    """Items in the order they were selected, with O(1) membership
+
+    Adding, removing and testing an item take constant time, so selecting
+    every stamp of a large set is linear instead of quadratic as with a
+    list.
+
+    Parameters
+    ----------
+    items : iterable
+        Items selected initially
+    """
+
+    def __init__(self, items=()):
+        self._items = OrderedDict()
+        self.update(items)
+
+    def __contains__(self, item):
+        return item in self._items
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __repr__(self):
+        return 'Selection(%r)' % list(self._items)
+
+    def add(self, item):
+        """Select an item, keeping its place if it already is"""
+        self._items[item] = None
+
+    def discard(self, item):
+        """Unselect an item if it is selected"""
+        self._items.pop(item, None)
+
+    def update(self, items):
+        """Select many items, appended in order"""
+        for item in items:
+            self._items[item] = None
+
+    def difference_update(self, items):
+        """Unselect many items"""
+        for item in items:
+            self._items.pop(item, None)
+
+    def clear(self):
+        """Unselect every item"""
+        self._items.clear()
+
+    def to_list(self):
+        """The items in the order they were selected"""
+        return list(self._items)
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+"""Reduce full resolution images to stamp sized arrays"""
+
+import math
+
+import numpy
+
+from . import profiling
+from .pdsfile import display_form
+
+#: Average each block of pixels, best quality
+MEAN = 'mean'
+#: Keep every nth pixel, fastest, only every nth line is read from the file
+STRIDE = 'stride'
+DECIMATION_METHODS = (MEAN, STRIDE)
+
+#: Percent of the valid pixels clipped at each end by :func:`stretch`
+CLIP_PERCENT = 0.5
+#: Stamps stacked into one array at most by :func:`stretch_batch`
+STRETCH_BATCH_SIZE = 256
+
+# The NULL, low and high saturation values PDS and ISIS products use for
+# integer pixels of these types
+SPECIAL_CONSTANTS = {
+    'u1': (0, 255),
+    'i2': (-32768, -32767, -32766, -32765, -32764),
+    'u2': (0, 1, 2, 65534, 65535),
+}
+# Floats at or below this are the ISIS NULL and saturation values
+FLOAT_SPECIAL_MAX = -3.4028226550889045e+38
+
+
+def decimation_factor(shape, size):
+    """Integer factor that makes the larger image dimension fit in size"""
+    return max(int(math.ceil(max(shape[:2]) / float(size))), 1)
+
+
+def _block_mean(image, factor):
+    """Average factor x factor blocks, keeping the ragged edge blocks"""
+    reduced = image
+    for axis in (0, 1):
+        length = reduced.shape[axis]
+        starts = numpy.arange(0, length, factor)
+        counts = numpy.diff(numpy.append(starts, length))
+        reduced = numpy.add.reduceat(
+            reduced, starts, axis=axis, dtype=numpy.float64)
+        counts_shape = [1] * reduced.ndim
+        counts_shape[axis] = len(counts)
+        reduced /= counts.reshape(counts_shape)
+    if image.dtype.kind in 'iu':
+        reduced = numpy.rint(reduced).astype(image.dtype)
+    return reduced
+
+
+def decimate(image, size, method=MEAN):
+    """Reduce an image so that neither dimension is larger than size
+
+    Parameters
+    ----------
+    image : numpy.ndarray
+        The 1D, 2D (lines, samples) or 3D (lines, samples, bands) array from
+        :attr:`PDS3Image.image`. A 1D array is treated as a single column.
+    size : int
+        Maximum number of lines and samples in the result
+    method : string
+        ``'mean'`` averages each block of pixels, ``'stride'`` keeps every nth
+        pixel which is faster but aliases fine detail
+
+    Returns
+    -------
+    thumbnail : numpy.ndarray
+        A new array of at most ``size`` lines and samples with the same number
+        of bands and data type as ``image``
+    """
+    if method not in DECIMATION_METHODS:
+        raise ValueError('Unknown decimation method: %r' % method)
+    if image.ndim == 1:
+        image = image.reshape((image.shape[0], 1))
+    factor = decimation_factor(image.shape, size)
+    if factor == 1:
+        # A plain array even when image is memory mapped
+        return numpy.array(image)
+    if method == STRIDE:
+        return numpy.ascontiguousarray(image[::factor, ::factor])
+    return _block_mean(image, factor)
+
+
+def read_thumbnail(pds_file, size, method=MEAN):
+    """Make the thumbnail of a PDS product reading as little as possible
+
+    The block mean needs every pixel, which are memory mapped when the file
+    is not compressed. The stride only reads the lines it keeps.
+
+    Parameters
+    ----------
+    pds_file : pystamps.pdsfile.PDSFile
+        The product to make the thumbnail of
+    size : int
+        Maximum number of lines and samples in the result
+    method : string
+        ``'mean'`` or ``'stride'``, see :func:`decimate`
+
+    Returns
+    -------
+    thumbnail : numpy.ndarray
+        The same array as :func:`decimate` makes from the whole image
+    """
+    file_name = pds_file.file_name
+    if method != STRIDE:
+        # Memory mapped pixels are only read while they are decimated
+        with profiling.span('read', file=file_name):
+            image = pds_file.open_image()
+        with profiling.span('decimate', file=file_name):
+            return decimate(image, size, method)
+    factor = decimation_factor(pds_file.shape[1:], size)
+    with profiling.span('read', file=file_name):
+        thumbnail = display_form(pds_file.read_strided(factor))
+    if thumbnail.ndim == 1:
+        thumbnail = thumbnail.reshape((thumbnail.shape[0], 1))
+    return numpy.ascontiguousarray(thumbnail)
+
+
+def special_mask(data):
+    """Where data holds a PDS special constant or is not finite
+
+    Parameters
+    ----------
+    data : numpy.ndarray
+        Pixels of any shape
+
+    Returns
+    -------
+    mask : numpy.ndarray
+        Boolean array with the shape of ``data``
+    """
+    if data.dtype.kind == 'f':
+        with numpy.errstate(invalid='ignore'):
+            return ~numpy.isfinite(data) | (data <= FLOAT_SPECIAL_MAX)
+    constants = SPECIAL_CONSTANTS.get(data.dtype.str[1:])
+    if constants is None:
+        return numpy.zeros(data.shape, dtype=bool)
+    return numpy.isin(data, constants)
+
+
+def _sorted_percentile(rows, counts, fraction):
+    """Interpolate a percentile of rows whose first counts values are sorted"""
+    last = numpy.maximum(counts - 1, 0)
+    position = fraction * last
+    below = numpy.floor(position).astype(numpy.intp)
+    above = numpy.minimum(below + 1, last)
+    weight = position - below
+    index = numpy.arange(len(rows))
+    return rows[index, below] * (1 - weight) + rows[index, above] * weight
+
+
+def _stretch_stack(stack, clip, mask_special):
+    """Stretch each array of a stack to uint8 between its own percentiles"""
+    count = len(stack)
+    data = stack.astype(numpy.float32).reshape(count, -1)
+    if mask_special:
+        invalid = special_mask(stack).reshape(count, -1)
+    else:
+        invalid = ~numpy.isfinite(data)
+    # Invalid pixels sort to the end of each row and are left out
+    values = numpy.where(invalid, numpy.inf, data)
+    values.sort(axis=1)
+    valid = data.shape[1] - invalid.sum(axis=1)
+    # Arrays without a valid pixel, such as all NULL frames, stay black
+    low = numpy.zeros(count, dtype=numpy.float32)
+    high = numpy.zeros(count, dtype=numpy.float32)
+    some = valid > 0
+    if some.all():
+        low = _sorted_percentile(values, valid, clip / 100.)
+        high = _sorted_percentile(values, valid, 1 - clip / 100.)
+    elif some.any():
+        low[some] = _sorted_percentile(values[some], valid[some], clip / 100.)
+        high[some] = _sorted_percentile(
+            values[some], valid[some], 1 - clip / 100.)
+    span = high - low
+    span[span <= 0] = 1
+    with numpy.errstate(invalid='ignore', over='ignore'):
+        scaled = (data - low[:, None]) * (255. / span)[:, None]
+    # Special values lie at the ends of the range and clip to black or white
+    scaled = numpy.clip(numpy.nan_to_num(scaled), 0, 255)
+    return numpy.rint(scaled).astype(numpy.uint8).reshape(stack.shape)
+
+
+def stretch(thumbnail, clip=CLIP_PERCENT, mask_special=True):
+    """Scale a thumbnail to 8 bits between robust percentiles
+
+    Unlike a minimum to maximum stretch a few hot pixels or the NULL border
+    of a product do not wash out the rest of the stamp. The percentiles are
+    computed on the decimated thumbnail, so this is cheap. Three band images
+    are stretched with one range for all the bands, keeping their balance.
+
+    Parameters
+    ----------
+    thumbnail : numpy.ndarray
+        A 2D or 3D array from :func:`decimate`
+    clip : float
+        Percent of the pixels that saturate to black and to white
+    mask_special : bool
+        Leave the PDS special constants, see :func:`special_mask`, out of the
+        percentiles (they still display as black or white). Values that are
+        not finite are always left out.
+
+    Returns
+    -------
+    scaled : numpy.ndarray
+        A C contiguous ``uint8`` array with the same shape as ``thumbnail``
+    """
+    return _stretch_stack(thumbnail[numpy.newaxis], clip, mask_special)[0]
+
+
+def stretch_batch(thumbnails, clip=CLIP_PERCENT, mask_special=True):
+    """Scale many thumbnails to 8 bits as in :func:`stretch`
+
+    Thumbnails with the same shape and type are stacked into one array and
+    stretched together, each between its own percentiles, so the cost of a
+    call is shared by the whole batch.
+
+    Parameters
+    ----------
+    thumbnails : list
+        Arrays from :func:`decimate`
+    clip, mask_special
+        See :func:`stretch`
+
+    Returns
+    -------
+    scaled : list
+        A ``uint8`` array for each thumbnail, in the same order
+    """
+    groups = {}
+    for index, thumbnail in enumerate(thumbnails):
+        groups.setdefault(
+            (thumbnail.shape, thumbnail.dtype.str), []).append(index)
+    scaled = [None] * len(thumbnails)
+    for indices in groups.values():
+        for start in range(0, len(indices), STRETCH_BATCH_SIZE):
+            batch = indices[start:start + STRETCH_BATCH_SIZE]
+            stack = numpy.stack([thumbnails[index] for index in batch])
+            for index, data in zip(
+                    batch, _stretch_stack(stack, clip, mask_special)):
+                scaled[index] = data
+    return scaled
+
+
+def thumbnail_ranges(pds_file, size, method=MEAN):
+    """The parts of the data file :func:`read_thumbnail` reads
+
+    Parameters
+    ----------
+    pds_file : pystamps.pdsfile.PDSFile
+        The product the thumbnail is made of
+    size : int
+        Maximum number of lines and samples of the thumbnail
+    method : string
+        ``'mean'`` or ``'stride'``, see :func:`decimate`
+
+    Returns
+    -------
+    ranges : list
+        ``(offset, length)`` pairs in ``pds_file.data_filename``
+    """
+    if method != STRIDE:
+        return pds_file.byte_ranges()
+    return pds_file.byte_ranges(
+        decimation_factor(pds_file.shape[1:], size))
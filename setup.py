@@ -40,6 +40,8 @@ setup(
         'planetaryimage>=0.5.0',
         'matplotlib>=1.5.1',
         'QtPy>=1.2.1',
+        'futures; python_version < "3"',
+        'scandir; python_version < "3.5"',
     ],
     license="BSD",
     zip_safe=False,
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""Paths to the mission data and synthetic products shared by the tests
+
+The mission data is fetched into ``tests/mission_data`` by
+``get_mission_data``, see ``make test``. Products made up by the tests are
+written with :func:`write_image`.
+"""
+
+import os
+
+import numpy
+
+FILE_1 = os.path.join(
+    'tests', 'mission_data', '2m132591087cfd1800p2977m2f1.img')
+FILE_2 = os.path.join(
+    'tests', 'mission_data', '2p129641989eth0361p2600r8m1.img')
+FILE_3 = os.path.join(
+    'tests', 'mission_data', '1p190678905erp64kcp2600l8c1.img')
+FILE_4 = os.path.join(
+    'tests', 'mission_data', 'r01090al.img')
+FILE_5 = os.path.join(
+    'tests', 'mission_data', '1p134482118erp0902p2600r8m1.img')
+FILE_6 = os.path.join(
+    'tests', 'mission_data', 'h58n3118.img')
+FILE_7 = os.path.join(
+    'tests', 'mission_data', '0047MH0000110010100214C00_DRCL.IMG')
+TEST_DIR = [FILE_1, FILE_2, FILE_3, FILE_4, FILE_5, FILE_6, FILE_7]
+
+LABEL = (
+    'PDS_VERSION_ID = PDS3\r\n'
+    'RECORD_TYPE = FIXED_LENGTH\r\n'
+    'RECORD_BYTES = {record_bytes}\r\n'
+    '^IMAGE = {pointer}\r\n'
+    'OBJECT = IMAGE\r\n'
+    '  BANDS = {bands}\r\n'
+    '  LINES = {lines}\r\n'
+    '  LINE_SAMPLES = {samples}\r\n'
+    '  SAMPLE_BITS = 16\r\n'
+    '  SAMPLE_TYPE = {sample_type}\r\n'
+    'END_OBJECT = IMAGE\r\n'
+    'END\r\n'
+)
+
+
+def write_image(path, data, sample_type='MSB_INTEGER', label_records=4):
+    """Write data as a PDS3 image with an attached label"""
+    bands, lines, samples = data.shape
+    record_bytes = samples * data.itemsize
+    label = LABEL.format(
+        record_bytes=record_bytes, pointer=label_records + 1, bands=bands,
+        lines=lines, samples=samples, sample_type=sample_type,
+    ).encode('ascii')
+    with open(path, 'wb') as stream:
+        stream.write(label.ljust(label_records * record_bytes, b' '))
+        stream.write(data.tobytes())
+
+
+def image_data(shape=(1, 20, 30)):
+    return numpy.arange(numpy.prod(shape), dtype='>i2').reshape(shape)
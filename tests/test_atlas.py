@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+from qtpy import QtGui
+
+from pystamps.atlas import ThumbnailAtlas
+
+
+def solid(width, height, gray):
+    image = QtGui.QImage(width, height, QtGui.QImage.Format_RGB32)
+    image.fill(QtGui.QColor(gray, gray, gray))
+    return image
+
+
+@pytest.fixture
+def atlas(qapp):
+    # Two by two cells of 10 pixels a page
+    return ThumbnailAtlas(10, page_size=25)
+
+
+def test_init(atlas):
+    assert atlas.per_row == 2
+    assert atlas.per_page == 4
+    assert atlas.pages == []
+    assert len(atlas) == 0
+
+
+def test_add(atlas):
+    atlas.add('a', solid(10, 6, 50))
+    assert 'a' in atlas
+    assert atlas.size('a') == (10, 6)
+    assert len(atlas.pages) == 1
+    assert atlas.pages[0].size().width() == 25
+    for key in 'bcd':
+        atlas.add(key, solid(10, 10, 100))
+    assert len(atlas.pages) == 1
+    atlas.add('e', solid(8, 10, 150))
+    assert len(atlas.pages) == 2
+    assert sorted(atlas.keys()) == list('abcde')
+    # Replacing a thumbnail does not take another cell
+    atlas.add('e', solid(8, 10, 200))
+    assert len(atlas) == 5
+    assert len(atlas.pages) == 2
+
+
+def test_discard(atlas):
+    for key in 'abcde':
+        atlas.add(key, solid(10, 10, 100))
+    atlas.discard('e')
+    assert 'e' not in atlas
+    # The empty page is released, the lowest free cell is reused
+    assert atlas.pages[1] is None
+    atlas.discard('b')
+    atlas.add('f', solid(10, 10, 100))
+    assert atlas._cells['f'][0] == 1
+    atlas.add('g', solid(10, 10, 100))
+    assert atlas._cells['g'][0] == 4
+    assert atlas.pages[1] is not None
+    atlas.discard('missing')
+    atlas.clear()
+    assert len(atlas) == 0
+    assert atlas.pages == []
+
+
+def test_draw(atlas):
+    atlas.add('a', solid(10, 10, 50))
+    atlas.add('b', solid(6, 4, 200))
+    target = QtGui.QImage(20, 20, QtGui.QImage.Format_RGB32)
+    target.fill(QtGui.QColor(0, 0, 0))
+    painter = QtGui.QPainter(target)
+    atlas.draw(painter, 0, 0, 'a')
+    atlas.draw(painter, 12, 12, 'b')
+    painter.end()
+    assert QtGui.QColor(target.pixel(9, 9)).red() == 50
+    assert QtGui.QColor(target.pixel(12, 12)).red() == 200
+    assert QtGui.QColor(target.pixel(17, 15)).red() == 200
+    # Only the thumbnail is drawn, not the rest of its cell
+    assert QtGui.QColor(target.pixel(18, 16)).red() == 0
+    assert QtGui.QColor(target.pixel(11, 11)).red() == 0
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy
+import pytest
+
+from pystamps.loader import StampData, NOT_COMPATIBLE
+from pystamps.cache import ThumbnailCache, default_directory
+
+
+@pytest.fixture
+def cache(tmpdir):
+    return ThumbnailCache(str(tmpdir.join('cache')))
+
+
+@pytest.fixture
+def image_file(tmpdir):
+    path = tmpdir.join('image.img')
+    path.write_binary(b'PDS_VERSION_ID = PDS3')
+    return str(path)
+
+
+def entry(value=1, shape=(1, 4, 4)):
+    return StampData(True, shape, numpy.full(shape[1:], value, '>i2'))
+
+
+def test_default_directory(monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', os.path.join('some', 'where'))
+    assert default_directory() == os.path.join('some', 'where', 'pystamps')
+
+
+class TestThumbnailCache(object):
+
+    def test_init(self, tmpdir):
+        directory = str(tmpdir.join('new', 'cache'))
+        cache = ThumbnailCache(directory, max_size=10, refresh=True)
+        assert os.path.isdir(directory)
+        assert cache.directory == directory
+        assert cache.max_size == 10
+        assert cache.refresh
+        assert cache.size == 0
+
+    def test_key(self, cache, image_file):
+        key = cache.key(image_file, (150, 'mean'))
+        assert key == cache.key(image_file, (150, 'mean'))
+        assert key != cache.key(image_file, (150, 'stride'))
+        assert cache.key(image_file + '.missing') is None
+        with open(image_file, 'ab') as stream:
+            stream.write(b'more')
+        assert key != cache.key(image_file, (150, 'mean'))
+
+    def test_put_get(self, cache, image_file):
+        assert cache.get(image_file) is None
+        cache.put(image_file, entry(7))
+        cached = cache.get(image_file)
+        assert cached.compatible
+        assert cached.shape == (1, 4, 4)
+        assert cached.thumbnail.dtype == numpy.dtype('>i2')
+        assert (cached.thumbnail == 7).all()
+        assert cache.size == sum(
+            os.path.getsize(os.path.join(cache.directory, name))
+            for name in os.listdir(cache.directory))
+
+    def test_not_compatible(self, cache, image_file):
+        cache.put(image_file, NOT_COMPATIBLE)
+        assert cache.get(image_file) == NOT_COMPATIBLE
+
+    def test_changed_file_misses(self, cache, image_file):
+        cache.put(image_file, entry())
+        with open(image_file, 'ab') as stream:
+            stream.write(b'more')
+        assert cache.get(image_file) is None
+
+    def test_refresh(self, cache, image_file):
+        cache.put(image_file, entry(1))
+        refreshing = ThumbnailCache(cache.directory, refresh=True)
+        assert refreshing.get(image_file) is None
+        refreshing.put(image_file, entry(2))
+        assert (cache.get(image_file).thumbnail == 2).all()
+
+    def test_corrupt_entry(self, cache, image_file):
+        cache.put(image_file, entry())
+        path = os.path.join(cache.directory, os.listdir(cache.directory)[0])
+        with open(path, 'wb') as stream:
+            stream.write(b'garbage')
+        assert cache.get(image_file) is None
+
+    def test_evict_least_recently_used(self, tmpdir, cache):
+        files = []
+        for index in range(4):
+            path = tmpdir.join('%d.img' % index)
+            path.write_binary(b'data')
+            files.append(str(path))
+            cache.put(files[-1], entry(index, (1, 50, 50)))
+            entry_path = os.path.join(
+                cache.directory, cache.key(files[-1]) + '.npz')
+            os.utime(entry_path, (index, index))
+        # Using the oldest entry makes it the most recently used
+        assert cache.get(files[0]) is not None
+        entry_size = cache.size // 4
+        cache.max_size = entry_size * 3
+        cache.put(files[0], entry(0, (1, 50, 50)))
+        assert cache.size <= cache.max_size
+        assert cache.get(files[0]) is not None
+        assert cache.get(files[1]) is None
+        assert cache.get(files[3]) is not None
+
+    def test_clear(self, cache, image_file):
+        cache.put(image_file, entry())
+        cache.clear()
+        assert cache.size == 0
+        assert os.listdir(cache.directory) == []
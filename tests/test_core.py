@@ -0,0 +1,206 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import gc
+import weakref
+
+import numpy
+import pytest
+
+from pystamps import core
+from pystamps.cache import ThumbnailCache
+from pystamps.loader import StampData, NOT_COMPATIBLE
+
+from .helpers import FILE_2, FILE_7, TEST_DIR, write_image, image_data
+
+
+class TestImageRecord(object):
+
+    def test_init(self):
+        record = core.ImageRecord(FILE_2, 50)
+        assert record.file_name == FILE_2
+        assert record.abspath == os.path.abspath(FILE_2)
+        assert record.basename == os.path.basename(FILE_2)
+        assert record.params == (50, 'mean')
+        assert record.pds_compatible
+        assert record.loaded
+        assert record._thumbnail is None
+        assert max(record.thumbnail.shape) <= 50
+        assert record.shape == record.pds_file.shape
+        assert record.data.shape == record.shape
+        assert repr(record) == FILE_2
+
+    def test_not_compatible(self):
+        record = core.ImageRecord(FILE_7, 50)
+        assert not record.pds_compatible
+        assert record.pds_file is None
+        assert record.thumbnail is None
+        assert record.data is NOT_COMPATIBLE
+
+    def test_placeholder(self):
+        record = core.ImageRecord(FILE_7, 50, placeholder=True)
+        assert not record.loaded
+        assert record.pds_compatible
+        record.load(StampData(True, (1, 2, 3), numpy.ones((2, 3))))
+        assert record.loaded
+        assert record.shape == (1, 2, 3)
+
+    def test_pds_image(self):
+        record = core.ImageRecord(FILE_2, 50)
+        pds_image = record.pds_image
+        assert record._pds_image is pds_image
+        assert record.pds_image is pds_image
+        assert core.ImageRecord(FILE_7, 50).pds_image is None
+
+    def test_low_memory(self, monkeypatch):
+        monkeypatch.setattr(core.ImageRecord, 'low_memory', True)
+        record = core.ImageRecord(FILE_2, 50)
+        shape = record.shape
+        record.thumbnail
+        # Only the thumbnail and the shape are kept
+        assert record._pds_file is None
+        assert record.shape == shape
+        pds_image = record.pds_image
+        assert record.pds_image is pds_image
+        assert isinstance(record._pds_image, weakref.ref)
+        del pds_image
+        gc.collect()
+        assert record._pds_image() is None
+        assert record.pds_image.image.shape[:2] == shape[1:]
+        assert record.pds_file.shape == shape
+
+    def test_unload(self):
+        record = core.ImageRecord(FILE_2, 50)
+        assert record.thumbnail is not None
+        record.unload()
+        assert not record.loaded
+        assert record.pds_compatible
+        assert record._thumbnail is None
+        assert record._pds_file is None
+
+    def test_cache(self, tmpdir):
+        cache = ThumbnailCache(str(tmpdir))
+        record = core.ImageRecord(FILE_2, 50, 'stride', cache)
+        thumbnail = record.thumbnail
+        cached = core.ImageRecord(FILE_2, 50, 'stride', cache)
+        assert cached._pds_file is None
+        assert (cached.thumbnail == thumbnail).all()
+        core.ImageRecord(FILE_7, 50, cache=cache)
+        assert cache.get(os.path.abspath(FILE_7), (50, 'mean')) == (
+            NOT_COMPATIBLE)
+
+
+LABEL = 'PDS_VERSION_ID = PDS3\r\nEND\r\n'
+
+
+class TestScan(object):
+
+    @pytest.fixture
+    def files(self, tmpdir, monkeypatch):
+        for name in ['a.img', 'b.img', 'c.lbl', '.hidden.img']:
+            tmpdir.join(name).write(LABEL)
+        tmpdir.join('notes.txt').write('Some notes\n')
+        tmpdir.join('preview.png').write(LABEL)
+        sub = tmpdir.mkdir('sub')
+        sub.join('d.img').write(LABEL)
+        sub.mkdir('deeper').join('e.img').write(LABEL)
+        tmpdir.mkdir('skip').join('f.img').write(LABEL)
+        monkeypatch.chdir(str(tmpdir))
+
+    def test_current_directory(self, files):
+        found = ['a.img', 'b.img', 'c.lbl']
+        assert sorted(core.scan()) == found
+        assert sorted(core.scan([])) == found
+
+    def test_list(self, files):
+        found = core.scan(['*.img', 'sub', 'a.img'])
+        assert sorted(found[:2]) == ['a.img', 'b.img']
+        assert found[2:] == [os.path.join('sub', 'd.img')]
+
+    def test_string(self, files):
+        found = core.scan('c.lbl, *.img')
+        assert found[0] == 'c.lbl'
+        assert sorted(found[1:]) == ['a.img', 'b.img']
+
+    def test_prefilter(self, files):
+        assert sorted(core.scan(prefilter=False)) == [
+            'a.img', 'b.img', 'c.lbl', 'notes.txt', 'preview.png']
+        assert core.scan('notes.txt') == []
+
+    def test_recursive(self, files):
+        found = core.scan(recursive=True)
+        assert sorted(found[:3]) == ['a.img', 'b.img', 'c.lbl']
+        assert sorted(found[3:5]) == [
+            os.path.join('skip', 'f.img'), os.path.join('sub', 'd.img')]
+        assert found[5:] == [os.path.join('sub', 'deeper', 'e.img')]
+        assert sorted(core.scan('s*', recursive=True)) == [
+            os.path.join('skip', 'f.img'), os.path.join('sub', 'd.img'),
+            os.path.join('sub', 'deeper', 'e.img')]
+
+    def test_include_exclude(self, files):
+        assert sorted(core.scan(include='*.img')) == ['a.img', 'b.img']
+        assert sorted(core.scan(recursive=True, exclude=['skip', 'a*'])) == [
+            'b.img', 'c.lbl', os.path.join('sub', 'd.img'),
+            os.path.join('sub', 'deeper', 'e.img')]
+        assert core.scan(
+            recursive=True, include='*.img', exclude='deeper, ?.img') == []
+
+    def test_discover_streams(self, files, monkeypatch):
+        listed = []
+        scandir = core.scandir
+        monkeypatch.setattr(
+            core, 'scandir',
+            lambda path: listed.append(path) or scandir(path))
+        found = core.discover(recursive=True)
+        assert next(found) in ['a.img', 'b.img', 'c.lbl']
+        assert listed == [os.curdir]
+        assert len(list(found)) == 5
+        assert len(listed) == 4
+
+    def test_directories(self, files):
+        assert core.directories() == [os.curdir]
+        assert core.directories('sub, *.img, missing/*.img') == [
+            'sub', os.curdir]
+        found = core.scan(recursive=True)
+        assert sorted(core.directories('sub', True, found)) == sorted([
+            os.curdir, 'sub', 'skip', os.path.join('sub', 'deeper')])
+
+    def test_file_signature(self, files):
+        size, mtime = core.file_signature('a.img')
+        assert size == len(LABEL)
+        assert core.file_signature('missing.img') is None
+
+    def test_unique(self):
+        assert core.unique(['b', 'a', 'b', 'c', 'a']) == ['b', 'a', 'c']
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_generate_records(workers):
+    records = dict(core.generate_records(TEST_DIR, 30, workers=workers))
+    assert sorted(records) == list(range(len(TEST_DIR)))
+    for index, record in records.items():
+        assert record.file_name == TEST_DIR[index]
+        assert record.loaded
+    assert records[1].pds_compatible
+    assert max(records[1].thumbnail.shape) <= 30
+    assert records[1]._pds_file is None
+    assert not records[6].pds_compatible
+
+
+def test_precompute(tmpdir):
+    products = tmpdir.mkdir('products')
+    files = [str(products.join(name)) for name in [
+        'synthetic0.img', 'synthetic1.img', 'unsupported.img',
+        'not_a_label.img']]
+    write_image(files[0], image_data())
+    write_image(files[1], image_data((3, 20, 30)))
+    write_image(files[2], image_data(), 'VAX_REAL')
+    products.join('not_a_label.img').write_binary(bytes(bytearray(range(256))))
+    directory = str(tmpdir.mkdir('cache'))
+    cache = ThumbnailCache(directory)
+    records = core.precompute(files[::-1], 30, cache=cache, workers=1)
+    assert [record.file_name for record in records] == [files[1], files[0]]
+    # The file that is not a label is skipped by the prefilter without
+    # being opened
+    assert len(os.listdir(directory)) == len(files) - 1
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import subprocess
+
+#: Seconds importing pystamps may take, a few times what it takes now
+IMPORT_BUDGET = 0.5
+
+IMPORT_SCRIPT = """
+import sys
+import json
+import time
+start = time.time()
+import pystamps.pystamps
+elapsed = time.time() - start
+from qtpy import QtWidgets
+print(json.dumps({
+    'elapsed': elapsed,
+    'app': QtWidgets.QApplication.instance() is not None,
+    'modules': sorted(
+        name for name in ('matplotlib', 'pdsview', 'pdsspect')
+        if name in sys.modules),
+}))
+"""
+
+
+def run_import():
+    env = dict(os.environ)
+    # Creating a QApplication without a display would abort the interpreter
+    env.pop('DISPLAY', None)
+    env.pop('QT_QPA_PLATFORM', None)
+    output = subprocess.check_output(
+        [sys.executable, '-c', IMPORT_SCRIPT], env=env)
+    return json.loads(output.decode('utf-8'))
+
+
+def test_headless_import():
+    result = run_import()
+    assert not result['app']
+    assert result['modules'] == []
+
+
+def test_import_budget():
+    # The first import may fill the bytecode caches
+    run_import()
+    assert run_import()['elapsed'] < IMPORT_BUDGET
+
+
+def test_core_without_qt():
+    script = (
+        "import sys\n"
+        "import pystamps.core, pystamps.cache, pystamps.selection\n"
+        "print(any(name.split('.')[0] in ('qtpy', 'PyQt5', 'PyQt4', 'PySide')"
+        " for name in sys.modules))\n"
+    )
+    output = subprocess.check_output([sys.executable, '-c', script])
+    assert output.strip() == b'False'
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import errno
+
+import numpy
+import pytest
+from planetaryimage import PDS3Image
+
+from pystamps import loader
+from pystamps.cache import ThumbnailCache
+from pystamps.thumbnail import decimate, STRIDE
+
+from .helpers import FILE_2, FILE_7, TEST_DIR
+
+
+def test_load_stamp_data():
+    data = loader.load_stamp_data(FILE_2, 20, STRIDE)
+    pds_image = PDS3Image.open(FILE_2)
+    assert data.compatible
+    assert data.shape == pds_image.shape
+    assert (data.thumbnail == decimate(pds_image.image, 20, STRIDE)).all()
+
+
+@pytest.mark.parametrize('file_name', [FILE_7, 'does_not_exist.img'])
+def test_load_stamp_data_not_compatible(file_name):
+    assert loader.load_stamp_data(file_name, 20) is loader.NOT_COMPATIBLE
+
+
+@pytest.mark.parametrize('workers', [1, 3, None])
+def test_load_stamps_data(workers):
+    expected = [loader.load_stamp_data(name, 20) for name in TEST_DIR]
+    loaded = list(loader.load_stamps_data(TEST_DIR, 20, workers=workers))
+    assert len(loaded) == len(TEST_DIR)
+    for data, expected_data in zip(loaded, expected):
+        assert data.compatible == expected_data.compatible
+        assert data.shape == expected_data.shape
+        if data.compatible:
+            assert numpy.array_equal(data.thumbnail, expected_data.thumbnail)
+
+
+def test_load_stamps_data_empty():
+    assert list(loader.load_stamps_data([], 20, workers=4)) == []
+
+
+def test_load_stamps_data_close_early():
+    loaded = loader.load_stamps_data(TEST_DIR * 10, 20, workers=2)
+    assert next(loaded).compatible
+    loaded.close()
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_prepare_stamps_data(tmpdir, workers):
+    cache = ThumbnailCache(str(tmpdir))
+    params = (20, 'mean')
+    cache.put(os.path.abspath(TEST_DIR[2]), loader.NOT_COMPATIBLE, params)
+    prepared = list(loader.prepare_stamps_data(
+        TEST_DIR[:3], *params, cache=cache, workers=workers))
+    # Cached files come first
+    assert prepared[0] == (2, loader.NOT_COMPATIBLE)
+    assert [index for index, _ in prepared[1:]] == [0, 1]
+    assert all(data.compatible for _, data in prepared[1:])
+    assert cache.get(os.path.abspath(TEST_DIR[0]), params).compatible
+
+
+def test_prepare_stamps_data_disk_order(monkeypatch):
+    monkeypatch.setattr(
+        loader, 'read_order', lambda names: list(reversed(range(len(names)))))
+    prepared = list(loader.prepare_stamps_data(
+        TEST_DIR[:3], 20, disk_order=True))
+    assert [index for index, _ in prepared] == [2, 1, 0]
+    assert prepared[2][1].shape == PDS3Image.open(TEST_DIR[0]).shape
+
+
+@pytest.fixture
+def tree(tmpdir):
+    """Files named in an order that alternates between two directories"""
+    names = []
+    for number in range(6):
+        directory = tmpdir.join('ab'[number % 2])
+        directory.ensure(dir=True)
+        path = directory.join('image%d.img' % number)
+        path.write(b'data')
+        names.append(str(path))
+    return names
+
+
+def test_read_order(tree, monkeypatch):
+    asked = []
+
+    def unsupported(file_name):
+        asked.append(file_name)
+        raise OSError(errno.ENOTTY, 'Not supported')
+
+    monkeypatch.setattr(loader, 'physical_offset', unsupported)
+    order = loader.read_order(tree + ['does_not_exist.img'])
+    # Grouped by directory, in the order the inodes were handed out
+    assert order == [0, 2, 4, 1, 3, 5, 6]
+    # Extents are not asked for again on a device that does not map them
+    assert asked == tree[:1]
+
+
+def test_read_order_physical(tree, monkeypatch):
+    offsets = [50, 10, None, 40, 30, 20]
+    monkeypatch.setattr(
+        loader, 'physical_offset',
+        lambda file_name: offsets[tree.index(file_name)])
+    assert loader.read_order(tree) == [2, 1, 5, 4, 3, 0]
+
+
+def test_physical_offset(tree):
+    try:
+        offset = loader.physical_offset(tree[0])
+    except OSError as error:
+        assert error.errno in loader.FIEMAP_UNSUPPORTED
+        pytest.skip('The file system does not map extents')
+    assert offset is None or offset >= 0
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import bz2
+import gzip
+
+import numpy
+import pytest
+from planetaryimage import PDS3Image
+
+from pystamps.pdsfile import (
+    PDSFile, read_label, looks_like_label, LABEL_CHUNK_SIZE)
+
+from .helpers import (
+    FILE_2, TEST_DIR, LABEL, write_image, image_data)
+
+
+class TestPDSFile(object):
+
+    @pytest.mark.parametrize('file_name', TEST_DIR)
+    def test_matches_planetaryimage(self, file_name):
+        try:
+            pds_image = PDS3Image.open(file_name)
+            assert pds_image.image is not None
+        except Exception:
+            with pytest.raises(Exception):
+                PDSFile(file_name)
+        else:
+            pds_file = PDSFile(file_name)
+            assert pds_file.shape == pds_image.shape
+            assert pds_file.dtype == pds_image.dtype
+            assert pds_file.start_byte == pds_image.start_byte
+            assert pds_file.data_filename == file_name
+
+    def test_init(self):
+        pds_file = PDSFile(FILE_2)
+        assert pds_file.file_name == FILE_2
+        assert pds_file.compression is None
+        assert pds_file.label['IMAGE']['LINES'] == pds_file.lines
+        assert pds_file.nbytes == (
+            pds_file.bands * pds_file.lines * pds_file.samples *
+            pds_file.dtype.itemsize)
+        assert repr(pds_file) == FILE_2
+
+    def test_not_a_label(self, tmpdir):
+        path = tmpdir.join('not_a_label.img')
+        path.write_binary(b'\x89PNG\r\n\x1a\n' + bytes(bytearray(256)))
+        with pytest.raises(ValueError):
+            PDSFile(str(path))
+
+    def test_only_label_is_read(self, tmpdir):
+        path = str(tmpdir.join('big.img'))
+        write_image(path, image_data((1, 2000, 1000)))
+        with open(path, 'rb') as stream:
+            read_label(stream)
+            assert stream.tell() < 64 * 1024
+
+    def test_label_split_across_chunks(self, tmpdir, monkeypatch):
+        monkeypatch.setattr('pystamps.pdsfile.LABEL_CHUNK_SIZE', 7)
+        path = str(tmpdir.join('split.img'))
+        write_image(path, image_data())
+        assert PDSFile(path).shape == (1, 20, 30)
+
+    def test_end_object_across_chunks(self, tmpdir):
+        data = image_data()
+        label = LABEL.format(
+            record_bytes=60, pointer=71, bands=1, lines=20, samples=30,
+            sample_type='MSB_INTEGER')
+        # Pad the label so the first chunk read ends in the END of END_OBJECT
+        end = label.index('\r\nEND_OBJECT') + len('\r\nEND')
+        padding = '/* %s */\r\n' % ('x' * (LABEL_CHUNK_SIZE - end - 8))
+        label = label.replace('PDS3\r\n', 'PDS3\r\n' + padding, 1)
+        assert label.index('\r\nEND_OBJECT') + 5 == LABEL_CHUNK_SIZE
+        path = str(tmpdir.join('padded.img'))
+        with open(path, 'wb') as stream:
+            stream.write(label.encode('ascii').ljust(70 * 60, b' '))
+            stream.write(data.tobytes())
+        assert PDSFile(path).shape == (1, 20, 30)
+        assert (PDS3Image.open(path).data == data).all()
+
+    def test_detached_label(self, tmpdir):
+        data = image_data()
+        data_path = tmpdir.join('detached.img')
+        data_path.write_binary(data.tobytes())
+        label_path = str(tmpdir.join('detached.lbl'))
+        with open(label_path, 'w') as stream:
+            stream.write(LABEL.format(
+                record_bytes=60, pointer='"detached.img"', bands=1, lines=20,
+                samples=30, sample_type='MSB_INTEGER'))
+        pds_file = PDSFile(label_path)
+        assert pds_file.data_filename == str(data_path)
+        assert pds_file.start_byte == 0
+        assert (PDS3Image.open(label_path).data == data).all()
+
+    def test_compressed(self, tmpdir):
+        path = str(tmpdir.join('compressed.img'))
+        write_image(path, image_data())
+        with open(path, 'rb') as source:
+            with gzip.open(path + '.gz', 'wb') as target:
+                target.write(source.read())
+        pds_file = PDSFile(path + '.gz')
+        assert pds_file.compression == 'gz'
+        assert pds_file.shape == (1, 20, 30)
+
+    @pytest.mark.parametrize('shape', [(1, 20, 30), (3, 20, 30)])
+    def test_memmap(self, tmpdir, shape):
+        path = str(tmpdir.join('mapped.img'))
+        write_image(path, image_data(shape))
+        pds_file = PDSFile(path)
+        data = pds_file.memmap()
+        assert isinstance(data, numpy.memmap)
+        assert not data.flags['WRITEABLE']
+        assert (data == PDS3Image.open(path).data).all()
+        image = pds_file.open_image()
+        expected = PDS3Image.open(path).image
+        assert image.shape == expected.shape
+        # planetaryimage swaps three band images to native byte order
+        assert image.dtype.newbyteorder('=') == (
+            expected.dtype.newbyteorder('='))
+        assert (image == expected).all()
+
+    def test_memmap_compressed(self, tmpdir):
+        path = str(tmpdir.join('compressed.img'))
+        write_image(path, image_data())
+        with open(path, 'rb') as source:
+            with gzip.open(path + '.gz', 'wb') as target:
+                target.write(source.read())
+        pds_file = PDSFile(path + '.gz')
+        with pytest.raises(ValueError):
+            pds_file.memmap()
+        assert (pds_file.open_image() == image_data()[0]).all()
+
+    @pytest.mark.parametrize('step', [1, 3, 7, 40])
+    @pytest.mark.parametrize('shape', [(1, 20, 30), (3, 20, 30)])
+    def test_read_strided(self, tmpdir, shape, step):
+        path = str(tmpdir.join('strided.img'))
+        write_image(path, image_data(shape))
+        data = PDSFile(path).read_strided(step)
+        assert (data == image_data(shape)[:, ::step, ::step]).all()
+
+    def test_read_strided_reads_kept_lines(self, tmpdir, monkeypatch):
+        path = str(tmpdir.join('strided.img'))
+        write_image(path, image_data((1, 100, 50)))
+        pds_file = PDSFile(path)
+        read_sizes = []
+
+        class CountingStream(io.BufferedReader):
+            def read(self, size=-1):
+                read_sizes.append(size)
+                return super(CountingStream, self).read(size)
+
+        monkeypatch.setattr(
+            'pystamps.pdsfile._open',
+            lambda name: (CountingStream(io.FileIO(name)), None))
+        pds_file.read_strided(10)
+        assert sum(read_sizes) == 10 * 50 * 2
+
+    def test_read_strided_compressed(self, tmpdir):
+        path = str(tmpdir.join('compressed.img'))
+        write_image(path, image_data((3, 20, 30)))
+        with open(path, 'rb') as source:
+            with bz2.BZ2File(path + '.bz2', 'wb') as target:
+                target.write(source.read())
+        data = PDSFile(path + '.bz2').read_strided(4)
+        assert (data == image_data((3, 20, 30))[:, ::4, ::4]).all()
+
+    def test_read_strided_truncated(self, tmpdir):
+        path = str(tmpdir.join('truncated.img'))
+        write_image(path, image_data())
+        pds_file = PDSFile(path)
+        with open(path, 'rb+') as stream:
+            stream.truncate(os.path.getsize(path) - 1)
+        with pytest.raises(ValueError):
+            pds_file.read_strided(1)
+
+    @pytest.mark.parametrize('step', [1, 3])
+    @pytest.mark.parametrize('shape', [(1, 20, 30), (3, 20, 30)])
+    def test_byte_ranges(self, tmpdir, shape, step):
+        path = str(tmpdir.join('ranges.img'))
+        write_image(path, image_data(shape))
+        pds_file = PDSFile(path)
+        ranges = pds_file.byte_ranges(step)
+        with open(path, 'rb') as stream:
+            data = b''
+            for offset, length in ranges:
+                stream.seek(offset)
+                data += stream.read(length)
+        lines = numpy.frombuffer(data, '>i2').reshape((shape[0], -1, 30))
+        assert (lines == image_data(shape)[:, ::step]).all()
+        if step == 1:
+            assert ranges == [(pds_file.start_byte, pds_file.nbytes)]
+
+    def test_byte_ranges_compressed(self, tmpdir):
+        path = str(tmpdir.join('compressed.img'))
+        write_image(path, image_data())
+        with open(path, 'rb') as source:
+            with gzip.open(path + '.gz', 'wb') as target:
+                target.write(source.read())
+        assert PDSFile(path + '.gz').byte_ranges(4) == [
+            (0, os.path.getsize(path + '.gz'))]
+
+    @pytest.mark.parametrize(
+        'shape, sample_type',
+        [
+            ((1, 20, 30), 'VAX_REAL'),
+            ((2, 20, 30), 'MSB_INTEGER'),
+        ])
+    def test_unsupported(self, tmpdir, shape, sample_type):
+        path = str(tmpdir.join('unsupported.img'))
+        write_image(path, image_data(shape), sample_type)
+        with pytest.raises(ValueError):
+            PDSFile(path)
+
+    def test_truncated(self, tmpdir):
+        path = str(tmpdir.join('truncated.img'))
+        write_image(path, image_data())
+        with open(path, 'rb+') as stream:
+            stream.truncate(os.path.getsize(path) - 1)
+        with pytest.raises(ValueError):
+            PDSFile(path)
+        with pytest.raises(Exception):
+            PDS3Image.open(path)
+
+
+@pytest.mark.parametrize(
+    'name, content, expected',
+    [
+        ('image.img', b'PDS_VERSION_ID = PDS3\r\n', True),
+        ('image.img', b'\r\n  /* Comment */\r\nPDS_VERSION_ID = PDS3', True),
+        ('old.img', b'CCSD3ZF0000100000001NJPL3IF0PDS200000001 = SFDU', True),
+        ('image.img', b'\x00\x01\x02\x03', False),
+        ('image.img', b'', False),
+        ('notes.txt', b'Some notes\n', False),
+        ('image.png', b'PDS_VERSION_ID = PDS3\r\n', False),
+        ('image.img.gz', gzip.compress(b'PDS_VERSION_ID = PDS3'), True),
+        ('image.img.gz', b'PDS_VERSION_ID = PDS3\r\n', False),
+        ('image.img.bz2', bz2.compress(b'PDS_VERSION_ID = PDS3'), True),
+    ])
+def test_looks_like_label(tmpdir, name, content, expected):
+    path = tmpdir.join(name)
+    path.write_binary(content)
+    assert looks_like_label(str(path)) is expected
+
+
+def test_looks_like_label_mission_data():
+    assert all(looks_like_label(path) for path in TEST_DIR[:6])
+    assert not looks_like_label(os.path.join('tests', 'missing.img'))
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import io
+
+import pytest
+
+from pystamps import prefetch
+from pystamps.prefetch import Prefetcher, prefetch_ranges
+from pystamps.thumbnail import MEAN, STRIDE
+
+from .helpers import write_image, image_data
+
+# 100 lines of 50 two byte samples
+NBYTES = 100 * 50 * 2
+
+
+@pytest.fixture
+def files(tmpdir):
+    names = []
+    for number in range(6):
+        name = str(tmpdir.join('image%d.img' % number))
+        write_image(name, image_data((1, 100, 50)))
+        names.append(name)
+    return names
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """The (file, offset, length) of every read or advice"""
+    reads = []
+
+    class RecordingStream(io.FileIO):
+        def seek(self, offset, whence=0):
+            reads.append([self.name, offset, 0])
+            return super(RecordingStream, self).seek(offset, whence)
+
+        def readinto(self, buf):
+            read = super(RecordingStream, self).readinto(buf)
+            reads[-1][2] += read
+            return read
+
+    def fadvise(fd, offset, length, advice):
+        assert advice == prefetch.WILLNEED
+        reads.append([fd, offset, length])
+
+    monkeypatch.setattr(
+        'pystamps.prefetch.open',
+        lambda name, mode: RecordingStream(name, 'r'), raising=False)
+    if prefetch.WILLNEED is not None:
+        monkeypatch.setattr('os.posix_fadvise', fadvise)
+    return reads
+
+
+@pytest.mark.parametrize('advise', [True, False])
+def test_prefetch_ranges(files, reads, advise):
+    prefetch_ranges(files[0], [(10, 30), (2000, 5000), (50, 0)], advise)
+    assert [tuple(read[1:]) for read in reads] == [
+        (10, 30), (2000, 5000), (50, 0)]
+    if not advise or prefetch.WILLNEED is None:
+        assert reads[0][0] == files[0]
+
+
+def test_prefetch_ranges_chunked(files, reads, monkeypatch):
+    monkeypatch.setattr(prefetch, 'READ_SIZE', 300)
+    prefetch_ranges(files[0], [(0, 1000)], advise=False)
+    assert reads == [[files[0], 0, 1000]]
+
+
+def test_request(files, reads):
+    prefetcher = Prefetcher(20, STRIDE, advise=False)
+    prefetcher.request(files[:2])
+    assert prefetcher.wait(5)
+    assert prefetcher.files == 2
+    # The stride reads every 5th line
+    assert prefetcher.bytes == 2 * 20 * 50 * 2
+    assert prefetcher.used == prefetcher.bytes
+    assert sorted(set(read[0] for read in reads)) == files[:2]
+    # Files that were prefetched already are not read again, the ones that
+    # left the request no longer count
+    prefetcher.request(files[1:3])
+    assert prefetcher.wait(5)
+    assert prefetcher.files == 3
+    assert prefetcher.used == 2 * 20 * 50 * 2
+    prefetcher.request([])
+    assert prefetcher.used == 0
+    prefetcher.close()
+    prefetcher.request(files)
+    assert prefetcher.files == 3
+
+
+def test_budget(files, reads):
+    prefetcher = Prefetcher(20, MEAN, budget=2.5 * NBYTES, advise=False)
+    prefetcher.request(files)
+    assert prefetcher.wait(5)
+    assert prefetcher.files == 2
+    assert prefetcher.used == 2 * NBYTES
+    # Once the first files are loaded there is room for the next ones
+    prefetcher.request(files[2:])
+    assert prefetcher.wait(5)
+    assert prefetcher.files == 4
+    prefetcher.close()
+
+
+def test_not_a_label(tmpdir, files, reads):
+    not_label = tmpdir.join('notes.txt')
+    not_label.write('Not a label')
+    prefetcher = Prefetcher(20, advise=False)
+    prefetcher.request([str(not_label), files[0]])
+    assert prefetcher.wait(5)
+    assert prefetcher.files == 1
+    prefetcher.close()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+
+import pytest
+
+from pystamps import profiling
+from pystamps.loader import load_stamps_data
+
+from .helpers import TEST_DIR
+
+FILES = TEST_DIR[:4]
+
+
+@pytest.fixture
+def profiler():
+    yield profiling.enable()
+    profiling.disable()
+
+
+def test_disabled():
+    assert not profiling.enabled()
+    with profiling.span('read', file='a.img'):
+        pass
+    profiling.add('discover', 0, 1)
+    assert profiling.profiler() is None
+
+
+def test_span(profiler):
+    assert profiling.enabled()
+    with profiling.span('read', file='a.img'):
+        pass
+    with pytest.raises(ValueError):
+        with profiling.span('read', file='b.img'):
+            raise ValueError
+    profiling.add('discover', 10., 2.5, files=3)
+    read, failed, discover = profiler.spans
+    assert read.name == 'read'
+    assert read.args == {'file': 'a.img'}
+    assert read.pid == os.getpid()
+    assert read.duration >= 0
+    assert failed.args == {'file': 'b.img'}
+    assert discover.start == 10.
+    assert discover.duration == 2.5
+
+
+def test_summary(profiler):
+    profiling.add('read', 0., 1., file='a.img')
+    profiling.add('read', 1., 3., file='b.img')
+    profiling.add('discover', 0., 0.5)
+    summary = profiler.summary()
+    assert list(summary) == ['discover', 'read']
+    assert summary['read']['count'] == 2
+    assert summary['read']['total'] == 4.
+    assert summary['read']['mean'] == 2.
+    assert summary['read']['max'] == 3.
+    assert summary['read']['slowest'].args['file'] == 'b.img'
+    table = profiler.format_summary().splitlines()
+    assert len(table) == 3
+    assert table[2].split() == [
+        'read', '2', '4.000', '2000.000', '3000.000', 'b.img']
+
+
+def test_trace(profiler, tmpdir):
+    profiling.add('read', 100., 0.25, file='a.img')
+    profiling.add('decimate', 100.5, 0.125, file='a.img')
+    path = str(tmpdir.join('trace.json'))
+    profiler.write_trace(path)
+    with open(path) as stream:
+        events = json.load(stream)['traceEvents']
+    complete = [event for event in events if event['ph'] == 'X']
+    assert [event['name'] for event in complete] == ['read', 'decimate']
+    assert complete[0]['ts'] == 0
+    assert complete[1]['ts'] == 0.5e6
+    assert complete[1]['dur'] == 0.125e6
+    assert complete[0]['args'] == {'file': 'a.img'}
+    names = [event['name'] for event in events if event['ph'] == 'M']
+    assert names == ['process_name', 'thread_name']
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_load_stamps_data(profiler, workers):
+    list(load_stamps_data(FILES, 30, workers=workers))
+    summary = profiler.summary()
+    assert list(summary) == ['probe', 'read', 'decimate']
+    assert summary['probe']['count'] == len(FILES)
+    files = set(span.args['file'] for span in profiler.spans)
+    assert files == set(FILES)
+    pids = set(span.pid for span in profiler.spans)
+    assert (os.getpid() in pids) == (workers == 1)
@@ -2,28 +2,32 @@
 # -*- coding: utf-8 -*-
 
 import os
+import shutil
 from functools import wraps
 
+import numpy
 import pytest
-from qtpy import QtWidgets, QtCore
-
-from pystamps import pystamps
-
-FILE_1 = os.path.join(
-    'tests', 'mission_data', '2m132591087cfd1800p2977m2f1.img')
-FILE_2 = os.path.join(
-    'tests', 'mission_data', '2p129641989eth0361p2600r8m1.img')
-FILE_3 = os.path.join(
-    'tests', 'mission_data', '1p190678905erp64kcp2600l8c1.img')
-FILE_4 = os.path.join(
-    'tests', 'mission_data', 'r01090al.img')
-FILE_5 = os.path.join(
-    'tests', 'mission_data', '1p134482118erp0902p2600r8m1.img')
-FILE_6 = os.path.join(
-    'tests', 'mission_data', 'h58n3118.img')
-FILE_7 = os.path.join(
-    'tests', 'mission_data', '0047MH0000110010100214C00_DRCL.IMG')
-TEST_DIR = [FILE_1, FILE_2, FILE_3, FILE_4, FILE_5, FILE_6, FILE_7]
+from qtpy import QtWidgets, QtCore, QtGui
+
+from pystamps import core, pystamps, profiling
+from pystamps.pdsfile import PDSFile
+from pystamps.atlas import ThumbnailAtlas
+from pystamps.cache import ThumbnailCache
+from pystamps.loader import StampData, NOT_COMPATIBLE
+
+from .helpers import (
+    FILE_1, FILE_2, FILE_3, FILE_7, TEST_DIR, write_image, image_data)
+
+
+@pytest.fixture
+def products(tmpdir):
+    """Five synthetic products, the fourth one with three bands"""
+    files = []
+    for number in range(5):
+        path = str(tmpdir.join('synthetic%d.img' % number))
+        write_image(path, image_data((3 if number == 3 else 1, 20, 30)))
+        files.append(path)
+    return files
 
 
 class TestImageStamp(object):
@@ -38,6 +42,8 @@ class TestImageStamp(object):
         assert stamp.column == 1
         assert not stamp._selected
         assert stamp.pds_compatible
+        assert isinstance(stamp.pds_file, PDSFile)
+        assert stamp.pds_image.image is not None
         assert stamp.basename == os.path.basename(FILE_2)
         assert stamp.abspath == os.path.abspath(FILE_2)
         assert isinstance(stamp.button, pystamps.ImageButton)
@@ -52,6 +58,7 @@ class TestImageStamp(object):
         assert stamp.column == 342
         assert not stamp.pds_compatible
         assert not stamp._selected
+        assert stamp.pds_file is None
         assert stamp.pds_image is None
         assert stamp.basename == os.path.basename(FILE_7)
         assert stamp.abspath == os.path.abspath(FILE_7)
@@ -60,30 +67,68 @@ class TestImageStamp(object):
         assert stamp.title is None
         assert stamp.proxy_widget is None
 
+    def test_thumbnail(self):
+        stamp = self.stamp1
+        assert max(stamp.thumbnail.shape[:2]) <= pystamps.PSIZE
+        assert stamp.thumbnail.dtype == stamp.pds_image.image.dtype
+        assert stamp.thumbnail is stamp.thumbnail
+        assert self.stamp2.thumbnail is None
+
+    def test_cache(self, tmpdir):
+        cache = ThumbnailCache(str(tmpdir))
+        stamp = pystamps.ImageStamp(FILE_2, 0, 1, cache=cache)
+        # The thumbnail is made from the memory mapped pixels
+        assert stamp._thumbnail is not None
+        assert stamp._pds_image is None
+        cached_stamp = pystamps.ImageStamp(FILE_2, 0, 1, cache=cache)
+        assert cached_stamp.pds_compatible
+        assert cached_stamp._pds_file is None
+        assert cached_stamp._pds_image is None
+        assert cached_stamp.shape == stamp.shape
+        assert (cached_stamp.thumbnail == stamp.thumbnail).all()
+        assert isinstance(cached_stamp.button, pystamps.ImageButton)
+        assert isinstance(cached_stamp.pds_file, PDSFile)
+
+        pystamps.ImageStamp(FILE_7, 0, 1, cache=cache)
+        assert len(os.listdir(str(tmpdir))) == 2
+        cached_stamp = pystamps.ImageStamp(FILE_7, 0, 1, cache=cache)
+        assert not cached_stamp.pds_compatible
+        assert cached_stamp.pds_file is None
+
     def test_display_selected(self):
         stamp = self.stamp1
-        assert stamp.container.styleSheet() == pystamps.NOT_SELECTED
-        assert stamp.title.styleSheet() == pystamps.TITLE_NOT_SELECTED
+        assert not stamp.container.selected
+        assert not stamp.title.selected
         stamp.display_selected()
-        assert stamp.container.styleSheet() == pystamps.SELECTED
-        assert stamp.title.styleSheet() == pystamps.TITLE_SELECTED
-        stamp.container.setStyleSheet(pystamps.NOT_SELECTED)
-        stamp.title.setStyleSheet(pystamps.TITLE_NOT_SELECTED)
-        assert stamp.container.styleSheet() == pystamps.NOT_SELECTED
-        assert stamp.title.styleSheet() == pystamps.TITLE_NOT_SELECTED
+        assert stamp.container.selected
+        assert stamp.title.selected
+        border = stamp.container.grab().toImage()
+        assert QtGui.QColor(border.pixel(0, 0)).getRgb()[:3] == (
+            pystamps.SELECTED_COLOR)
+        title = stamp.title.palette().color(QtGui.QPalette.WindowText)
+        assert title.getRgb()[:3] == pystamps.SELECTED_COLOR
+        stamp.container.set_selected(False)
+        stamp.title.set_selected(False)
+        assert not stamp.container.selected
+        assert not stamp.title.selected
 
         with pytest.raises(RuntimeError):
             self.stamp2.display_selected()
 
     def test_display_not_selected(self):
         stamp = self.stamp1
-        stamp.container.setStyleSheet(pystamps.SELECTED)
-        stamp.title.setStyleSheet(pystamps.TITLE_SELECTED)
-        assert stamp.container.styleSheet() == pystamps.SELECTED
-        assert stamp.title.styleSheet() == pystamps.TITLE_SELECTED
+        stamp.container.set_selected(True)
+        stamp.title.set_selected(True)
+        assert stamp.container.selected
+        assert stamp.title.selected
         stamp.display_not_selected()
-        assert stamp.container.styleSheet() == pystamps.NOT_SELECTED
-        assert stamp.title.styleSheet() == pystamps.TITLE_NOT_SELECTED
+        assert not stamp.container.selected
+        assert not stamp.title.selected
+        border = stamp.container.grab().toImage()
+        assert QtGui.QColor(border.pixel(0, 0)).getRgb()[:3] == (
+            pystamps.NOT_SELECTED_COLOR)
+        title = stamp.title.palette().color(QtGui.QPalette.WindowText)
+        assert title.getRgb()[:3] == pystamps.NOT_SELECTED_COLOR
 
         with pytest.raises(RuntimeError):
             self.stamp2.display_not_selected()
@@ -92,14 +137,14 @@ class TestImageStamp(object):
         stamp = self.stamp1
         assert stamp.selected == stamp._selected
         assert not stamp.selected
-        assert stamp.container.styleSheet() == pystamps.NOT_SELECTED
-        assert stamp.title.styleSheet() == pystamps.TITLE_NOT_SELECTED
+        assert not stamp.container.selected
+        assert not stamp.title.selected
         stamp.selected = True
-        assert stamp.container.styleSheet() == pystamps.SELECTED
-        assert stamp.title.styleSheet() == pystamps.TITLE_SELECTED
+        assert stamp.container.selected
+        assert stamp.title.selected
         stamp.selected = False
-        assert stamp.container.styleSheet() == pystamps.NOT_SELECTED
-        assert stamp.title.styleSheet() == pystamps.TITLE_NOT_SELECTED
+        assert not stamp.container.selected
+        assert not stamp.title.selected
 
     def test_create_button(self):
         stamp = self.stamp1
@@ -107,7 +152,7 @@ class TestImageStamp(object):
         assert isinstance(stamp.button, pystamps.ImageButton)
         assert isinstance(stamp.container, QtWidgets.QLabel)
         assert stamp.container.parent() == stamp.button
-        assert stamp.container.styleSheet() == pystamps.NOT_SELECTED
+        assert not stamp.container.selected
 
         with pytest.raises(RuntimeError):
             self.stamp2._create_button()
@@ -116,7 +161,7 @@ class TestImageStamp(object):
         stamp = self.stamp1
         stamp._create_title()
         assert isinstance(stamp.title, QtWidgets.QLabel)
-        assert stamp.title.styleSheet() == pystamps.TITLE_NOT_SELECTED
+        assert not stamp.title.selected
         assert stamp.title.parent() == stamp.button
         assert stamp.title.font().family() == 'Helvetica'
         title_text = stamp.title.text()
@@ -136,6 +181,27 @@ class TestImageStamp(object):
         with pytest.raises(RuntimeError):
             self.stamp2._create_proxy_widget()
 
+    @pytest.mark.parametrize(
+        'backend', [pystamps.MATPLOTLIB, pystamps.QIMAGE, pystamps.ITEM])
+    def test_placeholder(self, backend):
+        stamp = pystamps.ImageStamp(
+            FILE_2, 0, 0, backend=backend, placeholder=True)
+        assert not stamp.loaded
+        assert stamp.pds_compatible
+        assert stamp._pds_file is None
+        assert stamp._thumbnail is None
+        assert isinstance(stamp.button, pystamps.BUTTONS[backend])
+        assert isinstance(stamp.proxy_widget, QtWidgets.QGraphicsItem)
+        stamp.load(StampData(True, (1, 2, 3), numpy.ones((2, 3))))
+        assert stamp.loaded
+        assert stamp.shape == (1, 2, 3)
+        assert (stamp.thumbnail == 1).all()
+
+        stamp = pystamps.ImageStamp(FILE_7, 0, 0, placeholder=True)
+        stamp.load(NOT_COMPATIBLE)
+        assert stamp.loaded
+        assert not stamp.pds_compatible
+
 
 class TestImageSet(object):
     image_set = pystamps.ImageSet(TEST_DIR)
@@ -155,6 +221,130 @@ class TestImageSet(object):
         assert self.image_set.images[4].row == 1
         assert self.image_set.images[4].column == 0
 
+    def test_init_workers(self, tmpdir):
+        cache = ThumbnailCache(str(tmpdir))
+        image_set = pystamps.ImageSet(
+            TEST_DIR + TEST_DIR[::-1], cache=cache, workers=2)
+        assert image_set.images[0].file_name == FILE_1
+        assert [image.file_name for image in image_set.images] == [
+            image.file_name for image in self.image_set.images]
+        for image, expected in zip(image_set.images, self.image_set.images):
+            assert (image.row, image.column) == (expected.row, expected.column)
+            assert (image.thumbnail == expected.thumbnail).all()
+            assert image._pds_image is None
+        assert len(os.listdir(str(tmpdir))) == len(TEST_DIR)
+
+    def test_progressive(self, qtbot):
+        image_set = pystamps.ImageSet(TEST_DIR, progressive=True)
+        assert len(image_set.images) == len(TEST_DIR)
+        assert not any(image.loaded for image in image_set.images)
+        assert image_set.images[6].file_name == FILE_7
+        assert (image_set.images[6].row, image_set.images[6].column) == (1, 2)
+        assert image_set.loader.total == len(TEST_DIR)
+        image_set.set_image_selected(image_set.images[6])
+        with qtbot.waitSignal(image_set.loader.finished, timeout=10000):
+            image_set.loader.start()
+        assert [image.file_name for image in image_set.images] == [
+            image.file_name for image in self.image_set.images]
+        assert all(image.loaded for image in image_set.images)
+        assert image_set.selected_images == []
+        for image, expected in zip(image_set.images, self.image_set.images):
+            assert (image.row, image.column) == (expected.row, expected.column)
+            assert (image.thumbnail == expected.thumbnail).all()
+
+    def test_streaming(self, qtbot, monkeypatch):
+        monkeypatch.setattr(pystamps.ImageSetLoader, 'FIRST_CHUNK', 2)
+        found = []
+        image_set = pystamps.ImageSet(iter(TEST_DIR), progressive=True)
+        view = pystamps.ImageSetView(image_set)
+        qtbot.addWidget(view)
+        assert image_set.loader.streaming
+        assert image_set.loader.total == 0
+        assert image_set.images == []
+        image_set.loader.found.connect(found.append)
+        with qtbot.waitSignal(image_set.loader.finished, timeout=10000):
+            image_set.loader.start()
+        assert found == [TEST_DIR[:2], TEST_DIR[2:6], TEST_DIR[6:]]
+        assert image_set.loader.total == len(TEST_DIR)
+        assert [image.file_name for image in image_set.images] == [
+            image.file_name for image in self.image_set.images]
+        assert all(image.loaded for image in image_set.images)
+        scene_items = view.scene().items()
+        for image, expected in zip(image_set.images, self.image_set.images):
+            assert (image.row, image.column) == (expected.row, expected.column)
+            assert image.proxy_widget in scene_items
+            assert image.proxy_widget.pos() == QtCore.QPointF(
+                image.column * pystamps.CELL_SIZE,
+                image.row * pystamps.CELL_SIZE)
+
+    @pytest.mark.parametrize('streaming', [False, True])
+    def test_disk_order(self, qtbot, monkeypatch, streaming):
+        monkeypatch.setattr(pystamps.ImageSetLoader, 'FIRST_CHUNK', 2)
+        monkeypatch.setattr(
+            pystamps, 'read_order',
+            lambda names: list(reversed(range(len(names)))))
+        image_set = pystamps.ImageSet(
+            iter(TEST_DIR) if streaming else TEST_DIR, progressive=True,
+            disk_order=True)
+        # The files are only looked at in the loader thread
+        assert image_set.loader.scheduler.depth == 0
+        order = []
+        image_set.loader.loaded.connect(
+            lambda loaded: order.extend(index for index, _ in loaded))
+        with qtbot.waitSignal(image_set.loader.finished, timeout=10000):
+            image_set.loader.start()
+        if streaming:
+            # Each chunk is ordered as it is found
+            assert order == [1, 0, 5, 4, 3, 2, 6]
+        else:
+            assert order == list(reversed(range(len(TEST_DIR))))
+        assert [image.file_name for image in image_set.images] == [
+            image.file_name for image in self.image_set.images]
+        assert all(image.loaded for image in image_set.images)
+
+    @pytest.mark.parametrize('progressive', [False, True])
+    def test_records(self, monkeypatch, progressive):
+        records = core.precompute(TEST_DIR[:2], 20, workers=1)
+        opened = []
+        monkeypatch.setattr(
+            pystamps, 'prepare_stamps_data',
+            lambda files, *args, **kwargs: opened.extend(files) or iter(()))
+        image_set = pystamps.ImageSet(
+            TEST_DIR[:3], records=records, progressive=progressive)
+        assert [image.file_name for image in image_set.images] == (
+            TEST_DIR[:3])
+        assert image_set.images[1].loaded
+        assert (image_set.images[1].thumbnail == records[1].thumbnail).all()
+        if progressive:
+            assert [image.file_name for image in image_set._placeholders] == [
+                FILE_3]
+            assert image_set.loader.total == 1
+        else:
+            assert opened == [FILE_3]
+
+    def test_precomputed_cache(self, tmpdir, monkeypatch):
+        cache = ThumbnailCache(str(tmpdir))
+        core.precompute(TEST_DIR[:2], pystamps.thumbnail_size(), cache=cache)
+        # The GUI finds every thumbnail in the cache
+
+        def load_stamps_data(files, *args):
+            assert files == []
+            return
+            yield
+
+        monkeypatch.setattr(
+            'pystamps.loader.load_stamps_data', load_stamps_data)
+        image_set = pystamps.ImageSet(TEST_DIR[:2], cache=cache)
+        assert all(image.loaded for image in image_set.images)
+
+    def test_load_images(self):
+        image_set = pystamps.ImageSet(TEST_DIR[:3], progressive=True)
+        image_set.load_images([(1, NOT_COMPATIBLE)])
+        assert [image.file_name for image in image_set.images] == [
+            FILE_1, FILE_3]
+        assert (image_set.images[1].row, image_set.images[1].column) == (0, 1)
+        assert not image_set.images[1].loaded
+
     def test_set_image_selected(self):
         assert not self.image_set.images[0].selected
         assert not self.image_set.images[1].selected
@@ -190,6 +380,131 @@ class TestImageSet(object):
         assert not self.image_set.images[1].selected
         assert len(self.image_set.selected_images) == 0
 
+    def test_bulk_selection(self, products):
+        image_set = pystamps.ImageSet(products)
+        images = image_set.images
+        image_set.set_image_selected(images[3])
+        image_set.select_all()
+        assert all(image.selected for image in images)
+        assert image_set.selected_images == images[3:4] + images[:3] + [
+            images[4]]
+        assert images[0].container.selected
+        image_set.unselect_all()
+        assert not any(image.selected for image in images)
+        assert image_set.selected_images == []
+        assert not images[0].container.selected
+
+        image_set.select_range(images[3], images[1])
+        assert image_set.selected_images == images[1:4]
+        removed = pystamps.ImageStamp(FILE_1, 0, 0)
+        with pytest.raises(ValueError):
+            image_set.select_range(images[3], removed)
+        assert image_set.selected_images == images[1:4]
+        image_set.invert_selection()
+        assert image_set.selected_images == [images[0], images[4]]
+        assert [image.selected for image in images] == [
+            True, False, False, False, True]
+
+        image_set.unselect_all()
+        image_set.select_where(lambda image: image.shape[0] == 3)
+        assert image_set.selected_images == [images[3]]
+
+        image_set.remove_images(image_set.selected_images)
+        assert image_set.selected_images == []
+
+    def test_bulk_selection_repaint(self, tmpdir, qtbot):
+        files = []
+        for number in range(200):
+            path = str(tmpdir.join('synthetic%03d.img' % number))
+            write_image(path, image_data())
+            files.append(path)
+        image_set = pystamps.ImageSet(files, backend=pystamps.QIMAGE)
+        view = pystamps.ImageSetView(image_set)
+        qtbot.addWidget(view)
+        view.show()
+        qtbot.waitExposed(view)
+        qtbot.wait(50)
+        paints = []
+        style_changes = []
+
+        class Recorder(QtCore.QObject):
+            def eventFilter(self, watched, event):
+                if event.type() == QtCore.QEvent.Paint:
+                    paints.append(watched)
+                elif event.type() == QtCore.QEvent.StyleChange:
+                    style_changes.append(watched)
+                return False
+
+        recorder = Recorder()
+        view.viewport().installEventFilter(recorder)
+        for image in image_set.images:
+            image.container.installEventFilter(recorder)
+            image.title.installEventFilter(recorder)
+        image_set.select_all()
+        qtbot.wait(50)
+        # No stamp is styled again and the view is painted once
+        assert style_changes == []
+        assert paints.count(view.viewport()) == 1
+        assert all(image.container.selected for image in image_set.images)
+
+    def test_arrays(self, products):
+        image_set = pystamps.ImageSet(products)
+        images = image_set.images
+        assert not hasattr(images[0], '__dict__')
+        assert [image.index for image in images] == list(range(5))
+        assert image_set.rows.tolist() == [0, 0, 0, 0, 1]
+        assert image_set.cols.tolist() == [0, 1, 2, 3, 0]
+        assert image_set.shapes.tolist() == [
+            list(image.shape) for image in images]
+
+        image_set.select_mask(image_set.shapes[:, 0] == 3)
+        assert image_set.selected_images == [images[3]]
+        assert image_set.selected_mask.tolist() == [
+            False, False, False, True, False]
+        image_set.select_mask(image_set.shapes[:, 0] == 3, False)
+        assert image_set.selected_images == []
+        assert not image_set.selected_mask.any()
+
+        image_set.set_image_selected(images[4])
+        removed = images[1]
+        image_set.remove_images([removed])
+        assert removed.index is None
+        assert [image.index for image in images] == list(range(4))
+        assert image_set.selected_mask.tolist() == [False, False, False, True]
+        assert image_set.shapes.tolist() == [
+            list(image.shape) for image in images]
+        assert image_set.rows.tolist() == [0, 0, 0, 0]
+        assert image_set.cols.tolist() == [0, 1, 2, 3]
+
+    def test_arrays_progressive(self):
+        image_set = pystamps.ImageSet(TEST_DIR[:3], progressive=True)
+        assert image_set.shapes.tolist() == [[0, 0, 0]] * 3
+        data = StampData(True, (1, 2, 3), numpy.ones((2, 3)))
+        image_set.load_images([(1, data), (0, NOT_COMPATIBLE)])
+        assert image_set.shapes.tolist() == [[1, 2, 3], [0, 0, 0]]
+        assert image_set.cols.tolist() == [0, 1]
+
+    @pytest.mark.parametrize(
+        'backend', [pystamps.MATPLOTLIB, pystamps.QIMAGE, pystamps.ITEM])
+    def test_stretch_batched(self, monkeypatch, backend):
+        batches = []
+        stretch_thumbnails = pystamps.ImageStamp.stretch_thumbnails.__func__
+
+        def record(cls, thumbnails):
+            batches.append(len(thumbnails))
+            return stretch_thumbnails(cls, thumbnails)
+        monkeypatch.setattr(
+            pystamps.ImageStamp, 'stretch_thumbnails', classmethod(record))
+        monkeypatch.setattr(
+            pystamps.ImageStamp, 'stretched', lambda self: pytest.fail())
+        image_set = pystamps.ImageSet(TEST_DIR, backend=backend, workers=1)
+        assert batches == [len(image_set.images)]
+        image_set = pystamps.ImageSet(
+            TEST_DIR[:3], backend=backend, progressive=True)
+        data = StampData(True, (1, 2, 3), numpy.ones((2, 3)))
+        image_set.load_images([(1, data), (0, NOT_COMPATIBLE), (2, data)])
+        assert batches[1:] == [2]
+
     @pytest.mark.parametrize(
         "columns, expected_positions",
         [
@@ -206,6 +521,144 @@ class TestImageSet(object):
             assert (image.row, image.column) == pos
 
 
+def test_profile(tmpdir, capsys):
+    profiling.enable()
+    try:
+        image_set = pystamps.ImageSet(TEST_DIR[:2], workers=1)
+        window = pystamps.MainWindow(image_set)
+        window.set_view.controller.wrap_images(1)
+        window.close()
+    finally:
+        profiler = profiling.disable()
+    stages = set(profiler.summary())
+    assert set(['probe', 'read', 'decimate', 'widgets', 'draw', 'layout']) <= (
+        stages)
+    trace = str(tmpdir.join('trace.json'))
+    pystamps.report_profile(profiler, trace)
+    assert 'widgets' in capsys.readouterr().out
+    assert os.path.exists(trace)
+
+
+class TestImageSetWatcher(object):
+
+    @pytest.fixture
+    def watched(self, tmpdir, qtbot):
+        for number, bands in enumerate([1, 1, 3]):
+            write_image(
+                str(tmpdir.join('synthetic%d.img' % number)),
+                image_data((bands, 20, 30)))
+        directory = str(tmpdir)
+        image_set = pystamps.ImageSet(
+            sorted(core.discover(directory)), progressive=True)
+        view = pystamps.ImageSetView(image_set)
+        qtbot.addWidget(view)
+        with qtbot.waitSignal(image_set.loader.finished, timeout=10000):
+            image_set.loader.start()
+        watcher = pystamps.ImageSetWatcher(
+            image_set, directory, poll_interval=0)
+        yield tmpdir, image_set, watcher
+        watcher.stop()
+
+    def test_init(self, watched):
+        tmpdir, image_set, watcher = watched
+        assert watcher.watcher.directories() == [str(tmpdir)]
+        assert sorted(watcher._seen) == [
+            image.file_name for image in image_set.images]
+        assert watcher.apply(
+            [(name, core.file_signature(name)) for name in watcher._seen]
+        ) == ([], [], [])
+
+    def test_loader_started_first(self, tmpdir, qtbot):
+        for number in range(2):
+            write_image(
+                str(tmpdir.join('synthetic%d.img' % number)), image_data())
+        directory = str(tmpdir)
+        image_set = pystamps.ImageSet(
+            core.discover(directory), progressive=True)
+        image_set.loader.start()
+        # The files are found before the watcher is connected
+        image_set.loader.wait()
+        watcher = pystamps.ImageSetWatcher(
+            image_set, directory, poll_interval=0)
+        qtbot.waitUntil(
+            lambda: len(image_set.images) == 2 and
+            all(image.loaded for image in image_set.images), timeout=10000)
+        files = [
+            (name, core.file_signature(name))
+            for name in sorted(core.discover(directory))]
+        assert watcher.apply(files) == ([], [], [])
+        assert all(image.loaded for image in image_set.images)
+        watcher.stop()
+
+    def test_on_demand(self, tmpdir, qtbot):
+        for number in range(2):
+            write_image(
+                str(tmpdir.join('synthetic%d.img' % number)), image_data())
+        directory = str(tmpdir)
+        image_set = pystamps.ImageSet(
+            core.discover(directory), progressive=True, on_demand=True)
+        view = pystamps.ImageSetView(image_set)
+        qtbot.addWidget(view)
+        view.show()
+        watcher = pystamps.ImageSetWatcher(
+            image_set, directory, poll_interval=0)
+        with qtbot.waitSignal(image_set.loader.discovered, timeout=10000):
+            image_set.loader.start()
+        write_image(str(tmpdir.join('synthetic2.img')), image_data())
+
+        # The loader waits for stamps to come into sight until stopped
+        with qtbot.waitSignal(watcher.updated, timeout=10000) as blocker:
+            watcher.rescan()
+        assert image_set.loader.isRunning()
+        assert blocker.args == [[str(tmpdir.join('synthetic2.img'))], [], []]
+        qtbot.waitUntil(lambda: not watcher._loaders, timeout=10000)
+        assert len(image_set.images) == 3
+        assert image_set.images[2].loaded
+        watcher.stop()
+        image_set.loader.stop()
+
+    def test_apply(self, watched, qtbot):
+        tmpdir, image_set, watcher = watched
+        watcher.workers = 4
+        first, second, third = image_set.images
+        image_set.set_image_selected(first)
+        image_set.set_image_selected(third)
+        widgets = third.proxy_widget
+
+        write_image(str(tmpdir.join('synthetic3.img')), image_data())
+        tmpdir.join('notes.txt').write('Not a PDS product\n')
+        tmpdir.join('synthetic0.img').remove()
+        write_image(second.file_name, image_data((1, 40, 30)))
+        os.utime(second.file_name, (1, 1))
+        expected = pystamps.ImageStamp(second.file_name, 0, 0).thumbnail
+
+        with qtbot.waitSignal(watcher.updated, timeout=10000) as blocker:
+            watcher.rescan()
+        added, changed, removed = blocker.args
+        # Too few files to start worker processes for
+        assert [loader.workers for loader in watcher._loaders] == [1]
+        assert sorted(added) == [
+            str(tmpdir.join('notes.txt')), str(tmpdir.join('synthetic3.img'))]
+        assert changed == [second.file_name]
+        assert removed == [first.file_name]
+        qtbot.waitUntil(lambda: not watcher._loaders, timeout=10000)
+
+        assert [image.file_name for image in image_set.images] == [
+            second.file_name, third.file_name,
+            str(tmpdir.join('synthetic3.img'))]
+        assert image_set.selected_images == [third]
+        assert third.proxy_widget is widgets
+        assert second.loaded
+        assert (second.thumbnail == expected).all()
+        assert all(image.loaded for image in image_set.images)
+        assert (image_set.images[2].row, image_set.images[2].column) == (
+            0, 2)
+        # Nothing changed since
+        assert watcher.apply(
+            [(name, core.file_signature(name)) for name in watcher._seen]
+        ) == ([], [], [])
+
+
 class TestImageSetController(object):
     image_set = pystamps.ImageSet(TEST_DIR)
     controller = pystamps.ImageSetController(image_set, None)
@@ -291,6 +744,154 @@ class TestImageButton(object):
         assert self.__mouse_press_cought
 
 
+class TestPixmapButton(object):
+    stamp = pystamps.ImageStamp(FILE_2, 0, 1, backend=pystamps.QIMAGE)
+    button = pystamps.PixmapButton(stamp)
+    __mouse_press_cought = False
+
+    def test_init(self):
+        assert isinstance(self.stamp.button, pystamps.PixmapButton)
+        assert self.button.parentWidget() is None
+        assert self.button.image_stamp == self.stamp
+        size = QtCore.QSize(int(pystamps.PSIZE), int(pystamps.PSIZE))
+        assert self.button.size() == size
+        assert max(
+            self.button.pixmap.width(),
+            self.button.pixmap.height()) == int(pystamps.PSIZE)
+
+    def test_paintEvent(self, qtbot):
+        qtbot.addWidget(self.button)
+        image = self.button.grab().toImage()
+        assert image.width() == int(pystamps.PSIZE)
+        colors = set(
+            image.pixel(x, image.height() // 2)
+            for x in range(image.width()))
+        assert len(colors) > 1
+
+    def check_catch_button_press(self, image_stamp):
+        assert image_stamp == self.stamp
+        self.__mouse_press_cought = True
+
+    def test_mouseReleaseEvent(self, qtbot):
+        self.__mouse_press_cought = False
+        qtbot.addWidget(self.button)
+        self.button.clicked.connect(self.check_catch_button_press)
+        qtbot.mouseClick(self.button, QtCore.Qt.LeftButton)
+        assert self.__mouse_press_cought
+
+
+def click_item(qtbot, view, item):
+    """Click the middle of a graphics item shown in view"""
+    center = item.mapToScene(item.boundingRect().center())
+    qtbot.mouseClick(
+        view.viewport(), QtCore.Qt.LeftButton, pos=view.mapFromScene(center))
+
+
+def paint_item(item):
+    """Paint a graphics item into an image the size of the stamp"""
+    size = int(pystamps.PSIZE)
+    image = QtGui.QImage(size, size, QtGui.QImage.Format_RGB32)
+    painter = QtGui.QPainter(image)
+    item.paint(painter, QtWidgets.QStyleOptionGraphicsItem())
+    painter.end()
+    return image
+
+
+class TestStampItem(object):
+
+    def test_init(self):
+        stamp = pystamps.ImageStamp(FILE_2, 0, 1, backend=pystamps.ITEM)
+        item = stamp.button
+        assert isinstance(item, pystamps.StampItem)
+        assert stamp.proxy_widget is item
+        assert stamp.container is None
+        assert stamp.title is None
+        assert item.image_stamp is stamp
+        assert item.boundingRect() == QtCore.QRectF(
+            0, 0, pystamps.PSIZE, pystamps.PSIZE)
+        cache_mode = QtWidgets.QGraphicsItem.DeviceCoordinateCache
+        assert item.cacheMode() == cache_mode
+        assert max(item.pixmap.width(), item.pixmap.height()) == int(
+            pystamps.PSIZE)
+        metrics = QtGui.QFontMetrics(item.title_font)
+        assert metrics.boundingRect(stamp.basename).width() <= pystamps.PSIZE
+
+    def test_paint(self):
+        stamp = pystamps.ImageStamp(FILE_2, 0, 1, backend=pystamps.ITEM)
+        item = stamp.button
+        border = int(pystamps.PSIZE) - 1
+        image = paint_item(item)
+        middle = image.height() // 2
+        assert QtGui.QColor(image.pixel(0, border)).getRgb()[:3] == (
+            pystamps.NOT_SELECTED_COLOR)
+        assert len(set(
+            image.pixel(x, middle) for x in range(image.width()))) > 1
+        stamp.selected = True
+        image = paint_item(item)
+        assert QtGui.QColor(image.pixel(0, border)).getRgb()[:3] == (
+            pystamps.SELECTED_COLOR)
+        item.clear()
+        assert item.pixmap.isNull()
+
+    def test_select(self, qtbot):
+        image_set = pystamps.ImageSet(TEST_DIR, backend=pystamps.ITEM)
+        view = pystamps.ImageSetView(image_set)
+        qtbot.addWidget(view)
+        view.resize(int(5 * pystamps.CELL_SIZE), int(3 * pystamps.CELL_SIZE))
+        view.show()
+        items = [
+            item for item in view.scene().items()
+            if isinstance(item, pystamps.StampItem)]
+        assert len(items) == len(image_set.images)
+        image1, image2 = image_set.images[:2]
+        click_item(qtbot, view, image2.button)
+        assert image_set.selected_images == [image2]
+        click_item(qtbot, view, image1.button)
+        assert image_set.selected_images == [image2, image1]
+        click_item(qtbot, view, image2.button)
+        assert image_set.selected_images == [image1]
+        image_set.remove_images([image1])
+        assert image1.proxy_widget.scene() is None
+        assert image2.proxy_widget.pos() == QtCore.QPointF(0, 0)
+
+    def test_atlas(self, qtbot, monkeypatch):
+        atlas = ThumbnailAtlas(pystamps.PSIZE)
+        monkeypatch.setattr(pystamps.StampItem, 'atlas', atlas)
+        files = ['stamp%d.img' % n for n in range(200)]
+        image_set = pystamps.ImageSet(
+            files, backend=pystamps.ITEM, progressive=True)
+        item = image_set.images[0].button
+        assert item.cacheMode() == QtWidgets.QGraphicsItem.NoCache
+        data = StampData(True, (1, 20, 30), numpy.ones((20, 30)))
+        image_set.load_images([(index, data) for index in range(len(files))])
+        assert len(atlas) == 0
+        view = pystamps.ImageSetView(image_set)
+        qtbot.addWidget(view)
+        view.resize(int(5 * pystamps.CELL_SIZE), int(3 * pystamps.CELL_SIZE))
+        view.show()
+        view.viewport().grab()
+        # Only the stamps that were painted are packed
+        packed = atlas.keys()
+        assert item in packed
+        assert 0 < len(packed) < 40
+        assert atlas.size(item)[0] == int(pystamps.PSIZE)
+        image = paint_item(item)
+        middle = image.height() // 2
+        assert QtGui.QColor(image.pixel(middle, middle)).red() == 0
+
+        bar = view.verticalScrollBar()
+        bar.setValue(bar.maximum())
+        view.viewport().grab()
+        assert item not in atlas
+        assert image_set.images[-1].button in atlas
+        assert len(atlas) < 40 + len(packed)
+        bar.setValue(0)
+        view.viewport().grab()
+        assert item in atlas
+        item.clear()
+        assert item not in atlas
+
+
 class TestImageSetView(object):
     image_set = pystamps.ImageSet(TEST_DIR)
     view = pystamps.ImageSetView(image_set)
@@ -301,12 +902,10 @@ class TestImageSetView(object):
         assert isinstance(self.view.controller, pystamps.ImageSetController)
         assert self.view.images == self.image_set.images
         # assert isinstance(self.view.scene, QtWidgets.QGraphicsScene)
-        assert isinstance(self.view.grid, QtWidgets.QGraphicsGridLayout)
-        assert self.view.grid.maximumWidth() == pystamps.PSIZE
-        assert isinstance(
-            self.view.layout_container, QtWidgets.QGraphicsWidget)
-        assert self.view.layout_container.layout() == self.view.grid
-        assert self.view.layout_container in self.view.scene().items()
+        for image in self.image_set.images:
+            assert image.proxy_widget in self.view.scene().items()
+        assert self.view.sceneRect() == QtCore.QRectF(
+            0, 0, 4 * pystamps.CELL_SIZE, 2 * pystamps.CELL_SIZE)
         assert self.view.backgroundBrush() == QtCore.Qt.black
 
     def test_select_image(self, qtbot):
@@ -314,54 +913,124 @@ class TestImageSetView(object):
         qtbot.addWidget(self.view)
         image1 = self.image_set.images[0]
         assert not image1.selected
-        assert image1.container.styleSheet() == pystamps.NOT_SELECTED
-        assert image1.title.styleSheet() == pystamps.TITLE_NOT_SELECTED
+        assert not image1.container.selected
+        assert not image1.title.selected
         qtbot.mouseClick(image1.button, QtCore.Qt.LeftButton)
         assert image1.selected
-        assert image1.container.styleSheet() == pystamps.SELECTED
-        assert image1.title.styleSheet() == pystamps.TITLE_SELECTED
+        assert image1.container.selected
+        assert image1.title.selected
         qtbot.mouseClick(image1.button, QtCore.Qt.LeftButton)
         assert not image1.selected
-        assert image1.container.styleSheet() == pystamps.NOT_SELECTED
-        assert image1.title.styleSheet() == pystamps.TITLE_NOT_SELECTED
+        assert not image1.container.selected
+        assert not image1.title.selected
         image5 = self.image_set.images[4]
         assert not image5.selected
-        assert image5.container.styleSheet() == pystamps.NOT_SELECTED
-        assert image5.title.styleSheet() == pystamps.TITLE_NOT_SELECTED
+        assert not image5.container.selected
+        assert not image5.title.selected
         qtbot.mouseClick(image5.button, QtCore.Qt.LeftButton)
         assert image5.selected
-        assert image5.container.styleSheet() == pystamps.SELECTED
-        assert image5.title.styleSheet() == pystamps.TITLE_SELECTED
+        assert image5.container.selected
+        assert image5.title.selected
         assert not image1.selected
-        assert image1.container.styleSheet() == pystamps.NOT_SELECTED
-        assert image1.title.styleSheet() == pystamps.TITLE_NOT_SELECTED
+        assert not image1.container.selected
+        assert not image1.title.selected
         qtbot.mouseClick(image1.button, QtCore.Qt.LeftButton)
         assert image5.selected
-        assert image5.container.styleSheet() == pystamps.SELECTED
-        assert image5.title.styleSheet() == pystamps.TITLE_SELECTED
+        assert image5.container.selected
+        assert image5.title.selected
         assert image1.selected
-        assert image1.container.styleSheet() == pystamps.SELECTED
-        assert image1.title.styleSheet() == pystamps.TITLE_SELECTED
+        assert image1.container.selected
+        assert image1.title.selected
         qtbot.mouseClick(image5.button, QtCore.Qt.LeftButton)
         assert not image5.selected
-        assert image5.container.styleSheet() == pystamps.NOT_SELECTED
-        assert image5.title.styleSheet() == pystamps.TITLE_NOT_SELECTED
+        assert not image5.container.selected
+        assert not image5.title.selected
         assert image1.selected
-        assert image1.container.styleSheet() == pystamps.SELECTED
-        assert image1.title.styleSheet() == pystamps.TITLE_SELECTED
+        assert image1.container.selected
+        assert image1.title.selected
         qtbot.mouseClick(image1.button, QtCore.Qt.LeftButton)
         assert not image5.selected
-        assert image5.container.styleSheet() == pystamps.NOT_SELECTED
-        assert image5.title.styleSheet() == pystamps.TITLE_NOT_SELECTED
+        assert not image5.container.selected
+        assert not image5.title.selected
         assert not image1.selected
-        assert image1.container.styleSheet() == pystamps.NOT_SELECTED
-        assert image1.title.styleSheet() == pystamps.TITLE_NOT_SELECTED
+        assert not image1.container.selected
+        assert not image1.title.selected
+
+    def test_remove_images(self):
+        image_set = pystamps.ImageSet(TEST_DIR[:3])
+        view = pystamps.ImageSetView(image_set)
+        removed = image_set.images[1]
+        image_set.remove_images([removed])
+        assert removed.proxy_widget.scene() is None
+        assert view.images == image_set.images
+        assert image_set.images[1].proxy_widget.pos() == QtCore.QPointF(
+            pystamps.CELL_SIZE, 0)
+
+    @pytest.mark.parametrize(
+        'backend', [pystamps.MATPLOTLIB, pystamps.QIMAGE, pystamps.ITEM])
+    def test_virtual(self, qtbot, backend):
+        files = ['stamp%d.img' % n for n in range(400)]
+        image_set = pystamps.ImageSet(
+            files, backend=backend, progressive=True, virtual=True)
+        assert all(image.button is None for image in image_set.images)
+        view = pystamps.ImageSetView(image_set)
+        qtbot.addWidget(view)
+        view.resize(int(5 * pystamps.CELL_SIZE), int(3 * pystamps.CELL_SIZE))
+        view.show()
+        assert view.sceneRect().height() == 100 * pystamps.CELL_SIZE
+
+        def shown():
+            return [
+                index for index, image in enumerate(image_set.images)
+                if image.proxy_widget is not None]
+        first_shown = shown()
+        assert first_shown[0] == 0
+        assert len(first_shown) < 40
+        image = image_set.images[5]
+        assert image.proxy_widget.pos() == QtCore.QPointF(
+            pystamps.CELL_SIZE, pystamps.CELL_SIZE)
+        image.load(StampData(True, (1, 2, 3), numpy.ones((2, 3))))
+        image_set.set_image_selected(image)
+        assert image.selected
+
+        # Scrolling to the end hands the same widgets to the last rows
+        widgets = set(image.proxy_widget for image in image_set.images)
+        view.verticalScrollBar().setValue(view.verticalScrollBar().maximum())
+        assert shown()[-1] == len(files) - 1
+        assert len(shown()) == len(first_shown)
+        assert set(
+            image.proxy_widget for image in image_set.images) == widgets
+        assert image.button is None
+        assert image.selected
+        last = image_set.images[-1]
+        assert last.button.image_stamp is last
+        if backend == pystamps.ITEM:
+            assert last.title is None
+            click_item(qtbot, view, last.button)
+        else:
+            assert last.title.text() == 'stamp399.img'
+            assert not last.container.selected
+            qtbot.mouseClick(last.button, QtCore.Qt.LeftButton)
+        assert last in image_set.selected_images
+
+        view.verticalScrollBar().setValue(0)
+        assert image.button.image_stamp is image
+        if backend != pystamps.ITEM:
+            assert image.container.selected
+
+        image_set.load_images([(0, NOT_COMPATIBLE)])
+        assert image_set.images[0].file_name == 'stamp1.img'
+        assert image_set.images[0].proxy_widget.pos() == QtCore.QPointF(0, 0)
+        view.controller.wrap_images(2)
+        assert view.sceneRect().width() == 2 * pystamps.CELL_SIZE
+        assert shown()[-1] < 20
 
     def test_set_grid_layout(self):
         def check_grid(positions):
             for pos, image in zip(positions, self.image_set.images):
                 row, col = pos
-                assert self.view.grid.itemAt(row, col) == image.proxy_widget
+                assert image.proxy_widget.pos() == QtCore.QPointF(
+                    col * pystamps.CELL_SIZE, row * pystamps.CELL_SIZE)
         check_grid([(0, 0), (0, 1), (0, 2), (0, 3), (1, 0)])
         # wrap_images will eventually call set_grid_layout
         self.view.controller.wrap_images(3)
@@ -375,6 +1044,126 @@ class TestImageSetView(object):
         self.view.controller.wrap_images(4)
         check_grid([(0, 0), (0, 1), (0, 2), (0, 3), (1, 0)])
 
+    def test_move_images(self, monkeypatch):
+        moved = []
+        monkeypatch.setattr(
+            self.view, 'move_images', lambda images: moved.extend(images))
+        self.image_set.set_images_positions()
+        assert moved == []
+        self.view.controller.wrap_images(3)
+        assert moved == self.image_set.images[3:]
+        self.view.controller.wrap_images(4)
+
+    def test_on_demand(self, qtbot, tmpdir):
+        files = []
+        for number in range(60):
+            path = str(tmpdir.join('stamp%02d.img' % number))
+            shutil.copy(FILE_2, path)
+            files.append(path)
+        image_set = pystamps.ImageSet(
+            files, progressive=True, virtual=True, on_demand=True)
+        scheduler = image_set.loader.scheduler
+        assert scheduler.stats()['waiting'] == len(files)
+        view = pystamps.ImageSetView(image_set)
+        qtbot.addWidget(view)
+        view.resize(int(5 * pystamps.CELL_SIZE), int(3 * pystamps.CELL_SIZE))
+        view.show()
+        first, last = view.visible_rows()
+        rows = last - first + 1
+        # The rows in sight and a screenful below them are queued
+        queued = scheduler.stats()['queued']
+        assert queued == 2 * rows * image_set.columns
+        assert scheduler.take(1) == [0]
+
+        bar = view.verticalScrollBar()
+        bar.setValue(bar.maximum())
+        assert scheduler.cancelled >= queued - 1
+        first, _ = view.visible_rows()
+        assert scheduler.take(100) == list(
+            range(first * image_set.columns, len(files)))
+        # Scrolling up, the screenful above is next
+        bar.setValue(bar.value() - int(pystamps.CELL_SIZE))
+        first, last = view.visible_rows()
+        rows = last - first + 1
+        jobs = scheduler.take(100)
+        assert jobs[0] == first * image_set.columns
+        assert min(jobs) == (first - rows) * image_set.columns
+        bar.setValue(0)
+
+        with qtbot.waitSignal(image_set.loader.loaded, timeout=10000):
+            image_set.loader.start()
+        image_set.loader.stop()
+        assert image_set.images[1].loaded
+        assert not image_set.images[-1].loaded
+        assert scheduler.completed < len(files)
+
+    def test_on_demand_widgets(self, qtbot, tmpdir):
+        files = []
+        for number in range(60):
+            path = str(tmpdir.join('stamp%02d.img' % number))
+            write_image(path, image_data())
+            files.append(path)
+        image_set = pystamps.ImageSet(
+            iter(files), progressive=True, on_demand=True)
+        scheduler = image_set.loader.scheduler
+        view = pystamps.ImageSetView(image_set)
+        qtbot.addWidget(view)
+        # The viewport is not resized when the stamps overflow it
+        view.setVerticalScrollBarPolicy(QtCore.Qt.ScrollBarAlwaysOn)
+        view.resize(int(5 * pystamps.CELL_SIZE), int(3 * pystamps.CELL_SIZE))
+        view.show()
+        first, last = view.visible_rows()
+        # The stamps added as the files are found are queued once in sight
+        # or a screenful below, without scrolling
+        expected = 2 * (last - first + 1) * image_set.columns
+        image_set.loader.start()
+        qtbot.waitUntil(
+            lambda: scheduler.stats()['completed'] == expected,
+            timeout=10000)
+        image_set.loader.stop()
+        assert len(image_set.images) == len(files)
+        assert all(image.loaded for image in image_set.images[:expected])
+        assert not any(image.loaded for image in image_set.images[expected:])
+        assert scheduler.stats()['waiting'] == len(files) - expected
+
+    def test_prefetch(self, qtbot, tmpdir, monkeypatch):
+        files = []
+        for number in range(80):
+            path = str(tmpdir.join('stamp%02d.img' % number))
+            shutil.copy(FILE_2, path)
+            files.append(path)
+        image_set = pystamps.ImageSet(
+            files, progressive=True, virtual=True, prefetch=2)
+        requests = []
+        monkeypatch.setattr(
+            image_set.prefetcher, 'request', requests.append)
+        view = pystamps.ImageSetView(image_set)
+        qtbot.addWidget(view)
+        view.resize(int(5 * pystamps.CELL_SIZE), int(3 * pystamps.CELL_SIZE))
+        view.show()
+        columns = image_set.columns
+        # The two rows past the screenful below the rows in sight
+        first, last = view.visible_rows()
+        start = (2 * last - first + 2) * columns
+        assert requests[-1] == files[start:start + 2 * columns]
+
+        # Scrolling up, the two rows past the screenful above, nearest first
+        bar = view.verticalScrollBar()
+        bar.setValue(bar.maximum())
+        bar.setValue(bar.value() - int(pystamps.CELL_SIZE))
+        first, last = view.visible_rows()
+        row = 2 * first - last - 2
+        assert requests[-1] == (
+            files[row * columns:(row + 1) * columns] +
+            files[(row - 1) * columns:row * columns])
+
+        # Loaded stamps are not read again
+        data = StampData(True, (1, 2, 3), numpy.ones((2, 3)))
+        image_set.load_images(
+            [(index, data) for index in range(row * columns)])
+        view.update_visible_stamps()
+        assert requests[-1] == files[row * columns:(row + 1) * columns]
+
 
 class TestMainWindow(object):
     image_set = pystamps.ImageSet(TEST_DIR)
@@ -388,6 +1177,47 @@ class TestMainWindow(object):
             return func(self, qtbot)
         return wrapper
 
+    def test_progress(self, qtbot):
+        assert self.window.progress_bar is None
+        image_set = pystamps.ImageSet(TEST_DIR, progressive=True)
+        window = pystamps.MainWindow(image_set)
+        qtbot.addWidget(window)
+        assert window.progress_bar.maximum() == len(TEST_DIR)
+        assert window.progress_bar.value() == 0
+        assert window.progress_action.isVisible()
+        with qtbot.waitSignal(image_set.loader.finished, timeout=10000):
+            image_set.loader.start()
+        assert window.progress_bar.value() == len(TEST_DIR)
+        assert not window.progress_action.isVisible()
+        window.close()
+        assert image_set.loader.isFinished()
+
+    def test_progress_streaming(self, qtbot):
+        image_set = pystamps.ImageSet(iter(TEST_DIR), progressive=True)
+        window = pystamps.MainWindow(image_set)
+        qtbot.addWidget(window)
+        assert window.progress_bar.maximum() == 0
+        with qtbot.waitSignal(image_set.loader.finished, timeout=10000):
+            image_set.loader.start()
+        assert window.progress_bar.maximum() == len(TEST_DIR)
+        assert window.progress_bar.value() == len(TEST_DIR)
+        window.close()
+
+    def test_progress_on_demand(self, qtbot):
+        image_set = pystamps.ImageSet(
+            iter(TEST_DIR), progressive=True, on_demand=True)
+        window = pystamps.MainWindow(image_set)
+        qtbot.addWidget(window)
+        assert window.progress_action.isVisible()
+        # Hidden once the files are found, the thread runs until stopped
+        with qtbot.waitSignal(image_set.loader.discovered, timeout=10000):
+            image_set.loader.start()
+        assert window.progress_bar.maximum() == len(TEST_DIR)
+        assert not window.progress_action.isVisible()
+        assert image_set.loader.isRunning()
+        window.close()
+        assert image_set.loader.isFinished()
+
     @add_window_wrapper
     def test_select_all(self, qtbot):
         def check_selected(expected_state, expected_length):
@@ -433,6 +1263,14 @@ class TestMainWindow(object):
 
     @add_window_wrapper
     def test_resizeEvent(self, qtbot):
+        def resize(width, height):
+            # Wrap right away instead of waiting for the timer
+            self.window.resize(width, height)
+            if self.window.wrap_timer.isActive():
+                self.window.wrap_timer.stop()
+                self.window.wrap_images()
+
+        resize(self.window.width(), self.window.height())
         default_width = self.window.width()
         images = self.window.images
         # Travis automatically resizes the window and then deletes the window
@@ -444,21 +1282,21 @@ class TestMainWindow(object):
             assert (images[0].row, images[0].column) == (0, 0)
             assert (images[4].row, images[4].column) == (1, 0)
             # Test items move to the right place after resizing window larger
-            self.window.resize(
+            resize(
                 default_width + default_width / 4, self.window.height())
             assert self.window.width() > default_width
             assert (images[0].row, images[0].column) == (0, 0)
             assert (images[4].row, images[4].column) == (0, 4)
-            self.window.resize(
+            resize(
                 self.window.width() + default_width / 4, self.window.height())
             assert (images[0].row, images[0].column) == (0, 0)
             assert (images[4].row, images[4].column) == (0, 4)
             # Test items move to right place after resizing window smaller
-            self.window.resize(
+            resize(
                 self.window.width() - default_width / 4, self.window.height())
             assert (images[0].row, images[0].column) == (0, 0)
             assert (images[4].row, images[4].column) == (0, 4)
-            self.window.resize(
+            resize(
                 self.window.width() - 3 * (default_width / 4),
                 self.window.height())
             assert (images[0].row, images[0].column) == (0, 0)
@@ -466,9 +1304,41 @@ class TestMainWindow(object):
             assert (images[2].row, images[2].column) == (1, 0)
             assert (images[3].row, images[3].column) == (1, 1)
             assert (images[4].row, images[4].column) == (2, 0)
-            self.window.resize(default_width, self.window.height())
+            resize(default_width, self.window.height())
             assert (images[0].row, images[0].column) == (0, 0)
             assert (images[1].row, images[1].column) == (0, 1)
             assert (images[2].row, images[2].column) == (0, 2)
             assert (images[3].row, images[3].column) == (0, 3)
             assert (images[4].row, images[4].column) == (1, 0)
+
+    def test_resizeEvent_coalesced(self, qtbot, monkeypatch):
+        window = pystamps.MainWindow(pystamps.ImageSet(TEST_DIR[:2]))
+        qtbot.addWidget(window)
+        qtbot.waitUntil(lambda: not window.wrap_timer.isActive())
+        columns = []
+        monkeypatch.setattr(
+            window.set_view.controller, 'wrap_images', columns.append)
+        width = window.width()
+        for step in range(10):
+            window.resize(width + 10 * step, window.height())
+        assert columns == []
+        qtbot.waitUntil(lambda: not window.wrap_timer.isActive())
+        assert columns == [int(window.width() / pystamps.CELL_SIZE)]
+
+    def test_wrap_images_cells(self, qtbot):
+        window = pystamps.MainWindow(pystamps.ImageSet(TEST_DIR[:2]))
+        qtbot.addWidget(window)
+        # Wide enough for five stamps but not for five cells with spacing
+        window.resize(int(5 * pystamps.PSIZE) + 1, window.height())
+        window.wrap_images()
+        assert window.image_set.columns == 4
+        assert window.image_set.columns * pystamps.CELL_SIZE <= window.width()
+
+
+def test_arg_parser():
+    with pytest.deprecated_call():
+        files = pystamps.arg_parser(os.path.join('tests', 'mission_data'))
+    assert sorted(files) == sorted(core.discover(
+        os.path.join('tests', 'mission_data'), prefilter=False))
+    with pytest.deprecated_call():
+        assert pystamps.arg_parser(FILE_2) == [FILE_2]
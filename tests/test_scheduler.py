@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import threading
+
+from pystamps.scheduler import DecodeScheduler
+
+
+def test_fifo():
+    scheduler = DecodeScheduler()
+    scheduler.submit(range(5))
+    assert scheduler.depth == 5
+    assert scheduler.take(2) == [0, 1]
+    scheduler.submit([7])
+    assert scheduler.take(10) == [2, 3, 4, 7]
+    assert scheduler.take(10) == []
+    scheduler.done(6)
+    assert scheduler.stats() == {
+        'queued': 0, 'waiting': 0, 'completed': 6, 'cancelled': 0}
+
+
+def test_update_view():
+    scheduler = DecodeScheduler()
+    scheduler.submit(range(10))
+    scheduler.update_view([6, 5], ahead=[8, 9])
+    assert scheduler.take(3) == [5, 6, 8]
+    # Jobs that leave the neighbourhood go back to the background
+    scheduler.update_view([2], ahead=[3])
+    assert scheduler.take(3) == [2, 3, 0]
+    assert scheduler.take(10) == [1, 4, 7, 9]
+    assert scheduler.cancelled == 0
+
+
+def test_submit_in_view():
+    scheduler = DecodeScheduler()
+    scheduler.submit([0, 1])
+    scheduler.update_view([3])
+    scheduler.submit([2, 3])
+    assert scheduler.take(10) == [3, 0, 1, 2]
+
+
+def test_on_demand():
+    scheduler = DecodeScheduler(on_demand=True)
+    scheduler.submit(range(10))
+    assert scheduler.take(10) == []
+    assert scheduler.stats()['waiting'] == 10
+    scheduler.update_view([0, 1], ahead=[2, 3])
+    assert scheduler.take(1) == [0]
+    # Queued jobs scrolled out of the neighbourhood are cancelled
+    scheduler.update_view([8, 9])
+    assert scheduler.cancelled == 3
+    assert scheduler.stats()['waiting'] == 7
+    assert scheduler.take(10) == [8, 9]
+    # And queued again when they come back
+    scheduler.update_view([2])
+    assert scheduler.take(10) == [2]
+
+
+def test_cancel():
+    scheduler = DecodeScheduler(on_demand=True)
+    scheduler.submit(range(4))
+    scheduler.update_view([0, 1])
+    scheduler.cancel([1, 3])
+    assert scheduler.cancelled == 1
+    assert scheduler.stats()['waiting'] == 1
+    scheduler.update_view([1, 3, 2])
+    assert scheduler.take(10) == [2]
+    assert scheduler.cancelled == 2
+
+
+def test_compact():
+    scheduler = DecodeScheduler()
+    scheduler.submit(range(5))
+    for _ in range(100):
+        scheduler.update_view([4])
+        scheduler.update_view([3])
+    assert len(scheduler._heap) < 100
+    assert scheduler.take(10) == [3, 0, 1, 2, 4]
+
+
+def test_wait():
+    scheduler = DecodeScheduler()
+    taken = []
+    thread = threading.Thread(
+        target=lambda: taken.append(scheduler.take(5, wait=True)))
+    thread.start()
+    scheduler.submit([1, 2])
+    thread.join(5)
+    assert taken == [[1, 2]]
+
+    thread = threading.Thread(
+        target=lambda: taken.append(scheduler.take(5, wait=True)))
+    thread.start()
+    scheduler.close()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert taken[-1] == []
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from pystamps.selection import Selection
+
+
+class TestSelection(object):
+
+    def test_init(self):
+        selection = Selection('cab')
+        assert selection.to_list() == ['c', 'a', 'b']
+        assert len(selection) == 3
+        assert 'a' in selection
+        assert 'd' not in selection
+        assert list(selection) == ['c', 'a', 'b']
+        assert len(Selection()) == 0
+
+    def test_add_discard(self):
+        selection = Selection()
+        selection.add('b')
+        selection.add('a')
+        selection.add('b')
+        assert selection.to_list() == ['b', 'a']
+        selection.discard('b')
+        selection.discard('z')
+        assert selection.to_list() == ['a']
+
+    def test_update(self):
+        selection = Selection('ab')
+        selection.update('bcd')
+        assert selection.to_list() == ['a', 'b', 'c', 'd']
+        selection.difference_update('ca')
+        assert selection.to_list() == ['b', 'd']
+        selection.clear()
+        assert selection.to_list() == []
+
+    def test_to_list_is_a_copy(self):
+        selection = Selection('ab')
+        items = selection.to_list()
+        items.append('c')
+        assert 'c' not in selection
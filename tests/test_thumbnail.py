@@ -0,0 +1,193 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import warnings
+
+import numpy
+import pytest
+
+from pystamps import thumbnail
+from pystamps.pdsfile import PDSFile
+
+from .helpers import write_image, image_data
+
+
+@pytest.mark.parametrize(
+    'shape, size, expected',
+    [
+        ((100, 100), 100, 1),
+        ((101, 100), 100, 2),
+        ((20000, 500), 150, 134),
+        ((10, 10, 3), 150, 1),
+    ])
+def test_decimation_factor(shape, size, expected):
+    assert thumbnail.decimation_factor(shape, size) == expected
+
+
+class TestDecimate(object):
+
+    def test_mean(self):
+        image = numpy.arange(16, dtype=numpy.float64).reshape((4, 4))
+        reduced = thumbnail.decimate(image, 2, thumbnail.MEAN)
+        expected = numpy.array([[2.5, 4.5], [10.5, 12.5]])
+        assert (reduced == expected).all()
+
+    def test_mean_ragged_edge(self):
+        image = numpy.arange(25, dtype=numpy.float64).reshape((5, 5))
+        reduced = thumbnail.decimate(image, 3, thumbnail.MEAN)
+        assert reduced.shape == (3, 3)
+        assert reduced[0, 0] == image[:2, :2].mean()
+        assert reduced[2, 2] == image[4, 4]
+        assert reduced[0, 2] == image[:2, 4].mean()
+
+    def test_mean_keeps_integer_dtype(self):
+        image = numpy.full((300, 200), 4000, dtype='>i2')
+        reduced = thumbnail.decimate(image, 150, thumbnail.MEAN)
+        assert reduced.dtype == image.dtype
+        assert reduced.shape == (150, 100)
+        assert (reduced == 4000).all()
+
+    def test_stride(self):
+        image = numpy.arange(16).reshape((4, 4))
+        reduced = thumbnail.decimate(image, 2, thumbnail.STRIDE)
+        assert (reduced == image[::2, ::2]).all()
+        assert not numpy.shares_memory(reduced, image)
+
+    @pytest.mark.parametrize('method', thumbnail.DECIMATION_METHODS)
+    def test_bands(self, method):
+        image = numpy.zeros((400, 300, 3), dtype=numpy.uint8)
+        image[..., 1] = 200
+        reduced = thumbnail.decimate(image, 100, method)
+        assert reduced.shape == (100, 75, 3)
+        assert (reduced[..., 0] == 0).all()
+        assert (reduced[..., 1] == 200).all()
+
+    @pytest.mark.parametrize('method', thumbnail.DECIMATION_METHODS)
+    def test_one_dimensional(self, method):
+        image = numpy.arange(1000)
+        reduced = thumbnail.decimate(image, 100, method)
+        assert reduced.shape == (100, 1)
+
+    def test_small_image_is_copied(self):
+        image = numpy.ones((10, 10))
+        reduced = thumbnail.decimate(image, 100)
+        assert (reduced == image).all()
+        assert not numpy.shares_memory(reduced, image)
+
+    @pytest.mark.parametrize('size', [100, 5])
+    def test_memmap_is_not_kept(self, tmpdir, size):
+        path = str(tmpdir.join('data'))
+        numpy.arange(100, dtype='>i2').reshape((10, 10)).tofile(path)
+        image = numpy.memmap(path, '>i2', 'r', shape=(10, 10))
+        for method in thumbnail.DECIMATION_METHODS:
+            reduced = thumbnail.decimate(image, size, method)
+            assert type(reduced) is numpy.ndarray
+
+    def test_unknown_method(self):
+        with pytest.raises(ValueError):
+            thumbnail.decimate(numpy.ones((10, 10)), 5, 'bicubic')
+
+
+@pytest.mark.parametrize('method', thumbnail.DECIMATION_METHODS)
+@pytest.mark.parametrize(
+    'shape', [(1, 200, 130), (3, 45, 90), (1, 1, 500), (1, 10, 10)])
+def test_read_thumbnail(tmpdir, method, shape):
+    path = str(tmpdir.join('image.img'))
+    write_image(path, image_data(shape))
+    pds_file = PDSFile(path)
+    expected = thumbnail.decimate(pds_file.open_image(), 20, method)
+    reduced = thumbnail.read_thumbnail(pds_file, 20, method)
+    assert type(reduced) is numpy.ndarray
+    assert reduced.flags['C_CONTIGUOUS']
+    assert reduced.shape == expected.shape
+    assert (reduced == expected).all()
+
+
+def test_thumbnail_ranges(tmpdir):
+    path = str(tmpdir.join('image.img'))
+    write_image(path, image_data((1, 200, 130)))
+    pds_file = PDSFile(path)
+    assert thumbnail.thumbnail_ranges(pds_file, 20, thumbnail.MEAN) == [
+        (pds_file.start_byte, pds_file.nbytes)]
+    # The stride only reads every 10th line
+    ranges = thumbnail.thumbnail_ranges(pds_file, 20, thumbnail.STRIDE)
+    assert ranges == pds_file.byte_ranges(10)
+    assert len(ranges) == 20
+
+
+class TestStretch(object):
+
+    def test_gray(self):
+        scaled = thumbnail.stretch(
+            numpy.array([[10, 20], [30, 40]], '>i2'), clip=0)
+        assert scaled.dtype == numpy.uint8
+        assert (scaled == [[0, 85], [170, 255]]).all()
+
+    def test_flat(self):
+        scaled = thumbnail.stretch(numpy.full((3, 3), 7.))
+        assert (scaled == 0).all()
+
+    def test_clip(self):
+        # A hot pixel saturates instead of darkening everything else
+        image = numpy.arange(100, dtype=numpy.float32).reshape(10, 10)
+        image[0, 0] = 1e6
+        scaled = thumbnail.stretch(image, clip=2)
+        assert scaled[0, 0] == 255
+        assert scaled[9, 9] == 255
+        assert 120 < scaled[5, 0] < 135
+
+    def test_mask_special(self):
+        image = numpy.array([[-32768, 10], [20, 30]], '>i2')
+        scaled = thumbnail.stretch(image, clip=0)
+        assert scaled.tolist() == [[0, 0], [128, 255]]
+        scaled = thumbnail.stretch(image, clip=0, mask_special=False)
+        assert scaled[1, 1] == 255
+        assert scaled[0, 1] > 250
+
+    def test_not_finite(self):
+        image = numpy.array([[numpy.nan, 0.], [numpy.inf, 2.]])
+        scaled = thumbnail.stretch(image, clip=0, mask_special=False)
+        assert scaled.tolist() == [[0, 0], [255, 255]]
+        image = numpy.full((2, 2), thumbnail.FLOAT_SPECIAL_MAX, '<f4')
+        assert (thumbnail.stretch(image) == 0).all()
+
+    def test_all_special(self):
+        null = numpy.full((8, 8), -32768, '>i2')
+        saturated = numpy.array([[0, 255], [255, 0]], 'u1')
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            assert (thumbnail.stretch(null) == 0).all()
+            assert thumbnail.stretch(saturated).tolist() == [
+                [0, 255], [255, 0]]
+            scaled = thumbnail.stretch_batch(
+                [null, null + 32868, null], clip=0)
+        assert (scaled[0] == 0).all() and (scaled[2] == 0).all()
+        assert scaled[1].dtype == numpy.uint8
+
+    def test_rgb(self):
+        image = numpy.array([[[0, 50, 100]], [[100, 50, 0]]], dtype='u2')
+        scaled = thumbnail.stretch(image, clip=0, mask_special=False)
+        assert scaled.shape == image.shape
+        assert scaled.flags['C_CONTIGUOUS']
+        assert numpy.allclose(
+            scaled, [[[0, 127, 255]], [[255, 127, 0]]], atol=1)
+
+    def test_special_mask(self):
+        assert thumbnail.special_mask(
+            numpy.array([0, 5, 65535], '>u2')).tolist() == [True, False, True]
+        assert not thumbnail.special_mask(numpy.array([0, 5], 'i4')).any()
+
+    def test_batch(self, monkeypatch):
+        monkeypatch.setattr(thumbnail, 'STRETCH_BATCH_SIZE', 2)
+        random = numpy.random.RandomState(0)
+        thumbnails = [
+            random.uniform(0, scale, shape).astype(dtype)
+            for scale, shape, dtype in [
+                (10, (4, 5), 'f4'), (1000, (5, 4), '>i2'),
+                (100, (4, 5), 'f4'), (50, (4, 5), 'f4'),
+                (20, (4, 5, 3), 'u1')]]
+        scaled = thumbnail.stretch_batch(thumbnails, clip=2)
+        assert len(scaled) == len(thumbnails)
+        for image, result in zip(thumbnails, scaled):
+            assert (result == thumbnail.stretch(image, clip=2)).all()
+        assert thumbnail.stretch_batch([]) == []